@@ -7,11 +7,21 @@ Database module using Supabase REST API
 """
 
 import os
+import sys
+import json
+import atexit
 import logging
+import random
 import time
+import threading
+from collections import OrderedDict, deque
 from datetime import datetime
 import requests
 from dotenv import load_dotenv
+from sqlite_backend import SQLiteStore
+from db_rows import (Row, User, UserWithDate, Product, Order, OrderSummary, CanvaAccount,
+                     CanvaAccountRecord, PurchasedAccount, PaymentMethod)
+from invalidation import bus, PRODUCTS, CATEGORIES, PROMOTION, CANVA_ACCOUNTS, USERS, ADMINS
 
 load_dotenv('config.env')
 
@@ -19,20 +29,111 @@ load_dotenv('config.env')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Storage backend: "supabase" (REST API) or "sqlite" (local file, single-node / offline)
+DB_BACKEND = os.getenv('DB_BACKEND', 'supabase').lower()
+DB_FILE = os.getenv('DB_FILE', 'InDMDevDBShop.db')
+
 # Supabase configuration
 SUPABASE_URL = os.getenv('SUPABASE_URL', '')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY', '')
 
+# Count strategy for dashboard counters: exact, planned or estimated
+COUNT_STRATEGY = os.getenv('SUPABASE_COUNT_STRATEGY', 'exact')
+
+# Error returned without a network call while the circuit breaker is open
+CIRCUIT_OPEN_ERROR = "circuit_open"
+
+# Append-only journal for writes made while Supabase is unreachable (replayed on recovery)
+DB_JOURNAL_FILE = os.getenv('DB_JOURNAL_FILE', 'InDMDevDB.journal')
+
 # Check if Supabase is configured
 USE_SUPABASE = bool(SUPABASE_URL and SUPABASE_KEY)
 
 
 class SupabaseResponse:
-    def __init__(self, data=None, count=None, error=None, status_code=None):
+    def __init__(self, data=None, count=None, error=None, status_code=None, journaled=False, stale=False):
         self.data = data if data is not None else []
         self.count = count
         self.error = error
         self.status_code = status_code
+        # Degraded mode: write accepted into the local journal / read served from the last good result
+        self.journaled = journaled
+        self.stale = stale
+
+
+class ScanIncomplete(Exception):
+    """A page of SupabaseRESTTable.scan() failed - the rows yielded so far are not the whole table"""
+
+    def __init__(self, table, after, error):
+        super().__init__(f"Scan of {table} stopped after key {after}: {error}")
+        self.table = table
+        self.after = after
+        self.error = error
+
+
+def _is_outage(response):
+    """True when Supabase could not answer (open circuit, network failure, 5xx) - not for 4xx"""
+    if response.error is None:
+        return False
+    return response.status_code is None or response.status_code >= 500
+
+
+# Returned by data-layer writes that only reached the write journal: truthy, but not applied yet
+QUEUED = "queued"
+
+# Refused while writes are journaled: a set-based write can't be queued (see WriteJournal.pinned)
+UNPINNED_WRITE_ERROR = "journal_pending_unpinned_write"
+
+
+def _postgrest_value(value):
+    """Quote a value for in.(...) lists when it contains reserved characters"""
+    text = str(value)
+    if any(ch in text for ch in ',()"') or text.strip() != text:
+        return '"' + text.replace('"', '\\"') + '"'
+    return text
+
+
+class SupabaseBulkResponse:
+    """Result of a chunked bulk write - one entry per chunk request"""
+
+    def __init__(self):
+        self.chunks = []
+        self.data = []
+        self.error = None
+        # Rows deliberately left out of the write (e.g. already sold accounts on re-import)
+        self.skipped = 0
+
+    def add_chunk(self, size, response):
+        self.chunks.append({
+            'size': size,
+            'ok': response.error is None,
+            'queued': getattr(response, 'journaled', False),
+            'status_code': response.status_code,
+            'error': response.error
+        })
+        if response.error is None:
+            self.data.extend(response.data)
+        elif self.error is None:
+            self.error = response.error
+
+    @property
+    def succeeded(self):
+        """Rows written by successful chunks"""
+        return sum(c['size'] for c in self.chunks if c['ok'])
+
+    @property
+    def failed(self):
+        """Rows lost in failed chunks"""
+        return sum(c['size'] for c in self.chunks if not c['ok'])
+
+    @property
+    def queued(self):
+        """Rows accepted into the write journal, written once Supabase is back"""
+        return sum(c['size'] for c in self.chunks if c['queued'])
+
+    @property
+    def failed_chunks(self):
+        return sum(1 for c in self.chunks if not c['ok'])
 
 
 class SupabaseRESTTable:
@@ -44,6 +145,14 @@ class SupabaseRESTTable:
         self.headers = {}
         self.payload = None
         self._count = None
+        self._chunk_size = None
+        self._row_type = None
+        self._caller = None
+        self._attempts = 0
+        self._response_bytes = 0
+        self._replay = False
+        self._keep_last_good = True
+        self._allow_stale = True
 
     def select(self, columns="*", count=None):
         self.method = "GET"
@@ -51,9 +160,19 @@ class SupabaseRESTTable:
         self._count = count
         return self
 
-    def order(self, column, ascending=True):
-        direction = "asc" if ascending else "desc"
-        self.params["order"] = f"{column}.{direction}"
+    def count(self, strategy="exact"):
+        """Count-only query: HEAD request, total read from Content-Range (exact, planned or estimated)"""
+        self.method = "HEAD"
+        self._count = strategy
+        return self
+
+    def order(self, column, ascending=True, nullsfirst=None):
+        """Add a sort key; repeated calls sort by several columns in call order"""
+        term = f"{column}.{'asc' if ascending else 'desc'}"
+        if nullsfirst is not None:
+            term += ".nullsfirst" if nullsfirst else ".nullslast"
+        existing = self.params.get("order")
+        self.params["order"] = f"{existing},{term}" if existing else term
         return self
 
     def insert(self, data):
@@ -81,48 +200,227 @@ class SupabaseRESTTable:
         self.headers["Prefer"] = "return=representation"
         return self
 
+    def _filter(self, column, expression):
+        # Several filters on one column (e.g. gte + lte) become a repeated query param
+        existing = self.params.get(column)
+        if existing is None:
+            self.params[column] = expression
+        elif isinstance(existing, list):
+            existing.append(expression)
+        else:
+            self.params[column] = [existing, expression]
+        return self
+
     def eq(self, column, value):
-        self.params[column] = f"eq.{value}"
+        return self._filter(column, f"eq.{value}")
+
+    def neq(self, column, value):
+        return self._filter(column, f"neq.{value}")
+
+    def gt(self, column, value):
+        return self._filter(column, f"gt.{value}")
+
+    def gte(self, column, value):
+        return self._filter(column, f"gte.{value}")
+
+    def lt(self, column, value):
+        return self._filter(column, f"lt.{value}")
+
+    def lte(self, column, value):
+        return self._filter(column, f"lte.{value}")
+
+    def in_(self, column, values):
+        return self._filter(column, f"in.({','.join(_postgrest_value(v) for v in values)})")
+
+    def is_(self, column, value):
+        """value: None, True or False"""
+        literal = "null" if value is None else str(bool(value)).lower()
+        return self._filter(column, f"is.{literal}")
+
+    def filter(self, column, operator, criteria):
+        """Raw PostgREST filter, e.g. filter("buyer_id", "not.is", "null")"""
+        return self._filter(column, f"{operator}.{criteria}")
+
+    def or_(self, filters):
+        """Raw PostgREST disjunction, e.g. or_("status.eq.sold,buyer_id.is.null")"""
+        return self._filter("or", f"({filters})")
+
+    def range(self, start, end):
+        """Rows start..end inclusive (zero-based)"""
+        self.params["offset"] = str(start)
+        self.params["limit"] = str(end - start + 1)
         return self
 
     def limit(self, count):
         self.params["limit"] = str(count)
         return self
 
+    def offset(self, count):
+        self.params["offset"] = str(count)
+        return self
+
+    def scan(self, page_size=1000, key="id", ascending=True):
+        """Generator: page through a GET with keyset pagination on `key`, yielding rows lazily.
+        Raises ScanIncomplete if a page fails, so a cut-short scan never looks finished."""
+        select = self.params.get("select", "*")
+        if select != "*" and key not in select.split(","):
+            self.params["select"] = f"{select},{key}"
+        direction = "asc" if ascending else "desc"
+        op = "gt" if ascending else "lt"
+        self._caller = self._caller or _caller_name(sys._getframe(1))
+        # Pages are streamed, not kept as degraded-mode fallbacks
+        self._keep_last_good = False
+        # Pages stay dicts so the keyset column is readable even when the row type omits it
+        row_type, self._row_type = self._row_type, None
+        base_params = dict(self.params)
+        last = None
+        while True:
+            self.params = {k: list(v) if isinstance(v, list) else v for k, v in base_params.items()}
+            self.params["order"] = f"{key}.{direction}"
+            self.params["limit"] = str(page_size)
+            if last is not None:
+                self._filter(key, f"{op}.{last}")
+            page = self._execute_once(None)
+            if page.error is not None:
+                raise ScanIncomplete(self.table_name, last, page.error)
+            for row in page.data:
+                yield row_type.from_record(row) if row_type else row
+            if len(page.data) < page_size:
+                return
+            last = page.data[-1][key]
+
+    def fresh(self):
+        """Never answer from LastGoodReads - for reads that decide a write (check-then-write)"""
+        self._allow_stale = False
+        return self
+
+    def rows(self, row_type):
+        """Decode each returned record straight into `row_type` (a db_rows.Row class)"""
+        self._row_type = row_type
+        return self
+
+    def bulk(self, chunk_size=500, returning="minimal"):
+        """Send a list payload as arrays of `chunk_size` rows per request"""
+        self._chunk_size = max(1, int(chunk_size))
+        prefer = self.headers.get("Prefer", "")
+        self.headers["Prefer"] = prefer.replace("return=representation", f"return={returning}")
+        return self
+
     def execute(self):
+        self._caller = self._caller or _caller_name(sys._getframe(1))
+        if self._chunk_size and isinstance(self.payload, list):
+            return self._execute_chunks()
+        return self._execute_once(self.payload)
+
+    def _execute_chunks(self):
+        result = SupabaseBulkResponse()
+        rows = self.payload
+        for start in range(0, len(rows), self._chunk_size):
+            chunk = rows[start:start + self._chunk_size]
+            response = self._execute_once(chunk)
+            result.add_chunk(len(chunk), response)
+            if response.error is not None:
+                logger.error(f"Bulk chunk {start // self._chunk_size + 1} ({len(chunk)} rows) failed on {self.table_name}")
+        logger.info(f"Bulk write {self.table_name}: {result.succeeded} rows ok, {result.failed} rows failed "
+                    f"in {len(result.chunks)} chunks")
+        return result
+
+    def _query_key(self):
+        params = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in self.params.items()))
+        return (self.method, self.table_name, params, self._count, self._row_type)
+
+    def _execute_once(self, payload):
+        if self.method in ("GET", "HEAD"):
+            key = self._query_key()
+            if self.client.coalesce:
+                result = self.client._single_flight(key, lambda: self._request(payload))
+            else:
+                result = self._request(payload)
+            # Degraded mode: serve the last good answer for this exact query while Supabase is down
+            if _is_outage(result):
+                return (self.client.last_good.get(key) if self._allow_stale else None) or result
+            if self._keep_last_good:
+                self.client.last_good.put(key, result)
+            return result
+
+        journal = self.client.journal
+        journaled = journal is not None and not self._replay and not self.table_name.startswith("rpc/")
+        pinned = journaled and journal.pinned(self)
+        # Once anything is journaled, later writes queue behind it so replay keeps their order;
+        # a write that can't be queued must not jump ahead of them either
+        if journaled and journal.pending:
+            if pinned:
+                return journal.append(self, payload)
+            return SupabaseResponse(data=[], error=UNPINNED_WRITE_ERROR, status_code=503)
+        result = self._request(payload)
+        if pinned and _is_outage(result):
+            return journal.append(self, payload)
+        return result
+
+    def _request(self, payload):
+        """One wire-level request (after coalescing), recorded in query_metrics"""
+        self._attempts = 0
+        self._response_bytes = 0
+        started = time.perf_counter()
+        result = self._send(payload)
+        query_metrics.record(self.table_name, self.method, self._caller, time.perf_counter() - started,
+                             result, max(self._attempts - 1, 0), self._response_bytes)
+        return result
+
+    def _send(self, payload):
         url = f"{self.client.base_url}/rest/v1/{self.table_name}"
         headers = dict(self.client.headers)
         headers.update(self.headers)
 
         if self._count:
             prefer = headers.get("Prefer", "")
-            if "count=exact" not in prefer:
-                prefer = f"{prefer},count=exact".strip(",")
+            if "count=" not in prefer:
+                prefer = f"{prefer},count={self._count}".strip(",")
             headers["Prefer"] = prefer
 
+        breaker = self.client.breaker_for(self.table_name)
+        if not breaker.allow():
+            return SupabaseResponse(data=[], count=None, error=CIRCUIT_OPEN_ERROR, status_code=None)
+
         last_error = None
         response = None
-        for attempt in range(self.client.retries):
-            try:
-                response = self.client.session.request(
-                    self.method,
-                    url,
-                    headers=headers,
-                    params=self.params if self.params else None,
-                    json=self.payload,
-                    timeout=self.client.timeout
-                )
-                break
-            except requests.exceptions.RequestException as e:
-                last_error = e
-                if attempt < self.client.retries - 1:
-                    backoff = self.client.backoff * (2 ** attempt)
-                    time.sleep(backoff)
-                    continue
-                logger.error(f"Supabase REST request failed: {e}")
-                return SupabaseResponse(data=[], count=None, error=str(e), status_code=None)
+        started = time.monotonic()
+        healthy = False
+        try:
+            for attempt in range(self.client.retries):
+                self._attempts += 1
+                try:
+                    response = self.client.session.request(
+                        self.method,
+                        url,
+                        headers=headers,
+                        params=self.params if self.params else None,
+                        json=payload,
+                        timeout=self.client.timeout
+                    )
+                    break
+                except requests.exceptions.RequestException as e:
+                    last_error = e
+                    # Full-jitter backoff, but never retry past the deadline or into an open circuit
+                    backoff = random.uniform(0, self.client.backoff * (2 ** attempt))
+                    elapsed = time.monotonic() - started
+                    if (attempt < self.client.retries - 1 and breaker.state == CircuitBreaker.CLOSED
+                            and elapsed + backoff < self.client.retry_deadline):
+                        time.sleep(backoff)
+                        continue
+                    break
+            if response is not None:
+                self._response_bytes = len(response.content or b"")
+                healthy = response.status_code < 500
+        finally:
+            # Settle the breaker whatever happened, or a half-open probe that raised stays "probing" forever
+            if healthy:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
 
         if response is None:
+            logger.error(f"Supabase REST request failed: {last_error}")
             return SupabaseResponse(data=[], count=None, error=str(last_error), status_code=None)
 
         count = None
@@ -142,12 +440,18 @@ class SupabaseRESTTable:
             logger.error(f"Supabase REST error: {response.status_code} {error}")
             return SupabaseResponse(data=[], count=count, error=error, status_code=response.status_code)
 
+        if self.method == "HEAD":
+            return SupabaseResponse(data=[], count=count, error=None, status_code=response.status_code)
+
         try:
-            data = response.json()
+            if self._row_type:
+                data = response.json(object_hook=self._row_type.from_record)
+            else:
+                data = response.json()
         except Exception:
             data = []
 
-        if isinstance(data, dict):
+        if isinstance(data, (dict, Row)):
             data = [data]
         if data is None:
             data = []
@@ -155,34 +459,647 @@ class SupabaseRESTTable:
         return SupabaseResponse(data=data, count=count, error=None, status_code=response.status_code)
 
 
+def _caller_name(frame):
+    """Qualified name of the data-layer function that built the query"""
+    code = frame.f_code
+    return getattr(code, 'co_qualname', code.co_name)
+
+
+class QueryMetrics:
+    """Per (table, method, calling function) latency histogram, payload and error counters.
+    Recorded once per wire request - coalesced followers and cache hits are not counted."""
+
+    BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def record(self, table, method, caller, elapsed, response, retries, response_bytes):
+        elapsed_ms = elapsed * 1000
+        bucket = next((i for i, bound in enumerate(self.BUCKETS_MS) if elapsed_ms <= bound), len(self.BUCKETS_MS))
+        error_code = self._error_code(response)
+        key = (table, method, caller or '?')
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {
+                    'calls': 0, 'errors': 0, 'retries': 0, 'rows': 0, 'bytes': 0,
+                    'total_ms': 0.0, 'max_ms': 0.0, 'buckets': [0] * (len(self.BUCKETS_MS) + 1),
+                    'error_codes': {}
+                }
+            entry['calls'] += 1
+            entry['retries'] += retries
+            entry['rows'] += len(response.data or ())
+            entry['bytes'] += response_bytes
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            entry['buckets'][bucket] += 1
+            if error_code is not None:
+                entry['errors'] += 1
+                entry['error_codes'][error_code] = entry['error_codes'].get(error_code, 0) + 1
+
+    @staticmethod
+    def _error_code(response):
+        if response.error is None:
+            return None
+        if response.error == CIRCUIT_OPEN_ERROR:
+            return CIRCUIT_OPEN_ERROR
+        if isinstance(response.error, dict) and response.error.get('code'):
+            return str(response.error['code'])
+        return str(response.status_code) if response.status_code else 'network'
+
+    def _percentile(self, buckets, calls, fraction):
+        target = calls * fraction
+        seen = 0
+        for i, count in enumerate(buckets):
+            seen += count
+            if seen >= target:
+                return self.BUCKETS_MS[i] if i < len(self.BUCKETS_MS) else None
+        return None
+
+    def snapshot(self, sort='total_ms', top=None):
+        """List of per-query stats, heaviest first. p50/p95 are bucket upper bounds (None = above 5s)"""
+        with self._lock:
+            items = [(key, dict(entry, buckets=list(entry['buckets']), error_codes=dict(entry['error_codes'])))
+                     for key, entry in self._entries.items()]
+        stats = []
+        for (table, method, caller), entry in items:
+            calls = entry['calls']
+            labels = [f"<={bound}ms" for bound in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+            stats.append({
+                'table': table,
+                'method': method,
+                'caller': caller,
+                'calls': calls,
+                'errors': entry['errors'],
+                'retries': entry['retries'],
+                'rows': entry['rows'],
+                'bytes': entry['bytes'],
+                'avg_rows': round(entry['rows'] / calls, 1),
+                'avg_bytes': round(entry['bytes'] / calls),
+                'total_ms': round(entry['total_ms'], 1),
+                'avg_ms': round(entry['total_ms'] / calls, 2),
+                'p50_ms': self._percentile(entry['buckets'], calls, 0.5),
+                'p95_ms': self._percentile(entry['buckets'], calls, 0.95),
+                'max_ms': round(entry['max_ms'], 2),
+                'error_codes': entry['error_codes'],
+                'histogram': {label: n for label, n in zip(labels, entry['buckets']) if n},
+            })
+        stats.sort(key=lambda s: s[sort], reverse=True)
+        return stats[:top] if top else stats
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+
+query_metrics = QueryMetrics()
+
+
+class CircuitBreaker:
+    """Fail fast while Supabase is down instead of parking worker threads in retries.
+
+    closed -> open after `threshold` consecutive failures; open rejects calls for
+    `reset_timeout` seconds; then half_open lets one probe through, which closes or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, threshold=5, reset_timeout=30):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0
+        self._probing = False
+        self._times_opened = 0
+        self._short_circuited = 0
+
+    def _transition(self, state):
+        logger.warning(f"Circuit '{self.name}': {self.state} -> {state}")
+        self.state = state
+
+    def allow(self):
+        """Return True if a request may go out now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.threshold):
+                self._transition(self.OPEN)
+                self._opened_at = time.monotonic()
+                self._times_opened += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'times_opened': self._times_opened,
+                'short_circuited': self._short_circuited
+            }
+
+
+class _InflightRead:
+    """One in-flight GET shared by every concurrent identical caller"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.waiters = 0
+
+
+class LastGoodReads:
+    """Bounded LRU of the last successful result per read query, served while Supabase is down.
+    Results larger than max_rows are not kept (bulk scans and exports page through instead)."""
+
+    def __init__(self, max_entries=512, max_rows=5000):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._served = 0
+        self._misses = 0
+
+    def put(self, key, response):
+        if response.error is not None or len(response.data) > self.max_rows:
+            return
+        with self._lock:
+            self._entries[key] = (list(response.data), response.count, response.status_code)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._served += 1
+        data, count, status_code = entry
+        return SupabaseResponse(data=list(data), count=count, error=None, status_code=status_code, stale=True)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'served_stale': self._served, 'missed': self._misses}
+
+
+class WriteJournal:
+    """Durable append-only journal of REST writes that could not reach Supabase.
+
+    Each write is one JSON line, fsynced before the caller gets its (journaled) response, so a
+    paid order survives a crash or restart. Entries replay strictly in order on a background
+    thread once requests get through again: a success or a 4xx conflict acknowledges the entry,
+    an outage stops the replay until the next attempt. Conflicts are logged, kept in
+    `<path>.conflicts` and passed to `on_conflict(entry, error)`; writes that land are passed
+    to `on_replayed(entry, result)`.
+
+    Only pinned writes are journaled (see pinned()): replay runs later, when a set filter such
+    as status=eq.available would also match rows written in the meantime.
+    """
+
+    # Filters on these columns name specific rows (primary or unique keys)
+    KEY_COLUMNS = frozenset(('id', 'email', 'user_id', 'admin_id', 'ordernumber', 'productnumber',
+                             'categorynumber', 'method_name', 'promo_name'))
+
+    def __init__(self, path, replay_interval=5, max_conflicts=100):
+        self.path = path
+        self.conflicts_path = f"{path}.conflicts"
+        self.replay_interval = replay_interval
+        self.max_conflicts = max_conflicts
+        self.on_conflict = None
+        self.on_replayed = None
+        self.client = None
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pending = deque()
+        self._seq = 0
+        self._conflicts = deque(maxlen=max_conflicts)
+        self._journaled = 0
+        self._replayed = 0
+        self._conflicted = 0
+        self._load()
+
+    def _load(self):
+        """Rebuild the pending list from a journal left by a previous run"""
+        acked = set()
+        entries = []
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn last line from a crash mid-append - that write was never acknowledged
+                        continue
+                    if 'ack' in record:
+                        acked.add(record['ack'])
+                    else:
+                        entries.append(record)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.error(f"Error reading write journal {self.path}: {e}")
+            return
+        self._pending.extend(e for e in entries if e['seq'] not in acked)
+        self._seq = max((e['seq'] for e in entries), default=0)
+        if self._pending:
+            logger.warning(f"Write journal {self.path}: {len(self._pending)} writes waiting for replay")
+
+    def _write(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def pinned(self, query):
+        """True if replaying `query` later touches exactly the rows it would touch now:
+        inserts/upserts carry their rows, updates/deletes must filter on a key (eq./in.)"""
+        if query.method == "POST":
+            return True
+        for column, expressions in query.params.items():
+            if column not in self.KEY_COLUMNS:
+                continue
+            if not isinstance(expressions, list):
+                expressions = [expressions]
+            if any(str(e).startswith(("eq.", "in.")) for e in expressions):
+                return True
+        return False
+
+    def attach(self, client):
+        """Bind to the client that replays the entries; starts replay if a previous run left any"""
+        self.client = client
+        if self._pending:
+            self._start()
+
+    def append(self, query, payload):
+        """Journal a write and answer for it: 202 with the submitted rows as data"""
+        with self._lock:
+            self._seq += 1
+            entry = {
+                'seq': self._seq,
+                'at': datetime.now().isoformat(),
+                'table': query.table_name,
+                'method': query.method,
+                'params': query.params,
+                'prefer': query.headers.get("Prefer", ""),
+                'payload': payload,
+                'caller': query._caller,
+            }
+            self._write(entry)
+            self._pending.append(entry)
+            self._journaled += 1
+        logger.warning(f"Supabase unavailable - journaled {query.method} {query.table_name} (#{entry['seq']})")
+        self._start()
+
+        data = []
+        if query.method == "POST" and payload is not None:
+            data = payload if isinstance(payload, list) else [payload]
+            if query._row_type:
+                data = query._row_type.from_records(data)
+        return SupabaseResponse(data=data, count=None, error=None, status_code=202, journaled=True)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-journal", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        """Replay until drained, then exit; the next journaled write starts a new thread"""
+        while True:
+            self._wake.wait(self.replay_interval)
+            self._wake.clear()
+            try:
+                self.replay()
+            except Exception as e:
+                logger.error(f"Write journal replay error: {e}")
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+
+    def replay(self):
+        """Replay pending entries in order. Returns the number acknowledged, None if already running."""
+        if self.client is None or not self._replay_lock.acquire(blocking=False):
+            return None
+        done = 0
+        try:
+            while self._pending:
+                entry = self._pending[0]
+                query = SupabaseRESTTable(self.client, entry['table'])
+                query.method = entry['method']
+                query.params = entry['params']
+                if entry['prefer']:
+                    query.headers["Prefer"] = entry['prefer']
+                query._caller = entry['caller']
+                query._replay = True
+                result = query._execute_once(entry['payload'])
+                if _is_outage(result):
+                    break
+                if result.error is None:
+                    self._ack(entry)
+                    self._replayed += 1
+                    if self.on_replayed:
+                        try:
+                            self.on_replayed(entry, result)
+                        except Exception as e:
+                            logger.error(f"Write journal replay callback failed: {e}")
+                else:
+                    self._conflict(entry, result)
+                done += 1
+            if done:
+                logger.info(f"Write journal: replayed {done} writes, {len(self._pending)} pending")
+            self._compact()
+        finally:
+            self._replay_lock.release()
+        return done
+
+    def _ack(self, entry, conflict=None):
+        with self._lock:
+            record = {'ack': entry['seq']}
+            if conflict is not None:
+                record['conflict'] = conflict
+            self._write(record)
+            self._pending.popleft()
+
+    def _conflict(self, entry, result):
+        conflict = {
+            'seq': entry['seq'],
+            'at': entry['at'],
+            'table': entry['table'],
+            'method': entry['method'],
+            'caller': entry['caller'],
+            'status_code': result.status_code,
+            'error': result.error,
+        }
+        with self._lock:
+            with open(self.conflicts_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(dict(conflict, params=entry['params'], payload=entry['payload']),
+                                   default=str) + "\n")
+            self._conflicts.append(conflict)
+            self._conflicted += 1
+        self._ack(entry, conflict=result.status_code)
+        logger.error(f"Write journal conflict: {entry['method']} {entry['table']} (#{entry['seq']}, "
+                     f"{entry['caller']}) rejected on replay: {result.status_code} {result.error}")
+        if self.on_conflict:
+            try:
+                self.on_conflict(entry, result.error)
+            except Exception as e:
+                logger.error(f"Write journal conflict callback failed: {e}")
+
+    def _compact(self):
+        """Drop the file once everything in it is acknowledged"""
+        with self._lock:
+            if not self._pending and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def conflicts(self):
+        """Most recent writes rejected on replay, oldest first"""
+        with self._lock:
+            return list(self._conflicts)
+
+    def stats(self):
+        with self._lock:
+            oldest = self._pending[0]['at'] if self._pending else None
+            return {
+                'pending': len(self._pending),
+                'oldest_pending': oldest,
+                'journaled': self._journaled,
+                'replayed': self._replayed,
+                'conflicts': self._conflicted,
+            }
+
+
 class SupabaseRESTClient:
-    def __init__(self, base_url, api_key, timeout=15, retries=3, backoff=0.5):
+    def __init__(self, base_url, api_key, timeout=(3.05, 10), retries=2, backoff=0.3, coalesce=True,
+                 retry_deadline=5, breaker_threshold=5, breaker_reset=30, per_table_breakers=False,
+                 journal=None, last_good_entries=512):
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.timeout = timeout
         self.retries = retries
         self.backoff = backoff
+        self.coalesce = coalesce
+        self.retry_deadline = retry_deadline
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.per_table_breakers = per_table_breakers
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._reads = 0
+        self._collapsed = 0
+        self.last_good = LastGoodReads(last_good_entries)
         self.session = requests.Session()
         self.headers = {
             "apikey": api_key,
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         }
+        self.journal = journal
+        if journal is not None:
+            journal.attach(self)
 
     def table(self, table_name):
         return SupabaseRESTTable(self, table_name)
 
+    def breaker_for(self, table_name):
+        """One breaker for the whole client, or one per table if per_table_breakers"""
+        name = table_name if self.per_table_breakers else "supabase"
+        with self._breakers_lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, self.breaker_threshold, self.breaker_reset)
+                self._breakers[name] = breaker
+            return breaker
+
+    def circuit_stats(self):
+        with self._breakers_lock:
+            breakers = list(self._breakers.values())
+        return {b.name: b.stats() for b in breakers}
+
+    def _single_flight(self, key, fetch):
+        """Run `fetch` once per key; concurrent identical reads wait and share the result"""
+        with self._inflight_lock:
+            self._reads += 1
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _InflightRead()
+                self._inflight[key] = call
+            else:
+                call.waiters += 1
+                self._collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            result = call.result
+            # Each waiter gets its own row list so callers can't mutate each other's data
+            return SupabaseResponse(data=list(result.data), count=result.count,
+                                    error=result.error, status_code=result.status_code)
+
+        try:
+            call.result = fetch()
+        except Exception as e:
+            call.result = SupabaseResponse(data=[], count=None, error=str(e), status_code=None)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            call.done.set()
+            if call.waiters:
+                logger.debug(f"Coalesced {call.waiters} identical reads of {key[1]}")
+        return call.result
+
+    def coalesce_stats(self):
+        """Single-flight statistics"""
+        with self._inflight_lock:
+            collapsed = self._collapsed
+            reads = self._reads
+            inflight = len(self._inflight)
+        rate = (collapsed / reads * 100) if reads > 0 else 0
+        return {
+            'reads': reads,
+            'http_calls': reads - collapsed,
+            'collapsed': collapsed,
+            'collapse_rate': f"{rate:.1f}%",
+            'in_flight': inflight
+        }
+
+    def rpc(self, function_name, params=None):
+        """Call a Postgres function exposed at /rest/v1/rpc/<name>"""
+        query = SupabaseRESTTable(self, f"rpc/{function_name}")
+        query.method = "POST"
+        query.payload = params or {}
+        return query
+
+
+class SQLiteTable(SupabaseRESTTable):
+    """Same query builder as SupabaseRESTTable, executed by the local SQLite engine"""
+
+    def _execute_once(self, payload):
+        return self._request(payload)
 
-if USE_SUPABASE:
-    supabase = SupabaseRESTClient(SUPABASE_URL, SUPABASE_KEY)
+    def _send(self, payload):
+        self._attempts = 1
+        headers = dict(self.headers)
+        if self._count:
+            prefer = headers.get("Prefer", "")
+            headers["Prefer"] = f"{prefer},count={self._count}".strip(",")
+        status_code, data, count, error = self.client.store.handle(
+            self.method, self.table_name, self.params, headers, payload)
+        if error is not None:
+            logger.error(f"SQLite backend error: {status_code} {error}")
+            return SupabaseResponse(data=[], count=count, error=error, status_code=status_code)
+        if self._row_type:
+            data = self._row_type.from_records(data)
+        return SupabaseResponse(data=data, count=count, error=None, status_code=status_code)
+
+
+class SQLiteClient:
+    """Drop-in for SupabaseRESTClient backed by a local SQLite file"""
+
+    def __init__(self, path, migrate=True):
+        self.store = SQLiteStore(path, migrate=migrate)
+
+    def table(self, table_name):
+        return SQLiteTable(self, table_name)
+
+    def rpc(self, function_name, params=None):
+        query = SQLiteTable(self, f"rpc/{function_name}")
+        query.method = "POST"
+        query.payload = params or {}
+        return query
+
+
+if DB_BACKEND == 'sqlite':
+    supabase = SQLiteClient(DB_FILE)
+    logger.info(f"Using local SQLite backend ({DB_FILE})")
+elif USE_SUPABASE:
+    supabase = SupabaseRESTClient(
+        SUPABASE_URL, SUPABASE_KEY,
+        breaker_threshold=int(os.getenv('SUPABASE_BREAKER_THRESHOLD', '5')),
+        breaker_reset=float(os.getenv('SUPABASE_BREAKER_RESET', '30')),
+        per_table_breakers=os.getenv('SUPABASE_PER_TABLE_BREAKERS', '') == '1',
+        journal=WriteJournal(DB_JOURNAL_FILE)
+    )
     logger.info("Using Supabase REST API (requests-based, no dependency backtracking)")
 else:
     supabase = None
     logger.warning("Supabase not configured! Set SUPABASE_URL and SUPABASE_KEY")
 
+def get_query_stats(sort='total_ms', top=None):
+    """Per table/method/caller query statistics, heaviest first"""
+    return query_metrics.snapshot(sort, top)
+
+def reset_query_stats():
+    query_metrics.reset()
+
+def is_degraded():
+    """True while Supabase is unreachable or journaled writes are still waiting for replay"""
+    if not isinstance(supabase, SupabaseRESTClient):
+        return False
+    if supabase.journal is not None and supabase.journal.pending:
+        return True
+    return any(b['state'] != CircuitBreaker.CLOSED for b in supabase.circuit_stats().values())
+
+def get_db_stats():
+    """Get data-layer statistics"""
+    stats = {
+        'backend': DB_BACKEND,
+        'write_behind': write_behind.stats(),
+        'promotion': promo_counter.stats(),
+        'known_users': known_users.stats(),
+        'buyer_index': buyer_index.stats(),
+        'catalog': catalog.stats(),
+        'invalidation': bus.stats(),
+    }
+    if isinstance(supabase, SupabaseRESTClient):
+        stats['coalesce'] = supabase.coalesce_stats()
+        stats['circuits'] = supabase.circuit_stats()
+        stats['degraded'] = is_degraded()
+        stats['last_good_reads'] = supabase.last_good.stats()
+        if supabase.journal is not None:
+            stats['journal'] = supabase.journal.stats()
+    return stats
+
 # Flag for backward compatibility
 USE_POSTGRES = USE_SUPABASE
-IS_SUPABASE = USE_SUPABASE
+IS_SUPABASE = USE_SUPABASE and DB_BACKEND != 'sqlite'
 
 # Dummy for backward compatibility
 def start_background_db_init():
@@ -202,6 +1119,527 @@ TABLE_CATEGORIES = "shopcategorytable"
 TABLE_PAYMENT = "paymentmethodtable"
 TABLE_CANVA = "canvaaccounttable"
 TABLE_PROMO = "promotiontable"
+TABLE_CATALOG_VERSION = "catalogversiontable"
+
+# Topic published when a journaled write finally lands on replay
+TABLE_TOPICS = {
+    TABLE_USERS: USERS,
+    TABLE_ADMINS: ADMINS,
+    TABLE_PRODUCTS: PRODUCTS,
+    TABLE_CATEGORIES: CATEGORIES,
+    TABLE_CANVA: CANVA_ACCOUNTS,
+    TABLE_PROMO: PROMOTION,
+}
+
+
+def _publish_replayed(entry, result):
+    """Journaled writes answered with no rows; tell caches and indexes once the rows exist"""
+    topic = TABLE_TOPICS.get(entry['table'])
+    if topic is None:
+        return
+    keys = [r['user_id'] for r in result.data if r.get('user_id') is not None] if topic == USERS else ()
+    bus.publish(topic, 'deleted' if entry['method'] == "DELETE" else 'replayed', keys=keys, rows=result.data)
+
+
+if isinstance(supabase, SupabaseRESTClient) and supabase.journal is not None:
+    supabase.journal.on_replayed = _publish_replayed
+
+# Columns rendered in buyer order history (GetOrderDetails tuple order)
+ORDER_DETAIL_COLUMNS = 'buyerid,buyerusername,productname,productprice,orderdate,paidmethod,productdownloadlink,productkeys,buyercomment,ordernumber,productnumber'
+ORDER_HISTORY_LIMIT = 50
+
+# Rows per page for streaming scans (admin lists, broadcast)
+SCAN_PAGE_SIZE = int(os.getenv('SCAN_PAGE_SIZE', '1000'))
+
+# Rows per request for bulk imports
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '500'))
+
+
+# ============== WRITE-BEHIND QUEUE ==============
+
+class WriteBehindQueue:
+    """Deferred idempotent upserts - queued, de-duplicated by conflict key, flushed in batches.
+
+    Only for writes the caller never needs to wait on (user/admin touch on /start).
+    Rows identical to the last successful write are dropped before queueing.
+    """
+
+    def __init__(self, flush_interval=2.0, batch_size=200, remember=10000):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.remember = remember
+        self._pending = OrderedDict()    # (table, on_conflict, key) -> row
+        self._written = OrderedDict()    # same key -> last row written
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stats = {'queued': 0, 'deduplicated': 0, 'unchanged': 0, 'flushed': 0, 'failed': 0}
+
+    def enqueue(self, table, row, on_conflict):
+        key = (table, on_conflict, row[on_conflict])
+        with self._lock:
+            if self._written.get(key) == row:
+                self._stats['unchanged'] += 1
+                return
+            if key in self._pending:
+                self._stats['deduplicated'] += 1
+            self._pending[key] = row
+            self._stats['queued'] += 1
+            pending = len(self._pending)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+                self._thread.start()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Write-behind flush error: {e}")
+
+    def flush(self):
+        """Write all pending rows now, grouped per table/conflict column"""
+        with self._lock:
+            batch = self._pending
+            self._pending = OrderedDict()
+        if not batch or supabase is None:
+            return 0
+
+        groups = {}
+        for key, row in batch.items():
+            groups.setdefault(key[:2], []).append((key, row))
+
+        written = 0
+        for (table, on_conflict), items in groups.items():
+            rows = [row for _, row in items]
+            result = supabase.table(table).upsert(rows, on_conflict=on_conflict).bulk(self.batch_size).execute()
+            ok = set()
+            position = 0
+            for chunk in result.chunks:
+                if chunk['ok']:
+                    ok.update(range(position, position + chunk['size']))
+                position += chunk['size']
+            with self._lock:
+                for i, (key, row) in enumerate(items):
+                    if i in ok:
+                        self._written[key] = row
+                        self._written.move_to_end(key)
+                    else:
+                        # Re-queue unless a newer value arrived meanwhile
+                        self._pending.setdefault(key, row)
+                while len(self._written) > self.remember:
+                    self._written.popitem(last=False)
+                self._stats['flushed'] += len(ok)
+                self._stats['failed'] += len(items) - len(ok)
+            written += len(ok)
+        return written
+
+    def drain(self):
+        """Flush on shutdown"""
+        with self._lock:
+            pending = len(self._pending)
+        if pending:
+            logger.info(f"Draining {pending} deferred writes")
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+
+
+write_behind = WriteBehindQueue()
+atexit.register(write_behind.drain)
+
+
+# ============== CATALOG SNAPSHOT ==============
+
+class CatalogSnapshot:
+    """Products and categories held in memory with prebuilt indexes (by number, by category).
+    Every catalog read goes through here. Reloaded when:
+    - an in-process product/category write calls invalidate(), or
+    - the catalogversiontable counter (bumped by DB triggers, see migrations/) has moved;
+      it is polled in the background at most every `check_interval` seconds.
+    Without the version table (migrations not applied) it reloads every `check_interval`.
+    A failed reload keeps the previous snapshot and is retried by the background check,
+    so an outage never puts network calls on the read path."""
+
+    PRODUCT_COLUMNS = ('productnumber,productname,productprice,productdescription,'
+                       'productimagelink,productdownloadlink,productquantity,productcategory')
+
+    def __init__(self, check_interval=30):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._products = ()
+        self._by_number = {}
+        self._by_category = {}
+        self._categories = ()
+        self._category_names = {}
+        self.version = None
+        self._loaded = False
+        self._dirty = True
+        self._checked_at = 0
+        self._check_lock = threading.Lock()   # held by the one background check in flight
+        self._load_failed = False
+        self._no_version_table = False
+        self._stats = {'loads': 0, 'failed_loads': 0, 'version_checks': 0}
+
+    # ----- reads -----
+
+    def products(self):
+        self._ensure()
+        return list(self._products)
+
+    def product(self, productnumber):
+        self._ensure()
+        try:
+            return self._by_number.get(int(productnumber))
+        except (TypeError, ValueError):
+            return None
+
+    def products_in_category(self, category_name):
+        self._ensure()
+        return list(self._by_category.get(str(category_name).upper(), ()))
+
+    def categories(self):
+        self._ensure()
+        return list(self._categories)
+
+    def category_name(self, categorynumber):
+        self._ensure()
+        try:
+            return self._category_names.get(int(categorynumber))
+        except (TypeError, ValueError):
+            return None
+
+    # ----- freshness -----
+
+    def invalidate(self):
+        """Called by product/category writes - the next read reloads"""
+        self._dirty = True
+
+    def on_change(self, event):
+        self.invalidate()
+
+    def export_state(self):
+        with self._lock:
+            return {'version': self.version, 'products': self._products, 'categories': self._categories}
+
+    def restore_state(self, state, age=0):
+        """Serve a saved catalog at once; the first read checks the version in the background"""
+        products = tuple(state['products'])
+        by_category = {}
+        for p in products:
+            by_category.setdefault(str(p.productcategory).upper(), []).append(p)
+        with self._lock:
+            if self._loaded:
+                return
+            self._products = products
+            self._by_number = {p.productnumber: p for p in products}
+            self._by_category = by_category
+            self._categories = tuple(state['categories'])
+            self._category_names = dict(self._categories)
+            self.version = state['version']
+            self._loaded = True
+            self._dirty = False
+            self._checked_at = 0
+
+    def _ensure(self):
+        # Load in line only while the last attempt worked; after a failure the background check retries
+        if (self._dirty or not self._loaded) and not self._load_failed:
+            with self._lock:
+                if (self._dirty or not self._loaded) and not self._load_failed:
+                    self._load()
+            return
+        if time.monotonic() - self._checked_at >= self.check_interval and self._check_lock.acquire(blocking=False):
+            # Serve the current snapshot; check the version off the request path
+            threading.Thread(target=self._check_version, daemon=True).start()
+
+    def _remote_version(self):
+        """Catalog version, or None when unreachable or when there is no version counter
+        (table or row missing - remembered, so it is probed once per process)"""
+        if self._no_version_table:
+            return None
+        result = supabase.table(TABLE_CATALOG_VERSION).select('version').eq('id', 1).execute()
+        if _is_outage(result):
+            return None
+        if result.error or not result.data:
+            self._no_version_table = True
+            logger.warning(f"No catalog version counter (migrations not applied), reloading every {self.check_interval}s")
+            return None
+        return result.data[0]['version']
+
+    def _check_version(self):
+        """Runs on its own thread with _check_lock held"""
+        try:
+            # Fetch outside the lock, then compare under it: another thread may have reloaded meanwhile
+            version = self._remote_version()
+            with self._lock:
+                self._stats['version_checks'] += 1
+                if version is not None and version == self.version and not self._dirty:
+                    self._checked_at = time.monotonic()
+                else:
+                    self._load(version, probe=False)
+        except Exception as e:
+            logger.error(f"Catalog version check failed: {e}")
+        finally:
+            self._check_lock.release()
+
+    def _load(self, version=None, probe=True):
+        # Read the version first: a write landing mid-load then just triggers one more reload
+        self._dirty = False
+        if probe:
+            version = self._remote_version()
+        products = supabase.table(TABLE_PRODUCTS).select(self.PRODUCT_COLUMNS).order('id').rows(Product).execute()
+        categories = supabase.table(TABLE_CATEGORIES).select('categorynumber,categoryname').order('categorynumber').execute()
+        if products.error or categories.error:
+            logger.error(f"Catalog reload failed, keeping previous snapshot, retrying in {self.check_interval}s")
+            self._dirty = True
+            self._load_failed = True
+            self._checked_at = time.monotonic()
+            self._stats['failed_loads'] += 1
+            return
+
+        by_category = {}
+        for p in products.data:
+            by_category.setdefault(str(p.productcategory).upper(), []).append(p)
+        category_rows = [(r['categorynumber'], r['categoryname']) for r in categories.data]
+
+        self._products = tuple(products.data)
+        self._by_number = {p.productnumber: p for p in products.data}
+        self._by_category = by_category
+        self._categories = tuple(category_rows)
+        self._category_names = dict(category_rows)
+        self.version = version
+        self._loaded = True
+        self._load_failed = False
+        self._checked_at = time.monotonic()
+        self._stats['loads'] += 1
+
+    def stats(self):
+        return dict(self._stats, version=self.version, products=len(self._products),
+                    categories=len(self._categories))
+
+
+catalog = CatalogSnapshot()
+bus.subscribe(PRODUCTS, catalog.on_change)
+bus.subscribe(CATEGORIES, catalog.on_change)
+
+
+# ============== KNOWN USERS INDEX ==============
+
+class KnownUsers:
+    """In-memory set of user ids for new-user detection on /start.
+    Warmed once by a streaming scan, kept current by AddAuser. Until warming finishes,
+    lookups fall back to a single indexed point query."""
+
+    def __init__(self):
+        self._ids = set()
+        self._lock = threading.Lock()
+        self._warmed = False
+        self._lookups = 0
+        self._fallbacks = 0
+
+    def warm(self, page_size=SCAN_PAGE_SIZE):
+        """Load every user id (runs in the background at boot)"""
+        ids = set()
+        try:
+            for r in supabase.table(TABLE_USERS).select('user_id').scan(page_size):
+                ids.add(int(r['user_id']))
+        except Exception as e:
+            logger.error(f"Error warming known users: {e}")
+            return False
+        with self._lock:
+            # Keep ids added while the scan was running
+            self._ids |= ids
+            self._warmed = True
+        logger.info(f"Known users index warmed: {len(ids)} users")
+        return True
+
+    def add(self, user_id):
+        with self._lock:
+            self._ids.add(int(user_id))
+
+    def on_change(self, event):
+        for user_id in event.keys:
+            self.add(user_id)
+
+    def export_state(self):
+        with self._lock:
+            return list(self._ids) if self._warmed else None
+
+    def restore_state(self, ids, age=0):
+        """Saved ids answer lookups until warm() rescans (it keeps running at boot)"""
+        if ids is None:
+            return
+        with self._lock:
+            self._ids.update(ids)
+            self._warmed = True
+
+    def contains(self, user_id):
+        user_id = int(user_id)
+        with self._lock:
+            self._lookups += 1
+            if user_id in self._ids:
+                return True
+            if self._warmed:
+                return False
+            self._fallbacks += 1
+        try:
+            result = supabase.table(TABLE_USERS).select('user_id').eq('user_id', user_id).limit(1).execute()
+        except Exception:
+            return True  # Unknown - don't report a new user on a failed lookup
+        if result.error:
+            return True
+        if result.data:
+            self.add(user_id)
+            return True
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._ids), 'warmed': self._warmed,
+                    'lookups': self._lookups, 'fallbacks': self._fallbacks}
+
+
+known_users = KnownUsers()
+bus.subscribe(USERS, known_users.on_change)
+
+
+# ============== BUYER ACCOUNTS INDEX ==============
+
+class BuyerIndex:
+    """buyer_id -> [PurchasedAccount], loaded by one scan of the Canva table.
+    Kept current by the CanvaAccountDB methods that assign, release or delete accounts,
+    so the main keyboard and the OTP menu answer from memory. Before warming finishes,
+    a buyer is fetched once with a point query and then served locally."""
+
+    COLUMNS = 'email,order_number,created_at,buyer_id'
+
+    def __init__(self):
+        self._by_buyer = {}
+        self._owner = {}          # email -> buyer_id, to move/release accounts by email
+        self._loaded = set()      # buyers whose list is authoritative before warming
+        self._lock = threading.Lock()
+        self._warmed = False
+        self._pending = None      # writes seen while warm() scans, replayed over the scan result
+
+    def warm(self, page_size=SCAN_PAGE_SIZE):
+        by_buyer, owner = {}, {}
+        with self._lock:
+            self._pending = []
+        try:
+            query = supabase.table(TABLE_CANVA).select(self.COLUMNS).filter('buyer_id', 'not.is', 'null')
+            for r in query.scan(page_size):
+                buyer_id = int(r['buyer_id'])
+                by_buyer.setdefault(buyer_id, []).append(PurchasedAccount.from_record(r))
+                owner[r['email']] = buyer_id
+        except Exception as e:
+            with self._lock:
+                self._pending = None
+            logger.error(f"Error warming buyer index: {e}")
+            return False
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self._by_buyer, self._owner = by_buyer, owner
+            # A page may predate an assign/release made during the scan - replay them on top
+            for forget, rows in pending:
+                self._apply(rows, forget)
+            self._loaded.clear()
+            self._warmed = True
+            accounts, buyers = len(self._owner), len(self._by_buyer)
+        logger.info(f"Buyer index warmed: {accounts} accounts, {buyers} buyers")
+        return True
+
+    def get(self, buyer_id):
+        buyer_id = int(buyer_id)
+        with self._lock:
+            if self._warmed or buyer_id in self._loaded:
+                return list(self._by_buyer.get(buyer_id, ()))
+        result = supabase.table(TABLE_CANVA).select(self.COLUMNS).eq('buyer_id', buyer_id).execute()
+        if result.error:
+            return []
+        with self._lock:
+            if not self._warmed:
+                self._loaded.add(buyer_id)
+                for r in result.data:
+                    self._put(buyer_id, r)
+            return list(self._by_buyer.get(buyer_id, ()))
+
+    def has_accounts(self, buyer_id):
+        return bool(self.get(buyer_id))
+
+    def _put(self, buyer_id, record):
+        self._drop(record['email'])
+        self._by_buyer.setdefault(buyer_id, []).append(PurchasedAccount.from_record(record))
+        self._owner[record['email']] = buyer_id
+
+    def _drop(self, email):
+        buyer_id = self._owner.pop(email, None)
+        if buyer_id is None:
+            return
+        remaining = [a for a in self._by_buyer.get(buyer_id, ()) if a.email != email]
+        if remaining:
+            self._by_buyer[buyer_id] = remaining
+        else:
+            self._by_buyer.pop(buyer_id, None)
+
+    def _apply(self, rows, forget=False):
+        for r in rows:
+            if not forget and r.get('buyer_id') is not None:
+                self._put(int(r['buyer_id']), r)
+            else:
+                self._drop(r['email'])
+
+    def record(self, rows):
+        """Apply written canvaaccounttable rows (dicts): owned rows are (re)indexed, released rows dropped"""
+        with self._lock:
+            self._apply(rows)
+            if self._pending is not None:
+                self._pending.append((False, list(rows)))
+
+    def forget(self, rows):
+        """Drop deleted canvaaccounttable rows"""
+        with self._lock:
+            self._apply(rows, forget=True)
+            if self._pending is not None:
+                self._pending.append((True, list(rows)))
+
+    def on_change(self, event):
+        if event.action == 'deleted':
+            self.forget(event.rows)
+        else:
+            self.record(event.rows)
+
+    def export_state(self):
+        with self._lock:
+            if not self._warmed:
+                return None
+            return {'by_buyer': {buyer_id: list(accounts) for buyer_id, accounts in self._by_buyer.items()},
+                    'owner': dict(self._owner)}
+
+    def restore_state(self, state, age=0):
+        """Saved index answers until warm() rescans (it keeps running at boot)"""
+        if state is None:
+            return
+        with self._lock:
+            if self._warmed:
+                return
+            self._by_buyer = {buyer_id: list(accounts) for buyer_id, accounts in state['by_buyer'].items()}
+            self._owner = dict(state['owner'])
+            self._loaded.clear()
+            self._warmed = True
+
+    def stats(self):
+        with self._lock:
+            return {'accounts': len(self._owner), 'buyers': len(self._by_buyer), 'warmed': self._warmed}
+
+
+buyer_index = BuyerIndex()
+bus.subscribe(CANVA_ACCOUNTS, buyer_index.on_change)
 
 
 # ============== USER OPERATIONS ==============
@@ -210,14 +1648,23 @@ class CreateDatas:
     """Data creation operations"""
     
     @staticmethod
-    def AddAuser(user_id, username):
-        """Add a new user"""
+    def AddAuser(user_id, username, defer=False):
+        """Add a new user (defer=True queues it on the write-behind queue)"""
+        row = {
+            'user_id': user_id,
+            'username': username,
+            'wallet': 0
+        }
+        if defer:
+            write_behind.enqueue(TABLE_USERS, row, 'user_id')
+            bus.publish(USERS, 'added', keys=(user_id,))
+            return True
         try:
-            supabase.table(TABLE_USERS).upsert({
-                'user_id': user_id,
-                'username': username,
-                'wallet': 0
-            }, on_conflict='user_id').execute()
+            result = supabase.table(TABLE_USERS).upsert(row, on_conflict='user_id').execute()
+            if result.error:
+                logger.error(f"Error adding user: {result.error}")
+                return False
+            bus.publish(USERS, 'added', keys=(user_id,))
             logger.info(f"User added/updated: {username} (ID: {user_id})")
             return True
         except Exception as e:
@@ -225,14 +1672,23 @@ class CreateDatas:
             return False
     
     @staticmethod
-    def AddAdmin(admin_id, username):
-        """Add a new admin"""
+    def AddAdmin(admin_id, username, defer=False):
+        """Add a new admin (defer=True queues it on the write-behind queue)"""
+        row = {
+            'admin_id': admin_id,
+            'username': username,
+            'wallet': 0
+        }
+        if defer:
+            write_behind.enqueue(TABLE_ADMINS, row, 'admin_id')
+            bus.publish(ADMINS, 'added', keys=(admin_id,))
+            return True
         try:
-            supabase.table(TABLE_ADMINS).upsert({
-                'admin_id': admin_id,
-                'username': username,
-                'wallet': 0
-            }, on_conflict='admin_id').execute()
+            result = supabase.table(TABLE_ADMINS).upsert(row, on_conflict='admin_id').execute()
+            if result.error:
+                logger.error(f"Error adding admin: {result.error}")
+                return False
+            bus.publish(ADMINS, 'added', keys=(admin_id,))
             logger.info(f"Admin added/updated: {username} (ID: {admin_id})")
             return True
         except Exception as e:
@@ -243,7 +1699,7 @@ class CreateDatas:
     def AddProduct(productnumber, admin_id, username):
         """Add a new product"""
         try:
-            supabase.table(TABLE_PRODUCTS).upsert({
+            result = supabase.table(TABLE_PRODUCTS).upsert({
                 'productnumber': productnumber,
                 'admin_id': admin_id,
                 'username': username,
@@ -251,6 +1707,10 @@ class CreateDatas:
                 'productprice': 0,
                 'productquantity': 0
             }, on_conflict='productnumber').execute()
+            if result.error:
+                logger.error(f"Error adding product: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'added', keys=(productnumber,))
             return True
         except Exception as e:
             logger.error(f"Error adding product: {e}")
@@ -279,10 +1739,14 @@ class CreateDatas:
     def AddCategory(categorynumber, categoryname):
         """Add a new category"""
         try:
-            supabase.table(TABLE_CATEGORIES).upsert({
+            result = supabase.table(TABLE_CATEGORIES).upsert({
                 'categorynumber': categorynumber,
                 'categoryname': categoryname
             }, on_conflict='categorynumber').execute()
+            if result.error:
+                logger.error(f"Error adding category: {result.error}")
+                return False
+            bus.publish(CATEGORIES, 'added', keys=(categorynumber,))
             return True
         except Exception as e:
             logger.error(f"Error adding category: {e}")
@@ -291,7 +1755,11 @@ class CreateDatas:
     @staticmethod
     def UpdateProductName(name, productnumber):
         try:
-            supabase.table(TABLE_PRODUCTS).update({'productname': name}).eq('productnumber', productnumber).execute()
+            result = supabase.table(TABLE_PRODUCTS).update({'productname': name}).eq('productnumber', productnumber).execute()
+            if result.error:
+                logger.error(f"Error updating product name: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'updated', keys=(productnumber,))
             return True
         except Exception as e:
             logger.error(f"Error updating product name: {e}")
@@ -300,7 +1768,11 @@ class CreateDatas:
     @staticmethod
     def UpdateProductDescription(description, productnumber):
         try:
-            supabase.table(TABLE_PRODUCTS).update({'productdescription': description}).eq('productnumber', productnumber).execute()
+            result = supabase.table(TABLE_PRODUCTS).update({'productdescription': description}).eq('productnumber', productnumber).execute()
+            if result.error:
+                logger.error(f"Error updating product description: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'updated', keys=(productnumber,))
             return True
         except Exception as e:
             logger.error(f"Error updating product description: {e}")
@@ -309,7 +1781,11 @@ class CreateDatas:
     @staticmethod
     def UpdateProductPrice(price, productnumber):
         try:
-            supabase.table(TABLE_PRODUCTS).update({'productprice': int(price)}).eq('productnumber', productnumber).execute()
+            result = supabase.table(TABLE_PRODUCTS).update({'productprice': int(price)}).eq('productnumber', productnumber).execute()
+            if result.error:
+                logger.error(f"Error updating product price: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'updated', keys=(productnumber,))
             return True
         except Exception as e:
             logger.error(f"Error updating product price: {e}")
@@ -318,7 +1794,11 @@ class CreateDatas:
     @staticmethod
     def UpdateProductQuantity(quantity, productnumber):
         try:
-            supabase.table(TABLE_PRODUCTS).update({'productquantity': int(quantity)}).eq('productnumber', productnumber).execute()
+            result = supabase.table(TABLE_PRODUCTS).update({'productquantity': int(quantity)}).eq('productnumber', productnumber).execute()
+            if result.error:
+                logger.error(f"Error updating product quantity: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'updated', keys=(productnumber,))
             return True
         except Exception as e:
             logger.error(f"Error updating product quantity: {e}")
@@ -327,7 +1807,11 @@ class CreateDatas:
     @staticmethod
     def UpdateProductproductimagelink(imagelink, productnumber):
         try:
-            supabase.table(TABLE_PRODUCTS).update({'productimagelink': imagelink}).eq('productnumber', productnumber).execute()
+            result = supabase.table(TABLE_PRODUCTS).update({'productimagelink': imagelink}).eq('productnumber', productnumber).execute()
+            if result.error:
+                logger.error(f"Error updating product image: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'updated', keys=(productnumber,))
             return True
         except Exception as e:
             logger.error(f"Error updating product image: {e}")
@@ -336,7 +1820,11 @@ class CreateDatas:
     @staticmethod
     def UpdateProductproductdownloadlink(downloadlink, productnumber):
         try:
-            supabase.table(TABLE_PRODUCTS).update({'productdownloadlink': downloadlink}).eq('productnumber', productnumber).execute()
+            result = supabase.table(TABLE_PRODUCTS).update({'productdownloadlink': downloadlink}).eq('productnumber', productnumber).execute()
+            if result.error:
+                logger.error(f"Error updating product download link: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'updated', keys=(productnumber,))
             return True
         except Exception as e:
             logger.error(f"Error updating product download link: {e}")
@@ -345,7 +1833,11 @@ class CreateDatas:
     @staticmethod
     def UpdateProductKeysFile(keysfile, productnumber):
         try:
-            supabase.table(TABLE_PRODUCTS).update({'productkeysfile': keysfile}).eq('productnumber', productnumber).execute()
+            result = supabase.table(TABLE_PRODUCTS).update({'productkeysfile': keysfile}).eq('productnumber', productnumber).execute()
+            if result.error:
+                logger.error(f"Error updating product keys file: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'updated', keys=(productnumber,))
             return True
         except Exception as e:
             logger.error(f"Error updating product keys file: {e}")
@@ -354,7 +1846,11 @@ class CreateDatas:
     @staticmethod
     def UpdateProductCategory(category, productnumber):
         try:
-            supabase.table(TABLE_PRODUCTS).update({'productcategory': category}).eq('productnumber', productnumber).execute()
+            result = supabase.table(TABLE_PRODUCTS).update({'productcategory': category}).eq('productnumber', productnumber).execute()
+            if result.error:
+                logger.error(f"Error updating product category: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'updated', keys=(productnumber,))
             return True
         except Exception as e:
             logger.error(f"Error updating product category: {e}")
@@ -390,7 +1886,11 @@ class CreateDatas:
     @staticmethod
     def DeleteProduct(productnumber):
         try:
-            supabase.table(TABLE_PRODUCTS).delete().eq('productnumber', productnumber).execute()
+            result = supabase.table(TABLE_PRODUCTS).delete().eq('productnumber', productnumber).execute()
+            if result.error:
+                logger.error(f"Error deleting product: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'deleted', keys=(productnumber,))
             return True
         except Exception as e:
             logger.error(f"Error deleting product: {e}")
@@ -400,7 +1900,11 @@ class CreateDatas:
     def Update_All_ProductCategory(new_category, old_category):
         """Update all products from old category to new category"""
         try:
-            supabase.table(TABLE_PRODUCTS).update({'productcategory': new_category}).eq('productcategory', old_category).execute()
+            result = supabase.table(TABLE_PRODUCTS).update({'productcategory': new_category}).eq('productcategory', old_category).execute()
+            if result.error:
+                logger.error(f"Error updating all product categories: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'updated')
             return True
         except Exception as e:
             logger.error(f"Error updating all product categories: {e}")
@@ -410,7 +1914,11 @@ class CreateDatas:
     def Update_A_Category(new_category_name, category_number):
         """Update category name by number"""
         try:
-            supabase.table(TABLE_CATEGORIES).update({'categoryname': new_category_name}).eq('categorynumber', category_number).execute()
+            result = supabase.table(TABLE_CATEGORIES).update({'categoryname': new_category_name}).eq('categorynumber', category_number).execute()
+            if result.error:
+                logger.error(f"Error updating category: {result.error}")
+                return False
+            bus.publish(CATEGORIES, 'updated', keys=(category_number,))
             return True
         except Exception as e:
             logger.error(f"Error updating category: {e}")
@@ -491,30 +1999,36 @@ class GetDataFromDB:
     def GetUsersInfo():
         """Get all users info"""
         try:
-            result = supabase.table(TABLE_USERS).select('user_id, username, wallet').execute()
-            return [(r['user_id'], r['username'], r['wallet']) for r in result.data] if result.data else []
+            return list(GetDataFromDB.IterUsersInfo())
+        except ScanIncomplete as e:
+            logger.error(str(e))
+            return []
+    
+    @staticmethod
+    def IterUsersInfo(page_size=SCAN_PAGE_SIZE):
+        """Stream all users info page by page"""
+        try:
+            yield from supabase.table(TABLE_USERS).select('user_id, username, wallet').rows(User).scan(page_size)
+        except ScanIncomplete:
+            raise
         except Exception as e:
             logger.error(f"Error getting users info: {e}")
-            return []
     
     @staticmethod
     def GetUsersInfoWithDate():
         """Get all users info with date"""
         try:
-            result = supabase.table(TABLE_USERS).select('user_id, username, wallet, created_at').execute()
-            return [(r['user_id'], r['username'], r['wallet'], r['created_at']) for r in result.data] if result.data else []
+            result = supabase.table(TABLE_USERS).select('user_id, username, wallet, created_at').rows(UserWithDate).execute()
+            return result.data
         except Exception as e:
             logger.error(f"Error getting users info with date: {e}")
             return []
     
     @staticmethod
     def GetProductInfo():
-        """Get all products"""
+        """Get all products (catalog snapshot)"""
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('productnumber, productname, productprice, productdescription, productimagelink, productdownloadlink, productquantity, productcategory').execute()
-            return [(r['productnumber'], r['productname'], r['productprice'], r['productdescription'], 
-                    r['productimagelink'], r['productdownloadlink'], r['productquantity'], r['productcategory']) 
-                    for r in result.data] if result.data else []
+            return catalog.products()
         except Exception as e:
             logger.error(f"Error getting products: {e}")
             return []
@@ -523,69 +2037,74 @@ class GetDataFromDB:
     def GetProductInfoByPName(productnumber):
         """Get product by product number"""
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('*').eq('productnumber', productnumber).execute()
-            if result.data:
-                r = result.data[0]
-                return [(r['productnumber'], r['productname'], r['productprice'], r['productdescription'],
-                        r['productimagelink'], r['productdownloadlink'], r['productquantity'], r['productcategory'])]
-            return []
+            product = catalog.product(productnumber)
+            return [product] if product else []
         except Exception as e:
             logger.error(f"Error getting product by number: {e}")
             return []
     
+    @staticmethod
+    def GetProductInfoByCTGName(category_name):
+        """Get products of a category (case-insensitive name)"""
+        try:
+            return catalog.products_in_category(category_name)
+        except Exception as e:
+            logger.error(f"Error getting products by category: {e}")
+            return []
+    
     @staticmethod
     def GetProductName(productnumber):
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('productname').eq('productnumber', productnumber).execute()
-            return result.data[0]['productname'] if result.data else None
+            product = catalog.product(productnumber)
+            return product.productname if product else None
         except:
             return None
     
     @staticmethod
     def GetProductPrice(productnumber):
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('productprice').eq('productnumber', productnumber).execute()
-            return result.data[0]['productprice'] if result.data else 0
+            product = catalog.product(productnumber)
+            return product.productprice if product else 0
         except:
             return 0
     
     @staticmethod
     def GetProductDescription(productnumber):
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('productdescription').eq('productnumber', productnumber).execute()
-            return result.data[0]['productdescription'] if result.data else None
+            product = catalog.product(productnumber)
+            return product.productdescription if product else None
         except:
             return None
     
     @staticmethod
     def GetProductQuantity(productnumber):
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('productquantity').eq('productnumber', productnumber).execute()
-            return result.data[0]['productquantity'] if result.data else 0
+            product = catalog.product(productnumber)
+            return product.productquantity if product else 0
         except:
             return 0
     
     @staticmethod
     def GetProductImageLink(productnumber):
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('productimagelink').eq('productnumber', productnumber).execute()
-            return result.data[0]['productimagelink'] if result.data else None
+            product = catalog.product(productnumber)
+            return product.productimagelink if product else None
         except:
             return None
     
     @staticmethod
     def GetProductDownloadLink(productnumber):
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('productdownloadlink').eq('productnumber', productnumber).execute()
-            return result.data[0]['productdownloadlink'] if result.data else None
+            product = catalog.product(productnumber)
+            return product.productdownloadlink if product else None
         except:
             return None
     
     @staticmethod
     def GetProductNumber(productnumber):
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('productnumber').eq('productnumber', productnumber).execute()
-            return result.data[0]['productnumber'] if result.data else None
+            product = catalog.product(productnumber)
+            return product.productnumber if product else None
         except:
             return None
     
@@ -593,8 +2112,7 @@ class GetDataFromDB:
     def GetProductNumberName():
         """Get product numbers and names"""
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('productnumber, productname').execute()
-            return [(r['productnumber'], r['productname']) for r in result.data] if result.data else []
+            return [(p.productnumber, p.productname) for p in catalog.products()]
         except:
             return []
     
@@ -602,8 +2120,7 @@ class GetDataFromDB:
     def GetProductIDs():
         """Get all product IDs"""
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('productnumber').execute()
-            return [(r['productnumber'],) for r in result.data] if result.data else []
+            return [(p.productnumber,) for p in catalog.products()]
         except:
             return []
     
@@ -611,8 +2128,7 @@ class GetDataFromDB:
     def GetCategoryIDsInDB():
         """Get all categories"""
         try:
-            result = supabase.table(TABLE_CATEGORIES).select('categorynumber, categoryname').execute()
-            return [(r['categorynumber'], r['categoryname']) for r in result.data] if result.data else []
+            return catalog.categories()
         except:
             return []
     
@@ -620,8 +2136,7 @@ class GetDataFromDB:
     def Get_A_CategoryName(categorynumber):
         """Get category name by number"""
         try:
-            result = supabase.table(TABLE_CATEGORIES).select('categoryname').eq('categorynumber', categorynumber).execute()
-            return result.data[0]['categoryname'] if result.data else None
+            return catalog.category_name(categorynumber)
         except:
             return None
     
@@ -637,35 +2152,34 @@ class GetDataFromDB:
     
     @staticmethod
     def GetOrderDetails(ordernumber):
-        """Get order details - returns list of tuples for iteration"""
+        """Get order details - returns [Order] (unpacks like the old tuple)"""
         try:
-            result = supabase.table(TABLE_ORDERS).select('*').eq('ordernumber', ordernumber).execute()
-            if result.data:
-                r = result.data[0]
-                # Return list of tuples matching expected format:
-                # (buyerid, buyerusername, productname, productprice, orderdate, paidmethod, productdownloadlink, productkeys, buyercomment, ordernumber, productnumber)
-                return [(
-                    r['buyerid'], 
-                    r['buyerusername'], 
-                    r['productname'],
-                    r['productprice'], 
-                    r.get('orderdate', ''),  # orderdate
-                    r['paidmethod'], 
-                    r.get('productdownloadlink', ''), 
-                    r.get('productkeys', 'NIL'),
-                    r.get('buyercomment', ''), 
-                    r['ordernumber'], 
-                    r.get('productnumber', '')
-                )]
-            return None
+            result = supabase.table(TABLE_ORDERS).select(ORDER_DETAIL_COLUMNS).eq('ordernumber', ordernumber).rows(Order).execute()
+            return result.data[:1] or None
         except:
             return None
     
+    @staticmethod
+    def GetOrderHistory_Buyer(buyer_id, limit=ORDER_HISTORY_LIMIT, offset=0, before=None):
+        """Get a buyer's orders (newest first) in one query - same Order rows as GetOrderDetails.
+        Page with before=<last ordernumber shown> (keyset, uses idx_orders_buyer_ordernumber)."""
+        try:
+            query = supabase.table(TABLE_ORDERS).select(ORDER_DETAIL_COLUMNS).eq('buyerid', buyer_id).order('ordernumber', ascending=False).limit(limit).rows(Order)
+            if before is not None:
+                query = query.lt('ordernumber', before)
+            if offset:
+                query = query.offset(offset)
+            result = query.execute()
+            return result.data
+        except Exception as e:
+            logger.error(f"Error getting buyer order history: {e}")
+            return []
+    
     @staticmethod
     def GetAllUnfirmedOrdersUser(user_id):
-        """Get pending orders"""
+        """Get pending orders of one user"""
         try:
-            result = supabase.table(TABLE_ORDERS).select('*').eq('paidmethod', 'PENDING').execute()
+            result = supabase.table(TABLE_ORDERS).select('*').eq('paidmethod', 'PENDING').eq('buyerid', user_id).execute()
             return result.data if result.data else []
         except:
             return []
@@ -674,13 +2188,21 @@ class GetDataFromDB:
     def GetOrderInfo():
         """Get order list for admin"""
         try:
-            result = supabase.table(TABLE_ORDERS).select('ordernumber,productname,buyerusername,orderdate').order('ordernumber', ascending=False).execute()
-            if result.data:
-                return [(r['ordernumber'], r['productname'], r.get('buyerusername'), r['orderdate']) for r in result.data]
+            return list(GetDataFromDB.IterOrderInfo())
+        except ScanIncomplete as e:
+            logger.error(str(e))
             return []
+    
+    @staticmethod
+    def IterOrderInfo(page_size=SCAN_PAGE_SIZE):
+        """Stream order list for admin, newest first"""
+        try:
+            query = supabase.table(TABLE_ORDERS).select('ordernumber,productname,buyerusername,orderdate').rows(OrderSummary)
+            yield from query.scan(page_size, key='ordernumber', ascending=False)
+        except ScanIncomplete:
+            raise
         except Exception as e:
             logger.error(f"Error getting order info: {e}")
-            return []
     
     @staticmethod
     def GetPaymentMethodTokenKeysCleintID(method_name):
@@ -693,17 +2215,17 @@ class GetDataFromDB:
     
     @staticmethod
     def GetPaymentMethodsAll(method_name):
-        """Get all payment method data"""
+        """Get payment method rows as [PaymentMethod(method_name, token_keys_clientid, secret_keys)]"""
         try:
-            result = supabase.table(TABLE_PAYMENT).select('*').eq('method_name', method_name).execute()
-            return result.data[0] if result.data else None
+            result = supabase.table(TABLE_PAYMENT).select('method_name,token_keys_clientid,secret_keys').eq('method_name', method_name).rows(PaymentMethod).execute()
+            return result.data or None
         except:
             return None
     
     @staticmethod
     def AllUsers():
         try:
-            result = supabase.table(TABLE_USERS).select('id', count='exact').execute()
+            result = supabase.table(TABLE_USERS).count(COUNT_STRATEGY).execute()
             return [(result.count or 0,)]
         except Exception as e:
             logger.error(f"Error counting users: {e}")
@@ -712,7 +2234,7 @@ class GetDataFromDB:
     @staticmethod
     def AllAdmins():
         try:
-            result = supabase.table(TABLE_ADMINS).select('id', count='exact').execute()
+            result = supabase.table(TABLE_ADMINS).count(COUNT_STRATEGY).execute()
             return [(result.count or 0,)]
         except Exception as e:
             logger.error(f"Error counting admins: {e}")
@@ -721,7 +2243,7 @@ class GetDataFromDB:
     @staticmethod
     def AllProducts():
         try:
-            result = supabase.table(TABLE_PRODUCTS).select('id', count='exact').execute()
+            result = supabase.table(TABLE_PRODUCTS).count(COUNT_STRATEGY).execute()
             return [(result.count or 0,)]
         except Exception as e:
             logger.error(f"Error counting products: {e}")
@@ -730,7 +2252,7 @@ class GetDataFromDB:
     @staticmethod
     def AllOrders():
         try:
-            result = supabase.table(TABLE_ORDERS).select('id', count='exact').execute()
+            result = supabase.table(TABLE_ORDERS).count(COUNT_STRATEGY).execute()
             return [(result.count or 0,)]
         except Exception as e:
             logger.error(f"Error counting orders: {e}")
@@ -745,7 +2267,11 @@ class CleanData:
     @staticmethod
     def delete_a_product(productnumber):
         try:
-            supabase.table(TABLE_PRODUCTS).delete().eq('productnumber', productnumber).execute()
+            result = supabase.table(TABLE_PRODUCTS).delete().eq('productnumber', productnumber).execute()
+            if result.error:
+                logger.error(f"Error deleting product: {result.error}")
+                return False
+            bus.publish(PRODUCTS, 'deleted', keys=(productnumber,))
             return True
         except Exception as e:
             logger.error(f"Error deleting product: {e}")
@@ -754,7 +2280,11 @@ class CleanData:
     @staticmethod
     def delete_a_category(category_number):
         try:
-            supabase.table(TABLE_CATEGORIES).delete().eq('categorynumber', category_number).execute()
+            result = supabase.table(TABLE_CATEGORIES).delete().eq('categorynumber', category_number).execute()
+            if result.error:
+                logger.error(f"Error deleting category: {result.error}")
+                return False
+            bus.publish(CATEGORIES, 'deleted', keys=(category_number,))
             return True
         except Exception as e:
             logger.error(f"Error deleting category: {e}")
@@ -788,27 +2318,48 @@ class CanvaAccountDB:
     def add_account(email, authkey):
         """Add a Canva account"""
         try:
+            if CanvaAccountDB.sold_emails([email]):
+                logger.warning(f"Canva account {email} is already sold, not re-added")
+                return False
+            # No status in the payload: new rows default to 'available', existing rows keep theirs
             supabase.table(TABLE_CANVA).upsert({
                 'email': email,
-                'authkey': authkey,
-                'status': 'available'
+                'authkey': authkey
             }, on_conflict='email').execute()
             return True
         except Exception as e:
             logger.error(f"Error adding Canva account: {e}")
             return False
     
+    @staticmethod
+    def sold_emails(emails, chunk_size=200):
+        """Subset of `emails` whose account is already sold/assigned"""
+        emails = list(emails)
+        sold = set()
+        for start in range(0, len(emails), chunk_size):
+            result = (supabase.table(TABLE_CANVA).select('email')
+                      .in_('email', emails[start:start + chunk_size]).neq('status', 'available').fresh().execute())
+            if result.error is not None:
+                raise RuntimeError(f"Could not check existing accounts: {result.error}")
+            sold.update(r['email'] for r in result.data)
+        return sold
+    
     @staticmethod
     def add_and_assign_account(email, buyer_id, order_number):
         """Add a Canva account and assign to buyer immediately (for admin assign feature)"""
         try:
-            supabase.table(TABLE_CANVA).upsert({
+            result = supabase.table(TABLE_CANVA).upsert({
                 'email': email,
                 'authkey': 'admin_assigned',
                 'status': 'sold',
                 'buyer_id': buyer_id,
                 'order_number': order_number
             }, on_conflict='email').execute()
+            if result.error:
+                return False
+            if result.journaled:
+                return QUEUED
+            bus.publish(CANVA_ACCOUNTS, 'assigned', rows=result.data)
             return True
         except Exception as e:
             logger.error(f"Error adding and assigning Canva account: {e}")
@@ -818,29 +2369,112 @@ class CanvaAccountDB:
     def get_available_accounts(count=1):
         """Get available accounts"""
         try:
-            result = supabase.table(TABLE_CANVA).select('*').eq('status', 'available').limit(count).execute()
-            return [(r['id'], r['email'], r['authkey']) for r in result.data] if result.data else []
+            result = supabase.table(TABLE_CANVA).select('id,email,authkey').eq('status', 'available').order('id').limit(count).rows(CanvaAccount).execute()
+            return result.data
         except:
             return []
     
     @staticmethod
-    def get_account_count():
-        """Get count of available accounts"""
+    def claim_accounts(buyer_id, order_number, quantity):
+        """Atomically claim `quantity` available accounts for buyer in one call.
+        All-or-nothing: returns [] if stock is short, so callers fall back to manual delivery."""
         try:
-            result = supabase.table(TABLE_CANVA).select('id', count='exact').eq('status', 'available').execute()
+            result = supabase.rpc('claim_canva_accounts', {
+                'p_buyer_id': buyer_id,
+                'p_order_number': order_number,
+                'p_quantity': quantity
+            }).execute()
+            if result.error:
+                if result.status_code == 404:
+                    logger.error(f"claim_canva_accounts RPC missing - run `python migrate.py` against the database. "
+                                 f"Falling back to per-account claims for order {order_number}: {result.error}")
+                    return CanvaAccountDB._claim_accounts_fallback(buyer_id, order_number, quantity)
+                logger.error(f"Error claiming Canva accounts for order {order_number}: {result.error}")
+                return []
+            bus.publish(CANVA_ACCOUNTS, 'assigned', rows=result.data)
+            return CanvaAccount.from_records(result.data)
+        except Exception as e:
+            logger.error(f"Error claiming Canva accounts: {e}")
+            return []
+    
+    @staticmethod
+    def _claim_accounts_fallback(buyer_id, order_number, quantity):
+        """claim_accounts without the RPC: take each available row with an update that only matches
+        while it is still available, and give them all back if fewer than `quantity` could be taken"""
+        candidates = (supabase.table(TABLE_CANVA).select('id').eq('status', 'available')
+                      .order('id').limit(quantity).fresh().execute())
+        if candidates.error or len(candidates.data) < quantity:
+            return []
+        claimed = []
+        for r in candidates.data:
+            taken = supabase.table(TABLE_CANVA).update({
+                'buyer_id': buyer_id,
+                'order_number': order_number,
+                'status': 'sold'
+            }).eq('id', r['id']).eq('status', 'available').execute()
+            if taken.error or not taken.data:
+                break
+            claimed.extend(taken.data)
+        if len(claimed) < quantity:
+            # Another buyer got one first (or a write failed): all-or-nothing, release what we took
+            if claimed:
+                supabase.table(TABLE_CANVA).update({
+                    'buyer_id': None,
+                    'order_number': None,
+                    'status': 'available'
+                }).in_('id', [r['id'] for r in claimed]).eq('order_number', order_number).execute()
+            return []
+        bus.publish(CANVA_ACCOUNTS, 'assigned', rows=claimed)
+        return CanvaAccount.from_records(claimed)
+    
+    @staticmethod
+    def get_account_count(status='available'):
+        """Get count of accounts with status (None = all accounts)"""
+        try:
+            query = supabase.table(TABLE_CANVA).count('exact')
+            if status is not None:
+                query = query.eq('status', status)
+            result = query.execute()
             return result.count if result.count else 0
         except:
             return 0
     
+    @staticmethod
+    def delete_available_accounts(chunk_size=200):
+        """Delete every unsold account - returns SupabaseBulkResponse: data = rows deleted,
+        queued = rows waiting in the write journal, error set if the accounts could not be listed"""
+        result = SupabaseBulkResponse()
+        try:
+            # Pin the delete to the ids available right now (fresh read): a journaled delete must
+            # not also remove accounts imported by the time it replays
+            query = supabase.table(TABLE_CANVA).select('id').eq('status', 'available').fresh()
+            ids = [r['id'] for r in query.scan(SCAN_PAGE_SIZE)]
+            for start in range(0, len(ids), chunk_size):
+                chunk = ids[start:start + chunk_size]
+                response = supabase.table(TABLE_CANVA).delete().in_('id', chunk).eq('status', 'available').execute()
+                result.add_chunk(len(chunk), response)
+                if response.error is None and not response.journaled:
+                    bus.publish(CANVA_ACCOUNTS, 'deleted', rows=response.data)
+        except Exception as e:
+            logger.error(f"Error deleting available accounts: {e}")
+            if result.error is None:
+                result.error = str(e)
+        return result
+    
     @staticmethod
     def assign_account_to_buyer(account_id, buyer_id, order_number):
         """Assign account to buyer"""
         try:
-            supabase.table(TABLE_CANVA).update({
+            result = supabase.table(TABLE_CANVA).update({
                 'buyer_id': buyer_id,
                 'order_number': order_number,
                 'status': 'sold'
             }).eq('id', account_id).execute()
+            if result.error:
+                return False
+            if result.journaled:
+                return QUEUED
+            bus.publish(CANVA_ACCOUNTS, 'assigned', rows=result.data)
             return True
         except Exception as e:
             logger.error(f"Error assigning account: {e}")
@@ -848,12 +2482,9 @@ class CanvaAccountDB:
     
     @staticmethod
     def get_buyer_accounts(buyer_id):
-        """Get accounts owned by buyer"""
+        """Get accounts owned by buyer (served from buyer_index)"""
         try:
-            result = supabase.table(TABLE_CANVA).select('email,order_number,created_at').eq('buyer_id', buyer_id).execute()
-            if result.data:
-                return [(r['email'], r.get('order_number'), r.get('created_at')) for r in result.data]
-            return []
+            return buyer_index.get(buyer_id)
         except:
             return []
     
@@ -870,17 +2501,40 @@ class CanvaAccountDB:
     def get_all_accounts():
         """Get all accounts"""
         try:
-            result = supabase.table(TABLE_CANVA).select('*').execute()
-            return [(r['id'], r['email'], r['authkey'], r.get('buyer_id'), r.get('order_number'), r['status']) 
-                    for r in result.data] if result.data else []
-        except:
+            return list(CanvaAccountDB.iter_all_accounts())
+        except ScanIncomplete as e:
+            logger.error(str(e))
             return []
     
+    @staticmethod
+    def get_account_by_id(account_id):
+        """Get one account as a CanvaAccountRecord (unpacks like a get_all_accounts() row), or None.
+        Never a stale degraded-mode answer: the assign callback decides on its status."""
+        try:
+            result = supabase.table(TABLE_CANVA).select('id,email,authkey,buyer_id,order_number,status').eq('id', account_id).limit(1).fresh().rows(CanvaAccountRecord).execute()
+            return result.data[0] if result.data else None
+        except:
+            return None
+    
+    @staticmethod
+    def iter_all_accounts(page_size=SCAN_PAGE_SIZE):
+        """Stream all accounts page by page"""
+        try:
+            query = supabase.table(TABLE_CANVA).select('id,email,authkey,buyer_id,order_number,status').rows(CanvaAccountRecord)
+            yield from query.scan(page_size)
+        except ScanIncomplete:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting Canva accounts: {e}")
+    
     @staticmethod
     def delete_account(account_id):
         """Delete account"""
         try:
-            supabase.table(TABLE_CANVA).delete().eq('id', account_id).execute()
+            result = supabase.table(TABLE_CANVA).delete().eq('id', account_id).execute()
+            if result.error:
+                return False
+            bus.publish(CANVA_ACCOUNTS, 'deleted', rows=result.data)
             return True
         except:
             return False
@@ -889,21 +2543,25 @@ class CanvaAccountDB:
     def remove_buyer_from_account(email, buyer_id):
         """Remove buyer from account (make available again)"""
         try:
-            supabase.table(TABLE_CANVA).update({
+            result = supabase.table(TABLE_CANVA).update({
                 'buyer_id': None,
                 'order_number': None,
                 'status': 'available'
             }).eq('email', email).eq('buyer_id', buyer_id).execute()
+            if result.error:
+                return False
+            if result.journaled:
+                return QUEUED
+            bus.publish(CANVA_ACCOUNTS, 'released', rows=result.data)
             return True
         except:
             return False
     
     @staticmethod
-    def import_emails_only(content):
-        """Import emails from content (one per line: email|authkey)"""
-        count = 0
-        lines = content.strip().split('\n')
-        for line in lines:
+    def parse_account_lines(content):
+        """Parse import content (email|authkey or bare email per line) into rows, last duplicate wins"""
+        rows = {}
+        for line in content.strip().split('\n'):
             line = line.strip()
             if '|' in line:
                 parts = line.split('|')
@@ -911,22 +2569,50 @@ class CanvaAccountDB:
                     email = parts[0].strip()
                     authkey = parts[1].strip()
                     if email and authkey:
-                        if CanvaAccountDB.add_account(email, authkey):
-                            count += 1
+                        rows[email] = authkey
             elif '@' in line:
                 # Just email, no authkey
-                email = line.strip()
-                if email:
-                    if CanvaAccountDB.add_account(email, 'no_authkey'):
-                        count += 1
-        return count
+                rows[line] = 'no_authkey'
+        # No status column: new rows get the table default ('available') and a re-import
+        # can never flip a sold account back to available
+        return [{'email': email, 'authkey': authkey} for email, authkey in rows.items()]
+    
+    @staticmethod
+    def import_accounts(content, chunk_size=IMPORT_CHUNK_SIZE):
+        """Bulk upsert accounts in chunks - returns SupabaseBulkResponse with per-chunk results"""
+        rows = CanvaAccountDB.parse_account_lines(content)
+        if not rows:
+            return SupabaseBulkResponse()
+        try:
+            # Sold accounts keep their authkey too - leave them out of the upsert entirely
+            sold = CanvaAccountDB.sold_emails(r['email'] for r in rows)
+            if sold:
+                rows = [r for r in rows if r['email'] not in sold]
+            if rows:
+                result = supabase.table(TABLE_CANVA).upsert(rows, on_conflict='email').bulk(chunk_size).execute()
+            else:
+                result = SupabaseBulkResponse()
+            result.skipped = len(sold)
+            return result
+        except Exception as e:
+            logger.error(f"Error importing Canva accounts: {e}")
+            result = SupabaseBulkResponse()
+            result.add_chunk(len(rows), SupabaseResponse(error=str(e)))
+            return result
+    
+    @staticmethod
+    def import_emails_only(content):
+        """Import emails from content (one per line: email|authkey)"""
+        return CanvaAccountDB.import_accounts(content).succeeded
     
     @staticmethod
     def assign_account_to_user_by_email(canva_email, buyer_id, order_number=None):
         """Assign a specific Canva account to a user by email"""
         try:
             # First check if account exists and is available
-            result = supabase.table(TABLE_CANVA).select('id,status,buyer_id').eq('email', canva_email).execute()
+            result = supabase.table(TABLE_CANVA).select('id,status,buyer_id').eq('email', canva_email).fresh().execute()
+            if result.error:
+                return {'success': False, 'error': str(result.error)}
             if not result.data:
                 return {'success': False, 'error': 'Tài khoản không tồn tại'}
             
@@ -935,11 +2621,16 @@ class CanvaAccountDB:
                 return {'success': False, 'error': f"Tài khoản đã được gán cho user {account['buyer_id']}"}
             
             # Assign to buyer
-            supabase.table(TABLE_CANVA).update({
+            result = supabase.table(TABLE_CANVA).update({
                 'buyer_id': buyer_id,
                 'order_number': order_number or f"ADMIN_{int(datetime.now().timestamp())}",
                 'status': 'sold'
             }).eq('email', canva_email).execute()
+            if result.error:
+                return {'success': False, 'error': str(result.error)}
+            if result.journaled:
+                return {'success': True, 'queued': True}
+            bus.publish(CANVA_ACCOUNTS, 'assigned', rows=result.data)
             
             return {'success': True}
         except Exception as e:
@@ -948,9 +2639,9 @@ class CanvaAccountDB:
     
     @staticmethod
     def get_account_by_email(email):
-        """Get account info by email"""
+        """Get account info by email (never a stale degraded-mode answer: assign flows decide on it)"""
         try:
-            result = supabase.table(TABLE_CANVA).select('*').eq('email', email).execute()
+            result = supabase.table(TABLE_CANVA).select('*').eq('email', email).fresh().execute()
             if result.data:
                 r = result.data[0]
                 return {
@@ -992,54 +2683,215 @@ class PromotionDB:
     def activate_promotion(max_count=10):
         """Activate promotion"""
         try:
-            supabase.table(TABLE_PROMO).upsert({
+            result = supabase.table(TABLE_PROMO).upsert({
                 'promo_name': 'buy1get1',
                 'is_active': 1,
                 'sold_count': 0,
                 'max_count': max_count,
                 'started_at': datetime.now().isoformat()
             }, on_conflict='promo_name').execute()
+            if result.error:
+                return False
+            bus.publish(PROMOTION, 'activated')
             return True
         except:
             return False
     
+    @staticmethod
+    def enable_promotion():
+        """Re-activate promotion with its current slot count, counting from 0"""
+        info = PromotionDB.get_promotion_info()
+        return PromotionDB.activate_promotion(info['max_count'] if info else 10)
+    
     @staticmethod
     def deactivate_promotion():
         """Deactivate promotion"""
         try:
-            supabase.table(TABLE_PROMO).update({
+            result = supabase.table(TABLE_PROMO).update({
                 'is_active': 0
             }).eq('promo_name', 'buy1get1').execute()
+            if result.error:
+                return False
+            bus.publish(PROMOTION, 'deactivated')
             return True
         except:
             return False
     
     @staticmethod
-    def increment_sold_count():
-        """Increment sold count"""
+    def disable_promotion():
+        return PromotionDB.deactivate_promotion()
+    
+    @staticmethod
+    def set_max_count(max_count):
+        """Change number of promotion slots"""
         try:
-            result = supabase.table(TABLE_PROMO).select('sold_count').eq('promo_name', 'buy1get1').execute()
-            if result.data:
-                current = result.data[0]['sold_count']
-                supabase.table(TABLE_PROMO).update({
-                    'sold_count': current + 1
-                }).eq('promo_name', 'buy1get1').execute()
+            result = supabase.table(TABLE_PROMO).update({
+                'max_count': int(max_count)
+            }).eq('promo_name', 'buy1get1').execute()
+            if result.error:
+                return False
+            bus.publish(PROMOTION, 'updated')
             return True
         except:
             return False
     
+    @staticmethod
+    def claim_slots(quantity=1):
+        """Atomically take up to `quantity` slots - see PromotionCounter.claim"""
+        result = promo_counter.claim(quantity)
+        if result and result['granted']:
+            bus.publish(PROMOTION, 'claimed')
+        return result
+    
+    @staticmethod
+    def increment_sold_count(quantity=1):
+        """Increment sold count (atomic, clipped at max_count)"""
+        return PromotionDB.claim_slots(quantity) is not None
+    
     @staticmethod
     def is_promotion_active():
         """Check if promotion is active and not exceeded"""
         try:
-            info = PromotionDB.get_promotion_info()
-            if info and info['is_active'] == 1:
-                return info['sold_count'] < info['max_count']
-            return False
+            return promo_counter.is_active()
         except:
             return False
 
 
+class PromotionCounter:
+    """In-process front for the claim_promotion_slots RPC.
+
+    Concurrent claims are group-committed: whoever finds no RPC in flight sends one
+    call for every queued quantity, then splits the grant among callers in arrival
+    order. The active flag is answered locally and refreshed from each RPC result,
+    so a sold-out or inactive promotion costs no network call.
+    """
+
+    def __init__(self, promo_name='buy1get1', ttl=30):
+        self.promo_name = promo_name
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._queue = []          # [(quantity, slot)] waiting for the next RPC
+        self._sending = False
+        self._state = None        # (is_active, sold_count, max_count)
+        self._state_at = 0
+        self._rpc_calls = 0
+        self._claims = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._state = None
+
+    def on_change(self, event):
+        # Our own claims already left the counter's state current
+        if event.action != 'claimed' or event.remote:
+            self.invalidate()
+
+    def _fresh_state(self):
+        if self._state is not None and time.monotonic() - self._state_at < self.ttl:
+            return self._state
+        return None
+
+    def is_active(self):
+        with self._lock:
+            state = self._fresh_state()
+        if state is None:
+            info = PromotionDB.get_promotion_info()
+            if info is None:
+                return False
+            state = (info['is_active'], info['sold_count'], info['max_count'])
+            with self._lock:
+                self._state, self._state_at = state, time.monotonic()
+        return state[0] == 1 and state[1] < state[2]
+
+    def claim(self, quantity):
+        """Returns {'granted', 'slot_start', 'sold_count', 'max_count', 'is_active'} or None on error"""
+        with self._lock:
+            self._claims += 1
+            state = self._fresh_state()
+            if state is not None and (state[0] != 1 or state[1] >= state[2]):
+                return {'granted': 0, 'slot_start': state[1] + 1, 'sold_count': state[1],
+                        'max_count': state[2], 'is_active': state[0]}
+            slot = {'done': threading.Event(), 'result': None}
+            self._queue.append((quantity, slot))
+            leader = not self._sending
+            if leader:
+                self._sending = True
+
+        if not leader:
+            slot['done'].wait()
+            return slot['result']
+
+        # Leader: keep sending batches until nobody is waiting
+        batch, drained = [], False
+        try:
+            while True:
+                with self._lock:
+                    batch, self._queue = self._queue, []
+                    if not batch:
+                        self._sending = False
+                        drained = True
+                        break
+                self._send(batch)
+        except Exception as e:
+            logger.error(f"Error claiming promotion slots: {e}")
+        finally:
+            if not drained:
+                # The leader died mid-batch: give up leadership and fail everyone still waiting
+                with self._lock:
+                    stranded, self._queue = batch + self._queue, []
+                    self._sending = False
+                for _, waiting in stranded:
+                    if not waiting['done'].is_set():
+                        waiting['result'] = None
+                        waiting['done'].set()
+        return slot['result']
+
+    def _send(self, batch):
+        total = sum(quantity for quantity, _ in batch)
+        row = None
+        try:
+            result = supabase.rpc('claim_promotion_slots', {
+                'p_promo_name': self.promo_name,
+                'p_quantity': total
+            }).execute()
+            if not result.error and result.data:
+                row = result.data[0]
+        except Exception as e:
+            logger.error(f"Error claiming promotion slots: {e}")
+
+        with self._lock:
+            self._rpc_calls += 1
+            if row is not None:
+                self._state = (row['promo_is_active'], row['new_sold_count'], row['promo_max_count'])
+                self._state_at = time.monotonic()
+
+        remaining = row['granted'] if row else 0
+        next_slot = row['slot_start'] if row else 0
+        for quantity, slot in batch:
+            if row is None:
+                slot['result'] = None
+            else:
+                granted = min(quantity, remaining)
+                slot['result'] = {
+                    'granted': granted,
+                    'slot_start': next_slot,
+                    'sold_count': row['new_sold_count'],
+                    'max_count': row['promo_max_count'],
+                    'is_active': row['promo_is_active']
+                }
+                remaining -= granted
+                next_slot += granted
+            slot['done'].set()
+
+    def stats(self):
+        with self._lock:
+            return {'claims': self._claims, 'rpc_calls': self._rpc_calls, 'state': self._state}
+
+
+promo_counter = PromotionCounter()
+bus.subscribe(PROMOTION, promo_counter.on_change)
+
+
 # ============== BACKWARD COMPATIBILITY ==============
 
 class CreateTables:
@@ -4,7 +4,9 @@ This ensures port opens within Render's 60 second requirement
 """
 
 import os
+import sys
 import time
+import signal
 import logging
 import threading
 from flask import Flask, request
@@ -130,8 +132,18 @@ def keep_alive():
         except Exception as e:
             logger.warning(f"Keep-alive failed: {e}")
 
+def handle_sigterm(signum, frame):
+    """Save the cache snapshot, then exit normally on SIGTERM so atexit hooks (deferred DB writes) run"""
+    logger.info("SIGTERM received, shutting down...")
+    # Only once the bot restored it: an uninitialized process would overwrite it with empty caches
+    if _bot_ready:
+        from performance import cache_snapshot
+        cache_snapshot.shutdown()
+    sys.exit(0)
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", "10000"))
+    signal.signal(signal.SIGTERM, handle_sigterm)
     
     logger.info("=" * 50)
     logger.info(f"Starting Flask on port {port}...")
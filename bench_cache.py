@@ -0,0 +1,66 @@
+"""
+Benchmark: TTLCache (one lock) vs ShardedTTLCache (lock-striped) under concurrent handlers
+Each thread runs a rate_limit_cache style mix (90% get, 10% set) over a shared
+key space. Also shows expired keys held until the sweeper runs.
+
+Usage: python bench_cache.py [ops_per_thread] [keys]
+"""
+
+import sys
+import time
+import random
+import threading
+
+from performance import TTLCache, ShardedTTLCache
+
+
+def worker(cache, keys, ops, seed, barrier):
+    rng = random.Random(seed)
+    picks = [rng.randrange(keys) for _ in range(ops)]
+    barrier.wait()
+    for i, key in enumerate(picks):
+        if i % 10 == 0:
+            cache.set(key, i)
+        else:
+            cache.get(key)
+
+
+def run(cache, threads, keys, ops):
+    barrier = threading.Barrier(threads + 1)
+    pool = [threading.Thread(target=worker, args=(cache, keys, ops, n, barrier)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in pool:
+        t.join()
+    return threads * ops / (time.perf_counter() - start)
+
+
+def sweep_demo(keys):
+    cache = ShardedTTLCache(maxsize=keys, ttl=0.05)
+    for key in range(keys):
+        cache.set(key, key)
+    time.sleep(0.1)
+    before = cache.stats()['size']
+    removed = cache.sweep()
+    return before, removed, cache.stats()['size']
+
+
+def main():
+    ops = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    keys = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    print(f"{ops} ops per thread over {keys} keys (90% get / 10% set), GIL enabled: "
+          f"{getattr(sys, '_is_gil_enabled', lambda: True)()}")
+    print(f"{'threads':>8}{'TTLCache':>14}{'Sharded':>14}{'ratio':>8}")
+    for threads in (1, 2, 4, 8, 16):
+        single = run(TTLCache(maxsize=keys, ttl=300), threads, keys, ops)
+        sharded = run(ShardedTTLCache(maxsize=keys, ttl=300), threads, keys, ops)
+        print(f"{threads:>8}{single:>11.0f}/s{sharded:>11.0f}/s{sharded / single:>7.2f}x")
+
+    before, removed, after = sweep_demo(keys)
+    print(f"Expired keys: {before} held before sweep, {removed} swept, {after} left")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: Canva account import - per-row upsert loop vs chunked bulk upsert
+Runs offline against the local fake PostgREST server with a fixed injected latency.
+
+Usage: python bench_canva_import.py [rows] [latency_ms] [chunk_size]
+"""
+
+import sys
+import time
+
+import InDMDevDB
+from InDMDevDB import CanvaAccountDB
+from fake_postgrest import FakePostgREST
+
+
+def make_content(rows):
+    return '\n'.join(f"user{i}@bench.test|key{i}" for i in range(rows))
+
+
+def run_per_row(content, latency):
+    server = FakePostgREST(latency=latency).start()
+    InDMDevDB.supabase = server.client()
+    start = time.perf_counter()
+    count = 0
+    for row in CanvaAccountDB.parse_account_lines(content):
+        if CanvaAccountDB.add_account(row['email'], row['authkey']):
+            count += 1
+    elapsed = time.perf_counter() - start
+    server.stop()
+    return elapsed, server.request_count, count
+
+
+def run_bulk(content, latency, chunk_size):
+    server = FakePostgREST(latency=latency).start()
+    InDMDevDB.supabase = server.client()
+    start = time.perf_counter()
+    result = CanvaAccountDB.import_accounts(content, chunk_size=chunk_size)
+    elapsed = time.perf_counter() - start
+    server.stop()
+    return elapsed, server.request_count, result.succeeded
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    chunk_size = int(sys.argv[3]) if len(sys.argv) > 3 else InDMDevDB.IMPORT_CHUNK_SIZE
+
+    content = make_content(rows)
+
+    print(f"Importing {rows} rows, simulated RTT {latency * 1000:.0f}ms, chunk size {chunk_size}")
+    for name, runner in (("per-row", lambda: run_per_row(content, latency)),
+                         ("bulk", lambda: run_bulk(content, latency, chunk_size))):
+        elapsed, requests_made, imported = runner()
+        print(f"{name:>8}: {elapsed:8.2f}s  {requests_made:5d} requests  {imported} rows imported")
+
+
+if __name__ == "__main__":
+    main()
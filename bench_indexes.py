@@ -0,0 +1,92 @@
+"""
+Benchmark: hot bot queries before and after the migrations/ indexes
+Seeds orders and Canva accounts into a local SQLite stand-in (the same engine that serves
+DB_BACKEND=sqlite), times the data-layer calls, applies the migrations and times them again.
+
+Usage: python bench_indexes.py [orders] [accounts] [repeat]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+import InDMDevDB
+from InDMDevDB import SQLiteClient, GetDataFromDB, CanvaAccountDB, BuyerIndex, TABLE_CANVA, buyer_index
+
+
+def seed(store, orders, accounts, buyers):
+    rng = random.Random(42)
+    conn = store.connection()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO shopordertable (buyerid, buyerusername, productname, productprice, paidmethod, ordernumber, productnumber) "
+        "VALUES (?, ?, 'Canva Edu Admin', '30000', ?, ?, 1)",
+        ((rng.randrange(buyers), f"user{i}", 'PENDING' if rng.random() < 0.02 else 'PayOS', 100000 + i)
+         for i in range(orders)))
+    rows = []
+    for i in range(accounts):
+        if rng.random() < 0.2:
+            rows.append((f"acc{i}@bench.test", f"key{i}", None, None, 'available'))
+        else:
+            rows.append((f"acc{i}@bench.test", f"key{i}", rng.randrange(buyers), 100000 + i, 'sold'))
+    conn.executemany(
+        "INSERT INTO canvaaccounttable (email, authkey, buyer_id, order_number, status) VALUES (?, ?, ?, ?, ?)", rows)
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+
+
+def queries(buyers):
+    rng = random.Random(7)
+    return [
+        ("GetOrderHistory_Buyer", lambda: GetDataFromDB.GetOrderHistory_Buyer(rng.randrange(buyers))),
+        ("GetAllUnfirmedOrdersUser", lambda: GetDataFromDB.GetAllUnfirmedOrdersUser(rng.randrange(buyers))),
+        ("get_available_accounts(10)", lambda: CanvaAccountDB.get_available_accounts(10)),
+        ("get_account_count('available')", lambda: CanvaAccountDB.get_account_count('available')),
+        # The query behind the buyer index's point lookup, timed against the database itself
+        ("buyer accounts query", lambda: InDMDevDB.supabase.table(TABLE_CANVA).select(BuyerIndex.COLUMNS)
+            .eq('buyer_id', rng.randrange(buyers)).execute()),
+        # What the bot actually calls: answered from the warmed in-memory index, indexes don't apply
+        ("get_buyer_accounts (in-memory)", lambda: CanvaAccountDB.get_buyer_accounts(rng.randrange(buyers))),
+    ]
+
+
+def measure(buyers, repeat):
+    results = {}
+    for name, call in queries(buyers):
+        call()  # warm the page cache
+        start = time.perf_counter()
+        for _ in range(repeat):
+            call()
+        results[name] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+
+def main():
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    buyers = max(orders // 5, 1)
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_indexes.db")
+    client = SQLiteClient(path, migrate=False)
+    InDMDevDB.supabase = client
+
+    print(f"Seeding {orders} orders and {accounts} accounts into {path}")
+    seed(client.store, orders, accounts, buyers)
+    buyer_index.warm()
+
+    before = measure(buyers, repeat)
+    applied = client.store.migrate()
+    client.store.connection().execute("ANALYZE")
+    after = measure(buyers, repeat)
+
+    print(f"Applied migrations {applied}, {repeat} calls per query")
+    print(f"{'query':<34}{'before':>10}{'after':>10}{'speedup':>10}")
+    for name in before:
+        print(f"{name:<34}{before[name]:>8.2f}ms{after[name]:>8.2f}ms{before[name] / after[name]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: memory and allocations for a large order fetch
+Decodes a PostgREST-style JSON body and materialises it three ways:
+- dicts:  keep the decoded dicts
+- tuples: the old getters - decode dicts, then rebuild each row as a positional tuple
+- rows:   db_rows.Order slotted objects decoded straight from the body (json object_hook,
+          what SupabaseRESTTable.rows() does), so the dict list never exists as a whole
+
+Usage: python bench_rows.py [rows]
+"""
+
+import gc
+import sys
+import json
+import time
+import tracemalloc
+
+from db_rows import Order
+
+
+def make_body(rows):
+    return json.dumps([{
+        'buyerid': 1000 + i % 5000, 'buyerusername': f"user{i % 5000}", 'productname': 'Canva Edu Admin',
+        'productprice': '30000', 'orderdate': f"2026-01-{i % 28 + 1:02d} 12:00:00", 'paidmethod': 'PayOS',
+        'productdownloadlink': '', 'productkeys': f"acc{i}@mail.test", 'buyercomment': '',
+        'ordernumber': 100000 + i, 'productnumber': 1,
+    } for i in range(rows)])
+
+
+def as_dicts(body):
+    return json.loads(body)
+
+
+def as_tuples(body):
+    return [(r['buyerid'], r['buyerusername'], r['productname'], r['productprice'], r.get('orderdate', ''),
+             r['paidmethod'], r.get('productdownloadlink', ''), r.get('productkeys', 'NIL'),
+             r.get('buyercomment', ''), r['ordernumber'], r.get('productnumber', ''))
+            for r in json.loads(body)]
+
+
+def as_rows(body):
+    return json.loads(body, object_hook=Order.from_record)
+
+
+def measure(build, body):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(body)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    del result
+    return elapsed, retained, peak, blocks
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    body = make_body(rows)
+    print(f"{rows} order rows, {len(body) / 1e6:.1f} MB JSON body")
+    print(f"{'shape':<8}{'time':>10}{'retained':>12}{'peak':>12}{'live blocks':>14}")
+    for name, build in (("dicts", as_dicts), ("tuples", as_tuples), ("rows", as_rows)):
+        elapsed, retained, peak, blocks = measure(build, body)
+        print(f"{name:<8}{elapsed * 1000:>8.0f}ms{retained / 1e6:>10.1f}MB{peak / 1e6:>10.1f}MB{blocks:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+Shared cache backends for multi-worker deployments
+- CacheBackend: key/value store shared by every worker plus a broadcast channel, so one
+  worker's invalidation (or data-layer change event) reaches the in-process caches of the others
+- SQLiteCacheBackend: a WAL-mode SQLite file on the host's disk (several gunicorn workers on one box)
+- RedisCacheBackend: speaks the Redis protocol (GET/SET/DEL/KEYS/PUBLISH/SUBSCRIBE) directly over
+  a socket, no client library needed; fake_redis.FakeRedis serves it locally
+- Values are pickled; only point it at storage the bot owns
+
+Selected by CACHE_BACKEND=local (default, no sharing) | sqlite | redis, see backend_from_env()
+"""
+
+import os
+import time
+import uuid
+import pickle
+import socket
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    """Base class: subclasses implement get/set/delete/clear plus _publish and _listen"""
+
+    name = "base"
+
+    def __init__(self):
+        # Messages carry their sender so a worker ignores its own broadcasts
+        self.origin = uuid.uuid4().hex
+        self._listeners = []
+        self._listening = False
+        self._listen_lock = threading.Lock()
+        self._sent = 0
+        self._received = 0
+        self._errors = 0
+
+    @abstractmethod
+    def get(self, key):
+        """(True, value) or (False, None) when missing, expired, unreachable or undecodable"""
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        """Store value for ttl seconds"""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove one key"""
+
+    @abstractmethod
+    def clear(self, prefix):
+        """Remove every key starting with prefix"""
+
+    def publish(self, message):
+        """Broadcast a dict to every other worker's listeners"""
+        message = dict(message, origin=self.origin)
+        try:
+            self._publish(pickle.dumps(message, pickle.HIGHEST_PROTOCOL))
+            self._sent += 1
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Cache backend {self.name}: publish failed: {e}")
+
+    def listen(self, callback):
+        """Call callback(message) for messages published by other workers"""
+        with self._listen_lock:
+            self._listeners.append(callback)
+            if not self._listening:
+                self._listening = True
+                threading.Thread(target=self._listen, name=f"cache-{self.name}-listener", daemon=True).start()
+
+    def _deliver(self, raw):
+        try:
+            message = pickle.loads(raw)
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Cache backend {self.name}: undecodable message: {e}")
+            return
+        if message.get('origin') == self.origin:
+            return
+        self._received += 1
+        for callback in list(self._listeners):
+            try:
+                callback(message)
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Cache backend {self.name}: listener failed: {e}")
+
+    def _decode(self, raw):
+        """Unpickle a stored value; a corrupt or incompatible entry counts as a miss"""
+        try:
+            return True, pickle.loads(raw)
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Cache backend {self.name}: undecodable value, treated as a miss: {e}")
+            return False, None
+
+    @abstractmethod
+    def _publish(self, raw):
+        """Send raw bytes to every worker"""
+
+    @abstractmethod
+    def _listen(self):
+        """Run forever on the listener thread, passing received bytes to _deliver()"""
+
+    def stats(self):
+        return {'backend': self.name, 'sent': self._sent, 'received': self._received, 'errors': self._errors}
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """Shared SQLite file: cache_entries for values, cache_messages as a polled broadcast log"""
+
+    name = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS cache_messages (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        body BLOB NOT NULL,
+        sent_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path, poll_interval=0.5, message_retention=300):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.message_retention = message_retention
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        self._cursor = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM cache_messages").fetchone()[0]
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._conn().execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?", (key, time.time())).fetchone()
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Cache backend sqlite: get failed: {e}")
+            return False, None
+        if row is None:
+            return False, None
+        return self._decode(row[0])
+
+    def set(self, key, value, ttl):
+        try:
+            self._conn().execute(
+                "INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + ttl))
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Cache backend sqlite: set failed: {e}")
+
+    def delete(self, key):
+        try:
+            self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Cache backend sqlite: delete failed: {e}")
+
+    def clear(self, prefix):
+        try:
+            self._conn().execute("DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Cache backend sqlite: clear failed: {e}")
+
+    def _publish(self, raw):
+        self._conn().execute("INSERT INTO cache_messages (body, sent_at) VALUES (?, ?)", (raw, time.time()))
+
+    def _listen(self):
+        polls = 0
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                rows = self._conn().execute(
+                    "SELECT seq, body FROM cache_messages WHERE seq > ? ORDER BY seq", (self._cursor,)).fetchall()
+                for seq, body in rows:
+                    self._cursor = seq
+                    self._deliver(body)
+                polls += 1
+                if polls % 100 == 0:
+                    self._prune()
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Cache backend sqlite: poll failed: {e}")
+
+    def _prune(self):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_messages WHERE sent_at < ?", (now - self.message_retention,))
+        conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+
+
+class _RESPConnection:
+    """One Redis protocol connection; commands are serialised by a lock"""
+
+    def __init__(self, host, port, password=None, db=0, timeout=2):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.db = db
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile('rb')
+        if self.password:
+            self._roundtrip(b"AUTH", self.password)
+        if self.db:
+            self._roundtrip(b"SELECT", self.db)
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    @staticmethod
+    def _encode(args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode()
+            elif not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _roundtrip(self, *args):
+        self._sock.sendall(self._encode(args))
+        return self.read()
+
+    def read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self._file.read(size + 2)
+            return data[:-2]
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [self.read() for _ in range(size)]
+        raise RuntimeError(f"Unexpected reply {line!r}")
+
+    def command(self, *args):
+        """Send a command, reconnecting once if the connection dropped"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._roundtrip(*args)
+                except (OSError, ConnectionError):
+                    self.close()
+                    if attempt:
+                        raise
+
+    def send(self, *args):
+        """Fire a command without reading (subscriber mode)"""
+        if self._sock is None:
+            self._connect()
+        self._sock.sendall(self._encode(args))
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis (or anything speaking its protocol) - keys with PX expiry, PUBLISH/SUBSCRIBE broadcast"""
+
+    name = "redis"
+
+    def __init__(self, url="redis://127.0.0.1:6379/0", channel="indmdev:cache"):
+        super().__init__()
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.strip("/") or 0)
+        self.channel = channel
+        self._conn = _RESPConnection(self.host, self.port, self.password, self.db)
+
+    def _call(self, *args):
+        try:
+            return self._conn.command(*args)
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Cache backend redis: {args[0]} failed: {e}")
+            return None
+
+    def get(self, key):
+        raw = self._call("GET", key)
+        if raw is None:
+            return False, None
+        return self._decode(raw)
+
+    def set(self, key, value, ttl):
+        self._call("SET", key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), "PX", max(1, int(ttl * 1000)))
+
+    def delete(self, key):
+        self._call("DEL", key)
+
+    def clear(self, prefix):
+        keys = self._call("KEYS", prefix + "*") or []
+        if keys:
+            self._call("DEL", *keys)
+
+    def _publish(self, raw):
+        self._conn.command("PUBLISH", self.channel, raw)
+
+    def _listen(self):
+        while True:
+            conn = _RESPConnection(self.host, self.port, self.password, self.db, timeout=None)
+            try:
+                conn.send("SUBSCRIBE", self.channel)
+                while True:
+                    reply = conn.read()
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        self._deliver(reply[2])
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Cache backend redis: subscription lost, reconnecting: {e}")
+                time.sleep(1)
+            finally:
+                conn.close()
+
+
+def backend_from_env():
+    """Shared backend from CACHE_BACKEND / CACHE_FILE / REDIS_URL, or None for process-local caching"""
+    kind = os.getenv('CACHE_BACKEND', 'local').lower()
+    try:
+        if kind == 'sqlite':
+            return SQLiteCacheBackend(os.getenv('CACHE_FILE') or 'InDMDevDBCache.db')
+        if kind == 'redis':
+            return RedisCacheBackend(os.getenv('REDIS_URL') or 'redis://127.0.0.1:6379/0')
+    except Exception as e:
+        logger.error(f"Shared cache backend '{kind}' unavailable, using process-local caches: {e}")
+    return None
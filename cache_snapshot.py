@@ -0,0 +1,143 @@
+"""
+Persistent cache snapshot for warm restarts
+- Named sources (caches, indexes, the catalog) register export()/restore(state, age) callables
+- save() writes every source into one zlib-compressed pickle file, atomically (temp file + rename)
+- load() at boot hands each source its state and the snapshot age; sources decide what is
+  still usable and revalidate the rest lazily
+- The file carries a format version and a per-source schema version; anything that does
+  not match is ignored rather than restored
+- Checkpoints every `interval` seconds on a daemon thread, and once more on shutdown (the
+  process's SIGTERM hook calls shutdown(); interpreter exit covers other exits)
+"""
+
+import os
+import time
+import zlib
+import atexit
+import pickle
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IDMCACHE"
+FORMAT_VERSION = 1
+
+
+class CacheSnapshot:
+
+    def __init__(self, path, interval=300, max_age=86400):
+        self.path = path
+        self.interval = interval
+        self.max_age = max_age
+        self._sources = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._saves = 0
+        self._last_save = None
+        self._last_size = 0
+        self._restored = []
+        self._final_saved = False
+
+    def register(self, name, export, restore, version=1):
+        """export() -> picklable state; restore(state, age_seconds) loads it back"""
+        self._sources[name] = (export, restore, version)
+
+    def save(self):
+        """Write all sources; a source that fails to export is left out. Returns bytes written."""
+        sources = {}
+        for name, (export, _, version) in list(self._sources.items()):
+            try:
+                sources[name] = (version, pickle.dumps(export(), pickle.HIGHEST_PROTOCOL))
+            except Exception as e:
+                logger.error(f"Cache snapshot: could not export {name}: {e}")
+        data = MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(
+            pickle.dumps({'saved_at': time.time(), 'sources': sources}, pickle.HIGHEST_PROTOCOL))
+
+        with self._lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._saves += 1
+            self._last_save = time.time()
+            self._last_size = len(data)
+        logger.info(f"Cache snapshot saved: {len(sources)} sources, {len(data)} bytes")
+        return len(data)
+
+    def load(self):
+        """Restore registered sources from the file. Returns the names restored."""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            logger.error(f"Cache snapshot: could not read {self.path}: {e}")
+            return []
+
+        if data[:len(MAGIC)] != MAGIC or data[len(MAGIC):len(MAGIC) + 1] != bytes([FORMAT_VERSION]):
+            logger.warning(f"Cache snapshot {self.path}: unknown format, ignored")
+            return []
+        try:
+            snapshot = pickle.loads(zlib.decompress(data[len(MAGIC) + 1:]))
+        except Exception as e:
+            logger.error(f"Cache snapshot {self.path} is corrupt, ignored: {e}")
+            return []
+
+        age = max(0.0, time.time() - snapshot['saved_at'])
+        if age > self.max_age:
+            logger.info(f"Cache snapshot is {age / 3600:.1f}h old, ignored")
+            return []
+
+        restored = []
+        for name, (version, blob) in snapshot['sources'].items():
+            source = self._sources.get(name)
+            if source is None or source[2] != version:
+                continue
+            try:
+                source[1](pickle.loads(blob), age)
+                restored.append(name)
+            except Exception as e:
+                logger.error(f"Cache snapshot: could not restore {name}: {e}")
+        self._restored = restored
+        logger.info(f"Cache snapshot restored ({age:.0f}s old): {', '.join(restored) or 'nothing'}")
+        return restored
+
+    def start(self):
+        """Periodic checkpoints plus a final save at exit"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="cache-snapshot", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        """Final save, once - whichever of the shutdown hook and interpreter exit comes first"""
+        with self._lock:
+            if self._final_saved or self._thread is None:
+                return
+            self._final_saved = True
+        self._save_quietly()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self._save_quietly()
+
+    def _save_quietly(self):
+        try:
+            self.save()
+        except Exception as e:
+            logger.error(f"Cache snapshot save failed: {e}")
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'saves': self._saves,
+            'last_save': self._last_save,
+            'bytes': self._last_size,
+            'restored': list(self._restored)
+        }
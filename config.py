@@ -21,7 +21,8 @@ class BotConfig:
     STORE_NAME = os.getenv('STORE_NAME', 'Telegram Store')
     
     # Database Settings
-    DB_FILE = 'InDMDevDBShop.db'
+    DB_BACKEND = os.getenv('DB_BACKEND', 'supabase')  # supabase | sqlite
+    DB_FILE = os.getenv('DB_FILE', 'InDMDevDBShop.db')
     DB_BACKUP_INTERVAL = 3600  # 1 hour in seconds
     
     # Payment Settings
@@ -0,0 +1,117 @@
+"""
+Row types returned by InDMDevDB getters
+- One __slots__ object per row, built straight from the decoded PostgREST record
+  (no per-row dict or intermediate tuple is kept)
+- Attribute access (order.ordernumber) and the legacy tuple protocol
+  (unpacking, row[0], len, ==/hash against tuples) in the historical field order
+"""
+
+
+class Row:
+    """Base row: subclasses list their columns in __slots__, in tuple order"""
+
+    __slots__ = ()
+    _fields = ()
+    _defaults = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Subclasses extend their parent's layout
+        cls._fields = tuple(base_field for base in reversed(cls.__mro__[1:])
+                            for base_field in base.__dict__.get('__slots__', ())) + tuple(cls.__slots__)
+
+    def __init__(self, *values):
+        if len(values) != len(self._fields):
+            raise TypeError(f"{type(self).__name__} takes {len(self._fields)} values, got {len(values)}")
+        for name, value in zip(self._fields, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_record(cls, record):
+        """Build from a response dict; missing columns fall back to _defaults (then None)"""
+        row = cls.__new__(cls)
+        defaults = cls._defaults
+        for name in cls._fields:
+            setattr(row, name, record.get(name, defaults.get(name)))
+        return row
+
+    @classmethod
+    def from_records(cls, records):
+        return [cls.from_record(r) for r in records] if records else []
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __iter__(self):
+        for name in self._fields:
+            yield getattr(self, name)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        return getattr(self, self._fields[index])
+
+    def __eq__(self, other):
+        if isinstance(other, (Row, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({values})"
+
+    def __getstate__(self):
+        return tuple(self)
+
+    def __setstate__(self, state):
+        for name, value in zip(self._fields, state):
+            setattr(self, name, value)
+
+
+class User(Row):
+    __slots__ = ('user_id', 'username', 'wallet')
+
+
+class UserWithDate(User):
+    __slots__ = ('created_at',)
+
+
+class Product(Row):
+    __slots__ = ('productnumber', 'productname', 'productprice', 'productdescription',
+                 'productimagelink', 'productdownloadlink', 'productquantity', 'productcategory')
+
+
+class Order(Row):
+    __slots__ = ('buyerid', 'buyerusername', 'productname', 'productprice', 'orderdate', 'paidmethod',
+                 'productdownloadlink', 'productkeys', 'buyercomment', 'ordernumber', 'productnumber')
+    _defaults = {'orderdate': '', 'productdownloadlink': '', 'productkeys': 'NIL',
+                 'buyercomment': '', 'productnumber': ''}
+
+
+class OrderSummary(Row):
+    """Admin order list entry"""
+    __slots__ = ('ordernumber', 'productname', 'buyerusername', 'orderdate')
+
+
+class CanvaAccount(Row):
+    __slots__ = ('id', 'email', 'authkey')
+
+
+class CanvaAccountRecord(CanvaAccount):
+    """Full stock row including the sale state"""
+    __slots__ = ('buyer_id', 'order_number', 'status')
+
+
+class PurchasedAccount(Row):
+    """An account as seen by its buyer"""
+    __slots__ = ('email', 'order_number', 'created_at')
+
+
+class PaymentMethod(Row):
+    __slots__ = ('method_name', 'token_keys_clientid', 'secret_keys')
@@ -0,0 +1,192 @@
+"""
+Local PostgREST-compatible fake server
+- Serves /rest/v1/<table> and /rest/v1/rpc/<function> over real HTTP on localhost
+- Requests are executed by sqlite_backend.SQLiteStore (in-memory by default), so the
+  select/filter/order/limit, upsert on_conflict, PATCH, DELETE and Prefer count/return
+  subset behaves the same as DB_BACKEND=sqlite
+- Injected latency / jitter / 503 error rate to exercise timeouts, retries and the circuit breaker
+- Plugs into SupabaseRESTClient through its base URL
+
+In-process:
+    with FakePostgREST(latency=0.02) as server:
+        InDMDevDB.supabase = server.client()
+
+Standalone (point SUPABASE_URL at it):
+    python fake_postgrest.py [port] [latency_ms]
+"""
+
+import sys
+import json
+import time
+import random
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+from sqlite_backend import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+REST_PREFIX = "/rest/v1/"
+
+
+def _parse_params(query):
+    """Query string -> params dict; repeated keys (two filters on one column) become lists"""
+    params = {}
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        if key in params:
+            existing = params[key]
+            params[key] = existing + [value] if isinstance(existing, list) else [existing, value]
+        else:
+            params[key] = value
+    return params
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY every keep-alive
+    # request would stall on the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_HEAD(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def do_PATCH(self):
+        self._dispatch()
+
+    def do_DELETE(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        fake = self.server.fake
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        fake._record(self.command)
+        fake._delay()
+
+        if not url.path.startswith(REST_PREFIX):
+            return self._send(404, {"code": "PGRST125", "message": f"Invalid path {url.path}"})
+        if fake.error_rate and random.random() < fake.error_rate:
+            return self._send(503, {"code": "PGRST503", "message": "Injected failure"})
+
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            return self._send(400, {"code": "PGRST102", "message": "Invalid JSON body"})
+
+        params = _parse_params(url.query)
+        status, rows, count, error = fake.store.handle(
+            self.command, url.path[len(REST_PREFIX):], params,
+            {"Prefer": self.headers.get("Prefer", "")}, payload)
+
+        if error is not None:
+            return self._send(status, error)
+
+        headers = {}
+        if self.command in ("GET", "HEAD"):
+            start = int(params.get("offset", 0) or 0)
+            span = f"{start}-{start + len(rows) - 1}" if rows else "*"
+            headers["Content-Range"] = f"{span}/{count if count is not None else '*'}"
+        self._send(status, rows, headers)
+
+    def _send(self, status, body, headers=None):
+        data = b"" if self.command == "HEAD" else json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class FakePostgREST:
+    """PostgREST stand-in on a background thread. port=0 picks a free port."""
+
+    def __init__(self, path=":memory:", latency=0.0, jitter=0.0, error_rate=0.0, host="127.0.0.1", port=0):
+        self.store = SQLiteStore(path)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self._thread = None
+        self._lock = threading.Lock()
+        self._requests = {}
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-postgrest", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def client(self, **kwargs):
+        """SupabaseRESTClient pointed at this server"""
+        from InDMDevDB import SupabaseRESTClient
+        return SupabaseRESTClient(self.base_url, "fake-anon-key", **kwargs)
+
+    def _delay(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _record(self, method):
+        with self._lock:
+            self._requests[method] = self._requests.get(method, 0) + 1
+
+    @property
+    def request_count(self):
+        with self._lock:
+            return sum(self._requests.values())
+
+    def stats(self):
+        with self._lock:
+            return dict(self._requests)
+
+    def reset_stats(self):
+        with self._lock:
+            self._requests.clear()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 54321
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 0) / 1000
+    server = FakePostgREST(path="fake_postgrest.db", latency=latency, port=port).start()
+    print(f"Fake PostgREST on {server.base_url} (latency {latency * 1000:.0f}ms) - Ctrl+C to stop")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Local Redis-protocol stand-in
+- Serves the subset RedisCacheBackend uses: PING, AUTH, SELECT, GET, SET [EX|PX], DEL, KEYS,
+  FLUSHDB, PUBLISH, SUBSCRIBE
+- In-memory, one keyspace, expiry checked on access
+- Lets CACHE_BACKEND=redis and multi-worker invalidation be exercised without a Redis server
+
+In-process:
+    with FakeRedis() as server:
+        backend = RedisCacheBackend(server.url)
+
+Standalone (point REDIS_URL at it):
+    python fake_redis.py [port]
+"""
+
+import sys
+import time
+import fnmatch
+import logging
+import threading
+import socketserver
+
+logger = logging.getLogger(__name__)
+
+
+def _bulk(value):
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def _array(items):
+    return b"*%d\r\n" % len(items) + b"".join(items)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        super().setup()
+        self._write_lock = threading.Lock()
+
+    def handle(self):
+        fake = self.server.fake
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, OSError, ValueError):
+                break
+            if args is None:
+                break
+            reply = fake._execute(self, args)
+            if reply is not None:
+                self.write(reply)
+        fake._unsubscribe(self)
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def write(self, data):
+        with self._write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+
+class FakeRedis:
+    """Redis stand-in on a background thread. port=0 picks a free port."""
+
+    def __init__(self, host="127.0.0.1", port=0):
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._lock = threading.Lock()
+        self._data = {}
+        self._expires = {}
+        self._subscribers = {}
+        self._commands = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-redis", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _live(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and time.monotonic() >= expires:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _execute(self, client, args):
+        name = args[0].upper()
+        with self._lock:
+            self._commands += 1
+            if name == b"PING":
+                return b"+PONG\r\n"
+            if name in (b"AUTH", b"SELECT"):
+                return b"+OK\r\n"
+            if name == b"GET":
+                return _bulk(self._data.get(args[1]) if self._live(args[1]) else None)
+            if name == b"SET":
+                key, value = args[1], args[2]
+                self._data[key] = value
+                self._expires.pop(key, None)
+                options = [a.upper() for a in args[3:]]
+                for unit, scale in ((b"EX", 1), (b"PX", 0.001)):
+                    if unit in options:
+                        self._expires[key] = time.monotonic() + int(args[3 + options.index(unit) + 1]) * scale
+                return b"+OK\r\n"
+            if name == b"DEL":
+                removed = 0
+                for key in args[1:]:
+                    if self._live(key):
+                        removed += 1
+                    self._data.pop(key, None)
+                    self._expires.pop(key, None)
+                return b":%d\r\n" % removed
+            if name == b"KEYS":
+                pattern = args[1].decode()
+                keys = [k for k in list(self._data) if self._live(k) and fnmatch.fnmatchcase(k.decode(), pattern)]
+                return _array([_bulk(k) for k in keys])
+            if name == b"FLUSHDB":
+                self._data.clear()
+                self._expires.clear()
+                return b"+OK\r\n"
+            if name == b"SUBSCRIBE":
+                for channel in args[1:]:
+                    self._subscribers.setdefault(channel, set()).add(client)
+                    client.write(_array([_bulk(b"subscribe"), _bulk(channel), b":1\r\n"]))
+                return None
+            if name == b"PUBLISH":
+                receivers = list(self._subscribers.get(args[1], ()))
+            else:
+                return b"-ERR unknown command '%s'\r\n" % name
+
+        # PUBLISH: deliver outside the lock, a slow subscriber must not stall the server
+        message = _array([_bulk(b"message"), _bulk(args[1]), _bulk(args[2])])
+        delivered = 0
+        for receiver in receivers:
+            try:
+                receiver.write(message)
+                delivered += 1
+            except OSError:
+                self._unsubscribe(receiver)
+        return b":%d\r\n" % delivered
+
+    def _unsubscribe(self, client):
+        with self._lock:
+            for clients in self._subscribers.values():
+                clients.discard(client)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'keys': sum(1 for k in list(self._data) if self._live(k)),
+                'commands': self._commands,
+                'subscribers': sum(len(c) for c in self._subscribers.values())
+            }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 6379
+    server = FakeRedis(port=port).start()
+    print(f"Fake Redis on {server.url} - Ctrl+C to stop")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Change-event bus for cache invalidation
+- Data-layer writes (InDMDevDB) publish a ChangeEvent once the write is accepted
+- Caches, indexes and views subscribe per topic and drop or patch what they hold
+- Dispatch is synchronous: when the write call returns, no subscriber still holds the old value
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Topics
+PRODUCTS = "products"
+CATEGORIES = "categories"
+PROMOTION = "promotion"
+CANVA_ACCOUNTS = "canva_accounts"
+USERS = "users"
+ADMINS = "admins"
+
+# Subscribe to every topic
+ALL = "*"
+
+
+class ChangeEvent:
+    """What changed: topic, action ('added', 'updated', 'deleted', ...), affected keys and,
+    when the write returned them, the affected rows. remote=True for events relayed from
+    another worker (see performance.bridge_bus)."""
+
+    __slots__ = ('topic', 'action', 'keys', 'rows', 'remote')
+
+    def __init__(self, topic, action, keys=(), rows=None, remote=False):
+        self.topic = topic
+        self.action = action
+        self.keys = tuple(keys)
+        self.rows = rows or []
+        self.remote = remote
+
+    def __repr__(self):
+        return f"ChangeEvent({self.topic!r}, {self.action!r}, keys={self.keys!r}, rows={len(self.rows)})"
+
+
+class InvalidationBus:
+    """Topic -> handlers. A failing handler is logged and does not stop the others."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers = {}
+        self._published = {}
+        self._errors = 0
+
+    def subscribe(self, topic, handler):
+        """Call handler(event) for every event on topic (ALL for every topic)"""
+        with self._lock:
+            self._handlers.setdefault(topic, []).append(handler)
+        return handler
+
+    def unsubscribe(self, topic, handler):
+        with self._lock:
+            handlers = self._handlers.get(topic, [])
+            if handler in handlers:
+                handlers.remove(handler)
+
+    def publish(self, topic, action="updated", keys=(), rows=None, remote=False):
+        event = ChangeEvent(topic, action, keys, rows, remote)
+        with self._lock:
+            handlers = self._handlers.get(topic, []) + self._handlers.get(ALL, [])
+            self._published[topic] = self._published.get(topic, 0) + 1
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Invalidation handler {getattr(handler, '__qualname__', handler)} failed on {event}: {e}")
+        return event
+
+    def stats(self):
+        with self._lock:
+            return {
+                'published': dict(self._published),
+                'subscribers': {topic: len(handlers) for topic, handlers in self._handlers.items()},
+                'handler_errors': self._errors
+            }
+
+
+# Process-wide bus
+bus = InvalidationBus()
@@ -0,0 +1,145 @@
+"""
+Schema migration runner
+- Applies migrations/NNNN_name.sql in version order and records each one in schema_migrations
+- NNNN_name.pg.sql / NNNN_name.sqlite.sql are dialect-specific (plpgsql RPCs, triggers);
+  a version may have one file per dialect
+- Postgres: connects with DATABASE_URL (Supabase > Project Settings > Database > Connection string),
+  needs psycopg2 (pip install psycopg2-binary)
+- SQLite: used automatically by sqlite_backend.SQLiteStore on startup
+
+Usage: python migrate.py [--status]
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+SCHEMA_TABLE = 'schema_migrations'
+
+CREATE_SCHEMA_TABLE = f"""CREATE TABLE IF NOT EXISTS {SCHEMA_TABLE} (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TEXT NOT NULL
+)"""
+
+
+def load_migrations(dialect):
+    """Returns [(version, name, sql)] for `dialect` ('postgres' or 'sqlite'), sorted by version"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not filename.endswith('.sql'):
+            continue
+        name = filename[:-4]
+        for suffix, only in (('.pg', 'postgres'), ('.sqlite', 'sqlite')):
+            if name.endswith(suffix):
+                if dialect != only:
+                    name = None
+                else:
+                    name = name[:-len(suffix)]
+                break
+        if name is None:
+            continue
+        version, _, label = name.partition('_')
+        with open(os.path.join(MIGRATIONS_DIR, filename), encoding='utf-8') as f:
+            migrations.append((int(version), label, f.read()))
+    migrations.sort()
+    return migrations
+
+
+def schema_version(conn):
+    """Highest applied version (0 when nothing is applied)"""
+    cur = conn.cursor()
+    cur.execute(CREATE_SCHEMA_TABLE)
+    cur.execute(f"SELECT COALESCE(MAX(version), 0) FROM {SCHEMA_TABLE}")
+    return cur.fetchone()[0]
+
+
+def migrate_sqlite(conn, target=None):
+    """Apply pending migrations to a sqlite3 connection (autocommit mode).
+    Each migration runs in its own transaction. Returns the versions applied."""
+    current = schema_version(conn)
+    applied = []
+    for version, name, sql in load_migrations('sqlite'):
+        if version <= current or (target is not None and version > target):
+            continue
+        conn.executescript(
+            f"BEGIN;\n{sql}\n"
+            f"INSERT INTO {SCHEMA_TABLE} (version, name, applied_at) "
+            f"VALUES ({version}, '{name}', '{datetime.now().isoformat()}');\nCOMMIT;"
+        )
+        logger.info(f"Applied migration {version:04d}_{name}")
+        applied.append(version)
+    return applied
+
+
+def migrate_postgres(dsn, target=None):
+    """Apply pending migrations to Postgres. Each migration runs in its own transaction."""
+    try:
+        import psycopg2
+    except ImportError:
+        raise RuntimeError("psycopg2 is required for Postgres migrations: pip install psycopg2-binary")
+
+    conn = psycopg2.connect(dsn)
+    applied = []
+    try:
+        with conn:
+            current = schema_version(conn)
+        for version, name, sql in load_migrations('postgres'):
+            if version <= current or (target is not None and version > target):
+                continue
+            with conn, conn.cursor() as cur:
+                cur.execute(sql)
+                cur.execute(f"INSERT INTO {SCHEMA_TABLE} (version, name, applied_at) VALUES (%s, %s, %s)",
+                            (version, name, datetime.now().isoformat()))
+            logger.info(f"Applied migration {version:04d}_{name}")
+            applied.append(version)
+    finally:
+        conn.close()
+    return applied
+
+
+def main():
+    load_dotenv('config.env')
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    backend = os.getenv('DB_BACKEND', 'supabase').lower()
+    status_only = '--status' in sys.argv
+
+    if backend == 'sqlite':
+        from sqlite_backend import SQLiteStore
+        store = SQLiteStore(os.getenv('DB_FILE', 'InDMDevDBShop.db'), migrate=False)
+        dialect = 'sqlite'
+        applied = [] if status_only else store.migrate()
+        version = schema_version(store.connection())
+    else:
+        dsn = os.getenv('DATABASE_URL')
+        if not dsn:
+            print("DATABASE_URL is not set")
+            sys.exit(1)
+        dialect = 'postgres'
+        if status_only:
+            import psycopg2
+            conn = psycopg2.connect(dsn)
+            with conn:
+                version = schema_version(conn)
+            conn.close()
+            applied = []
+        else:
+            applied = migrate_postgres(dsn)
+
+    latest = max((v for v, _, _ in load_migrations(dialect)), default=0)
+    if applied:
+        print(f"Applied {len(applied)} migration(s), schema version {max(applied)}")
+    elif status_only:
+        print(f"Schema version {version} (latest {latest})")
+    else:
+        print(f"Schema is up to date (version {latest})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+-- Secondary indexes for the hot bot queries (portable: Postgres and SQLite)
+-- canvaaccounttable.email, shopordertable.ordernumber and the other upsert
+-- keys are already covered by their UNIQUE constraints.
+
+-- "Đơn hàng của tôi": eq(buyerid).order(ordernumber.desc).limit(n)
+CREATE INDEX IF NOT EXISTS idx_orders_buyer_ordernumber ON shopordertable (buyerid, ordernumber DESC);
+
+-- Unconfirmed orders of one buyer: eq(paidmethod, 'PENDING').eq(buyerid)
+CREATE INDEX IF NOT EXISTS idx_orders_pending_buyer ON shopordertable (buyerid) WHERE paidmethod = 'PENDING';
+
+-- Stock counts and per-status listings
+CREATE INDEX IF NOT EXISTS idx_canva_status ON canvaaccounttable (status);
+
+-- Stock picking: eq(status, 'available').order(id).limit(n) and claim_canva_accounts
+CREATE INDEX IF NOT EXISTS idx_canva_available ON canvaaccounttable (id) WHERE status = 'available';
+
+-- Accounts of one buyer (OTP lookup, purchase check)
+CREATE INDEX IF NOT EXISTS idx_canva_buyer ON canvaaccounttable (buyer_id) WHERE buyer_id IS NOT NULL;
+
+-- Category listing in the shop menu
+CREATE INDEX IF NOT EXISTS idx_products_category ON shopproducttable (productcategory);
@@ -0,0 +1,58 @@
+-- RPC functions called by the bot via /rest/v1/rpc/<name>.
+-- Postgres only: the local SQLite backend implements them in sqlite_backend.py.
+
+-- Claim N available Canva accounts for one order in a single statement.
+-- All-or-nothing: if fewer than p_quantity rows are free, nothing is claimed.
+-- SKIP LOCKED lets concurrent orders claim disjoint rows without blocking.
+CREATE OR REPLACE FUNCTION claim_canva_accounts(p_buyer_id BIGINT, p_order_number BIGINT, p_quantity INTEGER)
+RETURNS SETOF canvaaccounttable
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    claimed_ids BIGINT[];
+BEGIN
+    SELECT array_agg(id) INTO claimed_ids
+    FROM (
+        SELECT id FROM canvaaccounttable
+        WHERE status = 'available'
+        ORDER BY id
+        LIMIT p_quantity
+        FOR UPDATE SKIP LOCKED
+    ) picked;
+
+    IF claimed_ids IS NULL OR array_length(claimed_ids, 1) < p_quantity THEN
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    UPDATE canvaaccounttable
+    SET status = 'sold', buyer_id = p_buyer_id, order_number = p_order_number
+    WHERE id = ANY(claimed_ids)
+    RETURNING *;
+END;
+$$;
+
+-- Atomically take up to p_quantity promotion slots. Never oversells past
+-- max_count: the row is locked, and the grant is clipped to what is left.
+-- Returns the grant plus the authoritative counter state.
+CREATE OR REPLACE FUNCTION claim_promotion_slots(p_promo_name TEXT, p_quantity INTEGER)
+RETURNS TABLE (granted INTEGER, slot_start INTEGER, new_sold_count INTEGER, promo_max_count INTEGER, promo_is_active INTEGER)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    promo promotiontable%ROWTYPE;
+    take INTEGER := 0;
+BEGIN
+    SELECT * INTO promo FROM promotiontable WHERE promo_name = p_promo_name FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    IF promo.is_active = 1 AND promo.sold_count < promo.max_count THEN
+        take := LEAST(p_quantity, promo.max_count - promo.sold_count);
+        UPDATE promotiontable SET sold_count = promo.sold_count + take WHERE id = promo.id;
+    END IF;
+
+    RETURN QUERY SELECT take, promo.sold_count + 1, promo.sold_count + take, promo.max_count, promo.is_active;
+END;
+$$;
@@ -0,0 +1,8 @@
+-- Catalog version counter: bumped by triggers on every product/category write
+-- (0004), polled by the bot's catalog snapshot to know when to reload.
+CREATE TABLE IF NOT EXISTS catalogversiontable (
+    id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO catalogversiontable (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,20 @@
+-- Bump catalogversiontable once per statement that changes products or categories
+CREATE OR REPLACE FUNCTION bump_catalog_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE catalogversiontable SET version = version + 1 WHERE id = 1;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_products_catalog_version ON shopproducttable;
+CREATE TRIGGER trg_products_catalog_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON shopproducttable
+FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
+
+DROP TRIGGER IF EXISTS trg_categories_catalog_version ON shopcategorytable;
+CREATE TRIGGER trg_categories_catalog_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON shopcategorytable
+FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version();
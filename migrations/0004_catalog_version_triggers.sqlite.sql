@@ -0,0 +1,37 @@
+-- SQLite has no statement-level triggers: bump once per changed row
+
+CREATE TRIGGER IF NOT EXISTS trg_products_catalog_version_insert
+AFTER INSERT ON shopproducttable
+BEGIN
+    UPDATE catalogversiontable SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_products_catalog_version_update
+AFTER UPDATE ON shopproducttable
+BEGIN
+    UPDATE catalogversiontable SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_products_catalog_version_delete
+AFTER DELETE ON shopproducttable
+BEGIN
+    UPDATE catalogversiontable SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_categories_catalog_version_insert
+AFTER INSERT ON shopcategorytable
+BEGIN
+    UPDATE catalogversiontable SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_categories_catalog_version_update
+AFTER UPDATE ON shopcategorytable
+BEGIN
+    UPDATE catalogversiontable SET version = version + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_categories_catalog_version_delete
+AFTER DELETE ON shopcategorytable
+BEGIN
+    UPDATE catalogversiontable SET version = version + 1 WHERE id = 1;
+END;
@@ -6,73 +6,200 @@ Performance optimization module for Telegram Bot
 - Non-blocking operations
 """
 
+import os
 import threading
 import time
+import weakref
 import logging
 from functools import wraps
 from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
 import queue
 
+from invalidation import bus, ALL, PROMOTION, ADMINS
+from cache_backends import backend_from_env
+from cache_snapshot import CacheSnapshot
+
 logger = logging.getLogger(__name__)
 
 # ============== SMART CACHE SYSTEM ==============
 
+class _Load:
+    """One in-flight loader call shared by every caller that missed the same key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# Stored for a key whose loader returned None (negative caching)
+_NEGATIVE = object()
+
+
 class TTLCache:
-    """Thread-safe cache with TTL (Time To Live)"""
+    """Thread-safe cache with TTL (Time To Live)
+
+    - ttl: entries are fresh for `ttl` seconds
+    - stale_ttl: after that, get_or_load() keeps serving the old value for up to `stale_ttl`
+      more seconds while one background refresh runs (stale-while-revalidate)
+    - negative_ttl: get_or_load() remembers a None result for this long (0 = never)
+    - get_or_load() runs one loader per missing key; concurrent callers wait for it
+    """
     
-    def __init__(self, maxsize=1000, ttl=300):
+    def __init__(self, maxsize=1000, ttl=300, stale_ttl=0, negative_ttl=0):
         self.maxsize = maxsize
         self.ttl = ttl  # seconds
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
         self._cache = OrderedDict()
-        self._timestamps = {}
-        self._lock = threading.RLock()
+        self._expires = {}  # key -> (fresh until, kept until)
+        self._loading = {}
+        self._lock = threading.Lock()
         self._hits = 0
         self._misses = 0
+        self._stale_hits = 0
+        self._negative_hits = 0
+        self._loads = 0
+        self._coalesced = 0
+        self._refreshes = 0
+    
+    def _lookup(self, key, now):
+        """(value, fresh) for a live entry, (None, None) if absent or past its hard expiry"""
+        if key not in self._cache:
+            return None, None
+        fresh_until, keep_until = self._expires[key]
+        if now >= keep_until:
+            del self._cache[key]
+            del self._expires[key]
+            return None, None
+        # Move to end (LRU)
+        self._cache.move_to_end(key)
+        return self._cache[key], now < fresh_until
     
     def get(self, key, default=None):
-        """Get value from cache"""
+        """Get a fresh value from cache"""
         with self._lock:
-            if key in self._cache:
-                # Check if expired
-                if time.time() - self._timestamps[key] < self.ttl:
-                    # Move to end (LRU)
-                    self._cache.move_to_end(key)
-                    self._hits += 1
-                    return self._cache[key]
-                else:
-                    # Expired, remove
-                    del self._cache[key]
-                    del self._timestamps[key]
+            value, fresh = self._lookup(key, time.monotonic())
+            if fresh:
+                self._hits += 1
+                return default if value is _NEGATIVE else value
             self._misses += 1
             return default
     
     def set(self, key, value, ttl=None):
         """Set value in cache"""
         with self._lock:
+            if key in self._cache:
+                del self._cache[key]
             # Remove oldest if at capacity
             while len(self._cache) >= self.maxsize:
                 oldest_key = next(iter(self._cache))
                 del self._cache[oldest_key]
-                del self._timestamps[oldest_key]
+                del self._expires[oldest_key]
             
+            fresh_until = time.monotonic() + (ttl or self.ttl)
             self._cache[key] = value
-            self._timestamps[key] = time.time()
-            if ttl:
-                self._timestamps[key] = time.time() - self.ttl + ttl
+            self._expires[key] = (fresh_until, fresh_until + self.stale_ttl)
+    
+    def get_or_load(self, key, loader, ttl=None, negative_ttl=None):
+        """Cached value for key, calling loader() at most once at a time per key on a miss.
+        A None result is cached only when negative_ttl (or the cache's negative_ttl) is set."""
+        with self._lock:
+            value, fresh = self._lookup(key, time.monotonic())
+            if fresh is not None:
+                if fresh:
+                    self._hits += 1
+                else:
+                    self._stale_hits += 1
+                    if key not in self._loading:
+                        self._loading[key] = _Load()
+                        self._refreshes += 1
+                        background.submit(self._load, key, loader, ttl, negative_ttl, self._loading[key])
+                if value is _NEGATIVE:
+                    self._negative_hits += 1
+                    return None
+                return value
+            
+            self._misses += 1
+            load = self._loading.get(key)
+            leader = load is None
+            if leader:
+                load = self._loading[key] = _Load()
+            else:
+                self._coalesced += 1
+        
+        if leader:
+            self._load(key, loader, ttl, negative_ttl, load)
+        else:
+            load.done.wait()
+        if load.error is not None:
+            raise load.error
+        return load.value
+    
+    def _load(self, key, loader, ttl, negative_ttl, load):
+        try:
+            load.value = loader()
+            self._loads += 1
+            if load.value is not None:
+                self.set(key, load.value, ttl)
+            else:
+                negative_ttl = self.negative_ttl if negative_ttl is None else negative_ttl
+                if negative_ttl:
+                    self.set(key, _NEGATIVE, negative_ttl)
+        except Exception as e:
+            # A failed background refresh keeps serving the stale value until its hard expiry
+            load.error = e
+            logger.error(f"Cache load error for {key!r}: {e}")
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            load.done.set()
     
     def delete(self, key):
         """Remove key from cache"""
         with self._lock:
             if key in self._cache:
                 del self._cache[key]
-                del self._timestamps[key]
+                del self._expires[key]
+    
+    def export(self):
+        """[(key, value, fresh seconds left, kept seconds left)] for snapshots, LRU order"""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value, self._expires[key][0] - now, self._expires[key][1] - now)
+                    for key, value in self._cache.items() if value is not _NEGATIVE]
+    
+    def restore(self, entries, age=0):
+        """Load export() output taken `age` seconds ago; entries past their hard expiry are
+        skipped, entries past their fresh window come back stale and refresh on next use"""
+        now = time.monotonic()
+        with self._lock:
+            for key, value, fresh_left, keep_left in entries:
+                if keep_left - age <= 0 or key in self._cache:
+                    continue
+                while len(self._cache) >= self.maxsize:
+                    oldest_key = next(iter(self._cache))
+                    del self._cache[oldest_key]
+                    del self._expires[oldest_key]
+                self._cache[key] = value
+                self._expires[key] = (now + fresh_left - age, now + keep_left - age)
+    
+    def sweep(self):
+        """Drop entries past their hard expiry; returns how many were removed"""
+        now = time.monotonic()
+        with self._lock:
+            dead = [key for key, (_, keep_until) in self._expires.items() if now >= keep_until]
+            for key in dead:
+                del self._cache[key]
+                del self._expires[key]
+        return len(dead)
     
     def clear(self):
         """Clear all cache"""
         with self._lock:
             self._cache.clear()
-            self._timestamps.clear()
+            self._expires.clear()
     
     def stats(self):
         """Get cache statistics"""
@@ -82,32 +209,236 @@ class TTLCache:
             'hits': self._hits,
             'misses': self._misses,
             'hit_rate': f"{hit_rate:.1f}%",
-            'size': len(self._cache)
+            'size': len(self._cache),
+            'stale_hits': self._stale_hits,
+            'negative_hits': self._negative_hits,
+            'loads': self._loads,
+            'coalesced': self._coalesced,
+            'refreshes': self._refreshes
         }
 
 
-# ============== GLOBAL CACHES ==============
+class ShardedTTLCache:
+    """TTLCache split into lock-striped shards (key hash picks the shard) for caches hit
+    from many handler threads at once. Same API and stats as TTLCache; maxsize and the LRU
+    order apply per shard."""
+    
+    def __init__(self, maxsize=1000, ttl=300, stale_ttl=0, negative_ttl=0, shards=16):
+        # Power of two so the shard is a mask of the hash
+        count = 1
+        while count < shards:
+            count *= 2
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._mask = count - 1
+        per_shard = max(1, -(-maxsize // count))
+        self._shards = [TTLCache(per_shard, ttl, stale_ttl, negative_ttl) for _ in range(count)]
+    
+    def get(self, key, default=None):
+        return self._shards[hash(key) & self._mask].get(key, default)
+    
+    def set(self, key, value, ttl=None):
+        self._shards[hash(key) & self._mask].set(key, value, ttl)
+    
+    def get_or_load(self, key, loader, ttl=None, negative_ttl=None):
+        return self._shards[hash(key) & self._mask].get_or_load(key, loader, ttl, negative_ttl)
+    
+    def delete(self, key):
+        self._shards[hash(key) & self._mask].delete(key)
+    
+    def clear(self):
+        for shard in self._shards:
+            shard.clear()
+    
+    def export(self):
+        return [entry for shard in self._shards for entry in shard.export()]
+    
+    def restore(self, entries, age=0):
+        by_shard = {}
+        for entry in entries:
+            by_shard.setdefault(hash(entry[0]) & self._mask, []).append(entry)
+        for index, shard_entries in by_shard.items():
+            self._shards[index].restore(shard_entries, age)
+    
+    def sweep(self):
+        """Sweep shard by shard so no lock is held across the whole cache"""
+        return sum(shard.sweep() for shard in self._shards)
+    
+    def stats(self):
+        totals = {}
+        for shard in self._shards:
+            for name, value in shard.stats().items():
+                if name != 'hit_rate':
+                    totals[name] = totals.get(name, 0) + value
+        total = totals['hits'] + totals['misses']
+        hit_rate = (totals['hits'] / total * 100) if total > 0 else 0
+        return dict(totals, hit_rate=f"{hit_rate:.1f}%", shards=len(self._shards))
+
+
+class CacheSweeper:
+    """Daemon thread that periodically removes expired entries from registered caches,
+    so dead keys don't sit in memory until LRU eviction"""
+    
+    def __init__(self, interval=30):
+        self.interval = interval
+        self._caches = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._swept = 0
+    
+    def register(self, cache):
+        with self._lock:
+            self._caches.add(cache)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cache-sweeper", daemon=True)
+                self._thread.start()
+        return cache
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                caches = list(self._caches)
+            for cache in caches:
+                try:
+                    self._swept += cache.sweep()
+                except Exception as e:
+                    logger.error(f"Cache sweep error: {e}")
+    
+    def stats(self):
+        return {'interval': self.interval, 'caches': len(self._caches), 'swept': self._swept}
+
+
+cache_sweeper = CacheSweeper(interval=30)
 
-# Admin cache - long TTL since admins rarely change
-admin_cache = TTLCache(maxsize=100, ttl=600)  # 10 minutes
 
-# User cache - medium TTL
-user_cache = TTLCache(maxsize=5000, ttl=300)  # 5 minutes
+# ============== SHARED (CROSS-PROCESS) CACHING ==============
 
-# Product cache - medium TTL
-product_cache = TTLCache(maxsize=500, ttl=180)  # 3 minutes
+_MISS = object()
 
-# Promotion cache - short TTL since it changes often
-promo_cache = TTLCache(maxsize=10, ttl=60)  # 1 minute
 
-# Rate limit cache - very short TTL
-rate_limit_cache = TTLCache(maxsize=10000, ttl=60)  # 1 minute
+class TieredCache:
+    """In-process L1 (TTLCache/ShardedTTLCache) in front of a shared CacheBackend.
+    Hot keys are answered by the L1; L1 misses read the shared store before the loader.
+    set/delete/clear broadcast the key so every other worker drops its L1 copy."""
+    
+    def __init__(self, name, l1, backend):
+        self.name = name
+        self.l1 = l1
+        self.backend = backend
+        self.maxsize = l1.maxsize
+        self.ttl = l1.ttl
+        self._shared_hits = 0
+        backend.listen(self._on_message)
+    
+    def _key(self, key):
+        return f"{self.name}:{key!r}"
+    
+    def get(self, key, default=None):
+        value = self.l1.get(key, _MISS)
+        if value is not _MISS:
+            return value
+        found, value = self.backend.get(self._key(key))
+        if not found:
+            return default
+        self._shared_hits += 1
+        self.l1.set(key, value)
+        return value
+    
+    def set(self, key, value, ttl=None):
+        self.l1.set(key, value, ttl)
+        self.backend.set(self._key(key), value, ttl or self.ttl)
+        self.backend.publish({'kind': 'invalidate', 'cache': self.name, 'key': key})
+    
+    def get_or_load(self, key, loader, ttl=None, negative_ttl=None):
+        def load():
+            found, value = self.backend.get(self._key(key))
+            if found:
+                self._shared_hits += 1
+                return value
+            value = loader()
+            if value is not None:
+                self.backend.set(self._key(key), value, ttl or self.ttl)
+            return value
+        return self.l1.get_or_load(key, load, ttl, negative_ttl)
+    
+    def delete(self, key):
+        self.l1.delete(key)
+        self.backend.delete(self._key(key))
+        self.backend.publish({'kind': 'invalidate', 'cache': self.name, 'key': key})
+    
+    def clear(self):
+        self.l1.clear()
+        self.backend.clear(f"{self.name}:")
+        self.backend.publish({'kind': 'clear', 'cache': self.name})
+    
+    def sweep(self):
+        return self.l1.sweep()
+    
+    def export(self):
+        return self.l1.export()
+    
+    def restore(self, entries, age=0):
+        self.l1.restore(entries, age)
+    
+    def _on_message(self, message):
+        if message.get('cache') != self.name:
+            return
+        if message['kind'] == 'invalidate':
+            self.l1.delete(message['key'])
+        elif message['kind'] == 'clear':
+            self.l1.clear()
+    
+    def stats(self):
+        return dict(self.l1.stats(), shared_hits=self._shared_hits, backend=self.backend.name)
+
+
+def bridge_bus(event_bus, backend):
+    """Relay data-layer change events between workers, so catalog/index/counter
+    invalidations in one worker reach the others"""
+    def forward(event):
+        if not event.remote:
+            backend.publish({'kind': 'event', 'topic': event.topic, 'action': event.action,
+                             'keys': event.keys, 'rows': event.rows})
+    
+    def receive(message):
+        if message['kind'] == 'event':
+            event_bus.publish(message['topic'], message['action'], message['keys'], message['rows'], remote=True)
+    
+    event_bus.subscribe(ALL, forward)
+    backend.listen(receive)
+
+
+# CACHE_BACKEND=sqlite|redis shares cache contents and invalidations between workers
+shared_backend = backend_from_env()
+if shared_backend is not None:
+    bridge_bus(bus, shared_backend)
+    logger.info(f"Shared cache backend: {shared_backend.name}")
+
+
+def _shared(name, cache):
+    """Put the shared backend behind `cache` when one is configured"""
+    return TieredCache(name, cache, shared_backend) if shared_backend is not None else cache
+
+
+# ============== GLOBAL CACHES ==============
+
+# Admin cache - long TTL since admins rarely change; served stale for an hour while refreshing
+admin_cache = cache_sweeper.register(_shared("admin", TTLCache(maxsize=100, ttl=600, stale_ttl=3600)))  # 10 minutes
+
+# Promotion cache - PromotionDB writes and slot claims invalidate it over the bus;
+# "no promotion" is remembered for 30s
+promo_cache = cache_sweeper.register(_shared("promo", TTLCache(maxsize=10, ttl=600, stale_ttl=300, negative_ttl=30)))  # 10 minutes
+
+# Rate limit cache - very short TTL, checked on every update; per worker (not shared)
+rate_limit_cache = cache_sweeper.register(ShardedTTLCache(maxsize=10000, ttl=60))  # 1 minute
 
 
 # ============== CACHED DECORATORS ==============
 
-def cached(cache, key_func=None, ttl=None):
-    """Decorator to cache function results"""
+def cached(cache, key_func=None, ttl=None, negative_ttl=None):
+    """Decorator to cache function results (single-flight, stale-while-revalidate
+    and negative caching as configured on the cache - see TTLCache)"""
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
@@ -117,16 +448,7 @@ def cached(cache, key_func=None, ttl=None):
             else:
                 cache_key = f"{func.__name__}:{args}:{kwargs}"
             
-            # Try to get from cache
-            result = cache.get(cache_key)
-            if result is not None:
-                return result
-            
-            # Call function and cache result
-            result = func(*args, **kwargs)
-            if result is not None:
-                cache.set(cache_key, result, ttl)
-            return result
+            return cache.get_or_load(cache_key, lambda: func(*args, **kwargs), ttl, negative_ttl)
         
         # Add cache control methods
         wrapper.cache_clear = lambda: cache.clear()
@@ -195,16 +517,16 @@ def check_rate_limit(user_id, max_requests=30, window=60):
     
     if data is None:
         # First request
-        rate_limit_cache.set(cache_key, {'count': 1, 'start': time.time()}, ttl=window)
+        rate_limit_cache.set(cache_key, {'count': 1, 'start': time.monotonic()}, ttl=window)
         return True
     
     count = data['count']
     start = data['start']
     
     # Check if window expired
-    if time.time() - start > window:
+    if time.monotonic() - start > window:
         # Reset counter
-        rate_limit_cache.set(cache_key, {'count': 1, 'start': time.time()}, ttl=window)
+        rate_limit_cache.set(cache_key, {'count': 1, 'start': time.monotonic()}, ttl=window)
         return True
     
     # Check if over limit
@@ -219,41 +541,36 @@ def check_rate_limit(user_id, max_requests=30, window=60):
 
 # ============== ADMIN CHECK WITH CACHE ==============
 
-_admin_ids_cache = None
-_admin_cache_time = 0
-_ADMIN_CACHE_TTL = 300  # 5 minutes
+_ADMIN_CACHE_TTL = 1800  # 30 minutes - AddAdmin updates it over the bus
 
 def get_cached_admin_ids():
-    """Get admin IDs with caching"""
-    global _admin_ids_cache, _admin_cache_time
-    
-    current_time = time.time()
-    
-    # Return cached if still valid
-    if _admin_ids_cache is not None and (current_time - _admin_cache_time) < _ADMIN_CACHE_TTL:
-        return _admin_ids_cache
-    
-    # Refresh cache in background if expired but have old data
-    if _admin_ids_cache is not None:
-        # Return stale data immediately, refresh in background
-        background.submit(_refresh_admin_cache)
-        return _admin_ids_cache
-    
-    # No cache, must fetch synchronously
-    _refresh_admin_cache()
-    return _admin_ids_cache or []
+    """Get admin IDs with caching (stale list served while a background refresh runs)"""
+    try:
+        return admin_cache.get_or_load("admin_ids", _load_admin_ids, ttl=_ADMIN_CACHE_TTL) or set()
+    except Exception as e:
+        logger.error(f"Error refreshing admin cache: {e}")
+        return set()
+
+def _load_admin_ids():
+    from InDMDevDB import GetDataFromDB
+    admins = GetDataFromDB.GetAdminIDsInDB() or []
+    return set(str(admin[0]) for admin in admins)
 
 def _refresh_admin_cache():
     """Refresh admin cache from database"""
-    global _admin_ids_cache, _admin_cache_time
     try:
-        from InDMDevDB import GetDataFromDB
-        admins = GetDataFromDB.GetAdminIDsInDB() or []
-        _admin_ids_cache = set(str(admin[0]) for admin in admins)
-        _admin_cache_time = time.time()
+        admin_cache.set("admin_ids", _load_admin_ids(), ttl=_ADMIN_CACHE_TTL)
     except Exception as e:
         logger.error(f"Error refreshing admin cache: {e}")
 
+def _on_admins_changed(event):
+    """Add new admins to the cached set; the write itself may still be queued"""
+    admin_ids = admin_cache.get("admin_ids")
+    if admin_ids is not None:
+        admin_cache.set("admin_ids", admin_ids | {str(key) for key in event.keys}, ttl=_ADMIN_CACHE_TTL)
+
+bus.subscribe(ADMINS, _on_admins_changed)
+
 def is_admin_cached(user_id, env_admin_id=None):
     """Check if user is admin with caching"""
     # Check env admin first (instant)
@@ -268,67 +585,37 @@ def is_admin_cached(user_id, env_admin_id=None):
 # ============== USER PURCHASE CHECK WITH CACHE ==============
 
 def has_purchased_cached(user_id):
-    """Check if user has purchased with caching"""
-    cache_key = f"purchased:{user_id}"
-    
-    # Check cache first
-    cached = user_cache.get(cache_key)
-    if cached is not None:
-        return cached
-    
-    # Query database
+    """Check if user has purchased - answered by the in-memory buyer index"""
     try:
-        from InDMDevDB import CanvaAccountDB
-        accounts = CanvaAccountDB.get_buyer_accounts(user_id)
-        has_purchased = accounts and len(accounts) > 0
-        user_cache.set(cache_key, has_purchased)
-        return has_purchased
+        from InDMDevDB import buyer_index
+        return buyer_index.has_accounts(user_id)
     except:
         return False
 
-def invalidate_user_purchase_cache(user_id):
-    """Invalidate purchase cache when user buys something"""
-    user_cache.delete(f"purchased:{user_id}")
-
 
 # ============== PRODUCT CACHE ==============
 
 def get_products_cached():
-    """Get products with caching"""
-    cache_key = "all_products"
-    
-    cached = product_cache.get(cache_key)
-    if cached is not None:
-        return cached
-    
+    """Get products from the catalog snapshot (InDMDevDB.catalog)"""
     try:
         from InDMDevDB import GetDataFromDB
-        products = GetDataFromDB.GetProductInfo() or []
-        product_cache.set(cache_key, products)
-        return products
+        return GetDataFromDB.GetProductInfo() or []
     except:
         return []
 
 def invalidate_product_cache():
-    """Invalidate product cache when products change"""
-    product_cache.clear()
+    """Force a catalog reload on the next read"""
+    from InDMDevDB import catalog
+    catalog.invalidate()
 
 
 # ============== PROMOTION CACHE ==============
 
 def get_promotion_cached():
     """Get promotion info with caching"""
-    cache_key = "promotion"
-    
-    cached = promo_cache.get(cache_key)
-    if cached is not None:
-        return cached
-    
     try:
         from InDMDevDB import PromotionDB
-        promo = PromotionDB.get_promotion_info()
-        promo_cache.set(cache_key, promo)
-        return promo
+        return promo_cache.get_or_load("promotion", PromotionDB.get_promotion_info)
     except:
         return None
 
@@ -336,6 +623,8 @@ def invalidate_promotion_cache():
     """Invalidate promotion cache when it changes"""
     promo_cache.delete("promotion")
 
+bus.subscribe(PROMOTION, lambda event: invalidate_promotion_cache())
+
 
 # ============== ASYNC-LIKE HELPERS ==============
 
@@ -384,8 +673,9 @@ def warm_caches():
     def warm():
         logger.info("Warming caches...")
         try:
-            # Warm admin cache
-            _refresh_admin_cache()
+            # Warm admin cache (a restored snapshot is revalidated by its TTL instead)
+            if admin_cache.get("admin_ids") is None:
+                _refresh_admin_cache()
             
             # Warm product cache
             get_products_cached()
@@ -393,6 +683,13 @@ def warm_caches():
             # Warm promotion cache
             get_promotion_cached()
             
+            # Warm known user ids for /start new-user detection
+            from InDMDevDB import known_users, buyer_index
+            known_users.warm()
+            
+            # Warm buyer -> accounts index for the main keyboard and OTP menu
+            buyer_index.warm()
+            
             logger.info("Cache warming completed")
         except Exception as e:
             logger.error(f"Cache warming error: {e}")
@@ -400,14 +697,41 @@ def warm_caches():
     background.submit(warm)
 
 
+# ============== PERSISTENT SNAPSHOT ==============
+
+# Cache contents survive restarts / free-tier sleeps: checkpointed every 5 minutes and at exit
+cache_snapshot = CacheSnapshot(os.getenv('CACHE_SNAPSHOT_FILE') or 'InDMDevDBCache.snapshot',
+                               interval=int(os.getenv('CACHE_SNAPSHOT_INTERVAL') or 300))
+
+def restore_cache_snapshot():
+    """Load the last snapshot into the caches and indexes, then start checkpointing.
+    Call at boot before handling updates; warm_caches() then revalidates in the background."""
+    from InDMDevDB import catalog, known_users, buyer_index
+    cache_snapshot.register('admin', admin_cache.export, admin_cache.restore)
+    cache_snapshot.register('promo', promo_cache.export, promo_cache.restore)
+    cache_snapshot.register('catalog', catalog.export_state, catalog.restore_state)
+    cache_snapshot.register('known_users', known_users.export_state, known_users.restore_state)
+    cache_snapshot.register('buyer_index', buyer_index.export_state, buyer_index.restore_state)
+    try:
+        restored = cache_snapshot.load()
+    except Exception as e:
+        logger.error(f"Cache snapshot restore error: {e}")
+        restored = []
+    cache_snapshot.start()
+    return restored
+
+
 # ============== CACHE STATS ==============
 
 def get_all_cache_stats():
     """Get statistics for all caches"""
+    from InDMDevDB import catalog
     return {
         'admin': admin_cache.stats(),
-        'user': user_cache.stats(),
-        'product': product_cache.stats(),
+        'product': catalog.stats(),
         'promo': promo_cache.stats(),
-        'rate_limit': rate_limit_cache.stats()
+        'rate_limit': rate_limit_cache.stats(),
+        'sweeper': cache_sweeper.stats(),
+        'shared': shared_backend.stats() if shared_backend is not None else None,
+        'snapshot': cache_snapshot.stats()
     }
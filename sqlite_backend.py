@@ -0,0 +1,496 @@
+"""
+Local SQLite storage engine
+- Executes the PostgREST request subset used by InDMDevDB (select/filters/order/limit,
+  insert/upsert, PATCH, DELETE, Prefer return/count) against a SQLite file
+- WAL mode, one connection per thread; secondary indexes come from migrations/ (migrate.py)
+- Same table names and columns as the live Supabase tables
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+
+from migrate import migrate_sqlite
+
+logger = logging.getLogger(__name__)
+
+
+# ============== SCHEMA ==============
+
+SCHEMA = {
+    "shopusertable": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("user_id", "INTEGER UNIQUE NOT NULL"),
+        ("username", "TEXT"),
+        ("wallet", "INTEGER DEFAULT 0"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ],
+    "shopadmintable": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("admin_id", "INTEGER UNIQUE NOT NULL"),
+        ("username", "TEXT"),
+        ("wallet", "INTEGER DEFAULT 0"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ],
+    "shopproducttable": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("productnumber", "INTEGER UNIQUE NOT NULL"),
+        ("admin_id", "INTEGER"),
+        ("username", "TEXT"),
+        ("productname", "TEXT"),
+        ("productdescription", "TEXT"),
+        ("productprice", "INTEGER DEFAULT 0"),
+        ("productimagelink", "TEXT"),
+        ("productdownloadlink", "TEXT"),
+        ("productkeysfile", "TEXT"),
+        ("productquantity", "INTEGER DEFAULT 0"),
+        ("productcategory", "TEXT DEFAULT 'Default Category'"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ],
+    "shopordertable": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("buyerid", "INTEGER NOT NULL"),
+        ("buyerusername", "TEXT"),
+        ("productname", "TEXT"),
+        ("productprice", "TEXT"),
+        ("orderdate", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+        ("paidmethod", "TEXT DEFAULT 'NO'"),
+        ("productdownloadlink", "TEXT"),
+        ("productkeys", "TEXT"),
+        ("buyercomment", "TEXT"),
+        ("ordernumber", "INTEGER UNIQUE NOT NULL"),
+        ("productnumber", "INTEGER"),
+        ("payment_id", "TEXT"),
+    ],
+    "shopcategorytable": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("categorynumber", "INTEGER UNIQUE NOT NULL"),
+        ("categoryname", "TEXT NOT NULL"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ],
+    "paymentmethodtable": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("admin_id", "INTEGER"),
+        ("username", "TEXT"),
+        ("method_name", "TEXT UNIQUE NOT NULL"),
+        ("token_keys_clientid", "TEXT"),
+        ("secret_keys", "TEXT"),
+        ("activated", "TEXT DEFAULT 'NO'"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ],
+    "canvaaccounttable": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("email", "TEXT UNIQUE NOT NULL"),
+        ("authkey", "TEXT"),
+        ("buyer_id", "INTEGER DEFAULT NULL"),
+        ("order_number", "INTEGER DEFAULT NULL"),
+        ("status", "TEXT DEFAULT 'available'"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ],
+    "promotiontable": [
+        ("id", "INTEGER PRIMARY KEY AUTOINCREMENT"),
+        ("promo_name", "TEXT UNIQUE NOT NULL"),
+        ("is_active", "INTEGER DEFAULT 0"),
+        ("sold_count", "INTEGER DEFAULT 0"),
+        ("max_count", "INTEGER DEFAULT 10"),
+        ("started_at", "TEXT DEFAULT NULL"),
+        ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ],
+    "catalogversiontable": [
+        ("id", "INTEGER PRIMARY KEY"),
+        ("version", "INTEGER NOT NULL DEFAULT 0"),
+    ],
+}
+
+SEED = [
+    "INSERT OR IGNORE INTO promotiontable (promo_name, is_active, sold_count, max_count) VALUES ('buy1get1', 0, 0, 10)",
+]
+
+# Query params that are not column filters
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+FILTER_OPS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class QueryError(Exception):
+    """Request the engine cannot execute - maps to a PostgREST-style error body"""
+
+    def __init__(self, status_code, code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = {"code": code, "message": message}
+
+
+# ============== ENGINE ==============
+
+class SQLiteStore:
+    """PostgREST-compatible request executor over a SQLite database"""
+
+    def __init__(self, path="InDMDevDBShop.db", migrate=True):
+        self.path = path
+        self._local = threading.local()
+        self._memory = path == ":memory:"
+        self._shared = None
+        self._shared_lock = threading.RLock()
+        if self._memory:
+            # One shared connection - a :memory: database is private to its connection
+            self._shared = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+            self._shared.row_factory = sqlite3.Row
+        self.create_schema(migrate)
+
+    # ----- connections -----
+
+    def connection(self):
+        if self._memory:
+            return self._shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _lock(self):
+        # Only the shared in-memory connection needs serialising
+        return self._shared_lock if self._memory else _NullLock()
+
+    def create_schema(self, migrate=True):
+        with self._lock():
+            conn = self.connection()
+            for table, columns in SCHEMA.items():
+                cols = ", ".join(f"{name} {decl}" for name, decl in columns)
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({cols})")
+            for statement in SEED:
+                conn.execute(statement)
+            if migrate:
+                migrate_sqlite(conn)
+
+    def migrate(self):
+        """Apply pending migrations, returns the versions applied"""
+        with self._lock():
+            return migrate_sqlite(self.connection())
+
+    # ----- request handling -----
+
+    def handle(self, method, table, params=None, headers=None, payload=None):
+        """Execute one PostgREST-style request.
+        Returns (status_code, rows, total_count, error_body)."""
+        params = dict(params or {})
+        prefer = _parse_prefer((headers or {}).get("Prefer", ""))
+        try:
+            if table.startswith("rpc/"):
+                return self._rpc(table[4:], payload or {})
+            columns = self._columns(table)
+            with self._lock():
+                if method in ("GET", "HEAD"):
+                    return self._select(table, columns, params, prefer, head=method == "HEAD")
+                if method == "POST":
+                    return self._insert(table, columns, params, prefer, payload)
+                if method == "PATCH":
+                    return self._update(table, columns, params, prefer, payload)
+                if method == "DELETE":
+                    return self._delete(table, columns, params, prefer)
+            raise QueryError(405, "PGRST117", f"Unsupported method {method}")
+        except QueryError as e:
+            return e.status_code, [], None, e.body
+        except sqlite3.IntegrityError as e:
+            return 409, [], None, {"code": "23505", "message": str(e)}
+        except sqlite3.Error as e:
+            logger.error(f"SQLite error on {method} {table}: {e}")
+            return 400, [], None, {"code": "PGRST000", "message": str(e)}
+
+    def _columns(self, table):
+        if table not in SCHEMA:
+            raise QueryError(404, "42P01", f'relation "{table}" does not exist')
+        return [name for name, _ in SCHEMA[table]]
+
+    def _select(self, table, columns, params, prefer, head=False):
+        projection = _projection(params.get("select", "*"), columns)
+        where, args = _where(params, columns)
+        conn = self.connection()
+
+        total = None
+        if "count" in prefer:
+            total = conn.execute(f"SELECT COUNT(*) FROM {table}{where}", args).fetchone()[0]
+        if head:
+            return 200, [], total, None
+
+        sql = f"SELECT {projection} FROM {table}{where}{_order(params.get('order'), columns)}"
+        sql, args = _paginate(sql, args, params)
+        rows = [dict(r) for r in conn.execute(sql, args).fetchall()]
+        return 200, rows, total, None
+
+    def _insert(self, table, columns, params, prefer, payload):
+        rows = payload if isinstance(payload, list) else [payload]
+        if not rows:
+            return 201, [], None, None
+        keys = list(rows[0].keys())
+        _check_columns(keys, columns)
+        placeholders = ", ".join("?" for _ in keys)
+        sql = f"INSERT INTO {table} ({', '.join(keys)}) VALUES ({placeholders})"
+        if prefer.get("resolution") == "merge-duplicates":
+            target = params.get("on_conflict", "id")
+            _check_columns(target.split(","), columns)
+            updates = ", ".join(f"{k} = excluded.{k}" for k in keys if k not in target.split(","))
+            sql += f" ON CONFLICT ({target}) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING")
+        elif prefer.get("resolution") == "ignore-duplicates":
+            sql += " ON CONFLICT DO NOTHING"
+        returning = prefer.get("return") == "representation"
+        if returning:
+            sql += " RETURNING *"
+
+        conn = self.connection()
+        out = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for row in rows:
+                cur = conn.execute(sql, [_encode(row.get(k)) for k in keys])
+                if returning:
+                    out.extend(dict(r) for r in cur.fetchall())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return 201, out, None, None
+
+    def _update(self, table, columns, params, prefer, payload):
+        _check_columns(payload.keys(), columns)
+        where, args = _where(params, columns)
+        sets = ", ".join(f"{k} = ?" for k in payload)
+        sql = f"UPDATE {table} SET {sets}{where}"
+        if prefer.get("return") == "representation":
+            sql += " RETURNING *"
+        cur = self.connection().execute(sql, [_encode(v) for v in payload.values()] + args)
+        return 200, [dict(r) for r in cur.fetchall()], None, None
+
+    def _delete(self, table, columns, params, prefer):
+        where, args = _where(params, columns)
+        sql = f"DELETE FROM {table}{where}"
+        if prefer.get("return") == "representation":
+            sql += " RETURNING *"
+        cur = self.connection().execute(sql, args)
+        return 200, [dict(r) for r in cur.fetchall()], None, None
+
+    # ----- RPC functions (mirror supabase_setup.sql) -----
+
+    def _rpc(self, name, params):
+        handler = getattr(self, f"_rpc_{name}", None)
+        if handler is None:
+            raise QueryError(404, "PGRST202", f"Could not find the function {name}")
+        with self._lock():
+            conn = self.connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = handler(conn, **params)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return 200, rows, None, None
+
+    def _rpc_claim_canva_accounts(self, conn, p_buyer_id, p_order_number, p_quantity):
+        ids = [r[0] for r in conn.execute(
+            "SELECT id FROM canvaaccounttable WHERE status = 'available' ORDER BY id LIMIT ?",
+            (p_quantity,)).fetchall()]
+        if len(ids) < p_quantity:
+            return []
+        marks = ", ".join("?" for _ in ids)
+        cur = conn.execute(
+            f"UPDATE canvaaccounttable SET status = 'sold', buyer_id = ?, order_number = ? "
+            f"WHERE id IN ({marks}) RETURNING *",
+            [p_buyer_id, p_order_number] + ids)
+        return [dict(r) for r in cur.fetchall()]
+
+    def _rpc_claim_promotion_slots(self, conn, p_promo_name, p_quantity):
+        promo = conn.execute(
+            "SELECT id, is_active, sold_count, max_count FROM promotiontable WHERE promo_name = ?",
+            (p_promo_name,)).fetchone()
+        if promo is None:
+            return []
+        take = 0
+        if promo["is_active"] == 1 and promo["sold_count"] < promo["max_count"]:
+            take = min(p_quantity, promo["max_count"] - promo["sold_count"])
+            conn.execute("UPDATE promotiontable SET sold_count = ? WHERE id = ?",
+                         (promo["sold_count"] + take, promo["id"]))
+        return [{
+            "granted": take,
+            "slot_start": promo["sold_count"] + 1,
+            "new_sold_count": promo["sold_count"] + take,
+            "promo_max_count": promo["max_count"],
+            "promo_is_active": promo["is_active"],
+        }]
+
+
+class _NullLock:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# ============== POSTGREST SYNTAX HELPERS ==============
+
+
+def _check_columns(names, columns):
+    for name in names:
+        if name not in columns:
+            raise QueryError(400, "42703", f"column {name} does not exist")
+
+
+def _parse_prefer(header):
+    prefer = {}
+    for part in header.split(","):
+        if "=" in part:
+            key, value = part.strip().split("=", 1)
+            prefer[key] = value
+    return prefer
+
+
+def _projection(select, columns):
+    if select in ("", "*"):
+        return "*"
+    names = [c.strip() for c in select.split(",") if c.strip()]
+    _check_columns(names, columns)
+    return ", ".join(names)
+
+
+def _encode(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _literal(value):
+    if value == "null":
+        return None
+    if value == "true":
+        return 1
+    if value == "false":
+        return 0
+    return value
+
+
+def _unquote(text):
+    if len(text) >= 2 and text[0] == text[-1] == '"':
+        return text[1:-1].replace('\\"', '"')
+    return text
+
+
+def _split_top_level(text):
+    """Split on commas that are not inside parentheses or double quotes"""
+    parts, depth, quoted, current = [], 0, False, ""
+    previous = ""
+    for ch in text:
+        if ch == '"' and previous != "\\":
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += ch
+        previous = ch
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _condition(column, expression, columns):
+    """One PostgREST filter `op.value` on `column` -> (sql, args)"""
+    _check_columns([column], columns)
+    negate = False
+    if expression.startswith("not."):
+        negate = True
+        expression = expression[4:]
+    op, _, value = expression.partition(".")
+    if op in FILTER_OPS:
+        sql, args = f"{column} {FILTER_OPS[op]} ?", [_literal(value)]
+    elif op == "in":
+        items = [_unquote(v.strip()) for v in _split_top_level(value[1:-1] if value.startswith("(") else value)]
+        marks = ", ".join("?" for _ in items) or "NULL"
+        sql, args = f"{column} IN ({marks})", items
+    elif op == "is":
+        if value not in ("null", "true", "false"):
+            raise QueryError(400, "PGRST100", f"invalid is value {value}")
+        sql, args = (f"{column} IS NULL", []) if value == "null" else (f"{column} = ?", [_literal(value)])
+    elif op in ("like", "ilike"):
+        pattern = value.replace("*", "%")
+        sql, args = (f"{column} LIKE ?", [pattern]) if op == "like" else (f"LOWER({column}) LIKE LOWER(?)", [pattern])
+    else:
+        raise QueryError(400, "PGRST100", f"unsupported operator {op}")
+    if negate:
+        sql = f"NOT ({sql})"
+    return sql, args
+
+
+def _logic_tree(operator, body, columns):
+    """`or=(a.eq.1,b.gt.2)` / nested and(...) -> (sql, args)"""
+    parts, args = [], []
+    for item in _split_top_level(body.strip()[1:-1]):
+        item = item.strip()
+        if item.startswith(("or(", "and(")):
+            nested_op, _, nested_body = item.partition("(")
+            sql, item_args = _logic_tree(nested_op, "(" + nested_body, columns)
+        else:
+            column, _, expression = item.partition(".")
+            sql, item_args = _condition(column, expression, columns)
+        parts.append(sql)
+        args.extend(item_args)
+    joiner = " OR " if operator == "or" else " AND "
+    return "(" + joiner.join(parts) + ")", args
+
+
+def _where(params, columns):
+    clauses, args = [], []
+    for key, expression in params.items():
+        if key in RESERVED_PARAMS:
+            continue
+        values = expression if isinstance(expression, (list, tuple)) else [expression]
+        for value in values:
+            if key in ("or", "and"):
+                sql, item_args = _logic_tree(key, value, columns)
+            else:
+                sql, item_args = _condition(key, value, columns)
+            clauses.append(sql)
+            args.extend(item_args)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+
+def _order(order, columns):
+    if not order:
+        return ""
+    terms = []
+    for term in order.split(","):
+        pieces = term.strip().split(".")
+        column = pieces[0]
+        _check_columns([column], columns)
+        direction = "DESC" if "desc" in pieces[1:] else "ASC"
+        nulls = ""
+        if "nullsfirst" in pieces[1:]:
+            nulls = " NULLS FIRST"
+        elif "nullslast" in pieces[1:]:
+            nulls = " NULLS LAST"
+        terms.append(f"{column} {direction}{nulls}")
+    return " ORDER BY " + ", ".join(terms)
+
+
+def _paginate(sql, args, params):
+    limit = params.get("limit")
+    offset = params.get("offset")
+    if limit is not None or offset is not None:
+        sql += " LIMIT ?"
+        args = args + [int(limit) if limit is not None else -1]
+        if offset is not None:
+            sql += " OFFSET ?"
+            args.append(int(offset))
+    return sql, args
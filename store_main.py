@@ -29,9 +29,9 @@ from languages import get_text, get_user_lang, set_user_lang, LANGUAGES, get_but
 from performance import (
     is_admin_cached, check_rate_limit, background,
     notify_admin_async, add_user_async, has_purchased_cached,
-    get_products_cached, get_promotion_cached, invalidate_user_purchase_cache,
-    invalidate_promotion_cache, warm_caches, get_all_cache_stats,
-    user_cache, admin_cache
+    get_products_cached, get_promotion_cached,
+    warm_caches, restore_cache_snapshot, get_all_cache_stats,
+    admin_cache
 )
 
 # Load environment variables
@@ -353,6 +353,16 @@ def notify_admin(action, display_name, user_id=None, extra=""):
             msg += f" - {extra}"
         notify_admin_async(bot, default_admin_id, msg)
 
+def notify_journal_conflict(entry, error):
+    """Báo admin khi một thao tác ghi lúc mất kết nối Supabase bị từ chối khi đồng bộ lại"""
+    payload = str(entry.get('payload') or entry.get('params'))[:300]
+    notify_admin("⚠️ Ghi dữ liệu bị xung đột khi đồng bộ lại", entry.get('caller') or entry['table'],
+                 extra=f"{entry['method']} {entry['table']} #{entry['seq']} ({entry['at']}): {error} | {payload}")
+
+# Writes journaled during a Supabase outage that are rejected on replay need a human
+if isinstance(supabase, SupabaseRESTClient) and supabase.journal is not None:
+    supabase.journal.on_conflict = notify_journal_conflict
+
 # Add default admin from env in background (non-blocking)
 def add_default_admin_background():
     """Add default admin in background thread"""
@@ -771,49 +781,39 @@ def payos_webhook():
         
         # Check promotion
         promo_msg = ""
-        promo_info = PromotionDB.get_promotion_info()
-        if promo_info and promo_info["is_active"]:
-            sold_before = promo_info["sold_count"]
-            max_promo = promo_info["max_count"]
-            if sold_before < max_promo:
-                remaining_slots = max_promo - sold_before
-                promo_bonus = min(quantity, remaining_slots)
-                promo_slot_start = sold_before + 1
-                promo_slot_end = min(sold_before + quantity, max_promo)
-                
-                PromotionDB.increment_sold_count(quantity)
-                
-                if promo_bonus == 1:
-                    slot_display = f"{promo_slot_start}"
-                else:
-                    slot_display = f"{promo_slot_start}-{promo_slot_end}"
-                
-                promo_msg = f"\n\n🎉 *CHÚC MỪNG! BẠN ĐƯỢC KHUYẾN MÃI MUA 1 TẶNG 1!*\n"
-                promo_msg += f"━━━━━━━━━━━━━━\n"
-                promo_msg += f"🎯 Suất khuyến mãi: slot {slot_display}\n"
-                promo_msg += f"📩 Inbox Admin kèm mã đơn `{ordernumber}` để được tặng thêm {promo_bonus} tài khoản!"
+        promo_claim = PromotionDB.claim_slots(quantity) if PromotionDB.is_promotion_active() else None
+        if promo_claim and promo_claim["granted"] > 0:
+            promo_bonus = promo_claim["granted"]
+            promo_slot_start = promo_claim["slot_start"]
+            promo_slot_end = promo_slot_start + promo_bonus - 1
+            
+            if promo_bonus == 1:
+                slot_display = f"{promo_slot_start}"
+            else:
+                slot_display = f"{promo_slot_start}-{promo_slot_end}"
+            
+            promo_msg = f"\n\n🎉 *CHÚC MỪNG! BẠN ĐƯỢC KHUYẾN MÃI MUA 1 TẶNG 1!*\n"
+            promo_msg += f"━━━━━━━━━━━━━━\n"
+            promo_msg += f"🎯 Suất khuyến mãi: slot {slot_display}\n"
+            promo_msg += f"📩 Inbox Admin kèm mã đơn `{ordernumber}` để được tặng thêm {promo_bonus} tài khoản!"
         
-        # Check if we have available accounts in stock for AUTO delivery
-        available_accounts = CanvaAccountDB.get_available_accounts(quantity)
+        # Atomically claim accounts from stock for AUTO delivery (all-or-nothing)
+        claimed_accounts = CanvaAccountDB.claim_accounts(user_id, ordernumber, quantity)
         
         try:
             price_num = int(float(str(price).replace(',', '')))
         except:
             price_num = price
         
-        if available_accounts and len(available_accounts) >= quantity:
+        if claimed_accounts and len(claimed_accounts) >= quantity:
             # === AUTO DELIVERY - We have stock ===
             logger.info(f"PayOS: Auto-delivering {quantity} accounts for order {ordernumber}")
             
-            # Assign accounts to buyer
+            # Accounts are already assigned to buyer by the claim
             assigned_accounts = []
-            for account in available_accounts[:quantity]:
-                account_id = account[0]
+            for account in claimed_accounts[:quantity]:
                 email = account[1]
                 authkey = account[2] if account[2] else "dlndaicanvaedu"
-                
-                # Assign to buyer
-                CanvaAccountDB.assign_account_to_buyer(account_id, user_id, ordernumber)
                 assigned_accounts.append({"email": email, "authkey": authkey})
             
             # Build account details message
@@ -910,7 +910,7 @@ def payos_webhook():
             
         else:
             # === MANUAL DELIVERY - No stock available ===
-            logger.info(f"PayOS: Manual delivery needed for order {ordernumber} (stock: {len(available_accounts) if available_accounts else 0}/{quantity})")
+            logger.info(f"PayOS: Manual delivery needed for order {ordernumber} (stock: {CanvaAccountDB.get_account_count()}/{quantity})")
             
             buyer_msg = f"✅ *THANH TOÁN THÀNH CÔNG!*\n"
             buyer_msg += f"━━━━━━━━━━━━━━━━━━━━\n"
@@ -995,7 +995,8 @@ def get_payment_api_key():
 
 BASE_CURRENCY = store_currency
 
-# PERFORMANCE: Warm caches on startup
+# PERFORMANCE: Serve the last cache snapshot at once, then warm caches on startup
+restore_cache_snapshot()
 warm_caches()
 
 # Create main reply keyboard (buttons at bottom - always visible)
@@ -1042,6 +1043,12 @@ def callback_query(call):
             bot.answer_callback_query(call.id, "⏳ Thao tác quá nhanh, vui lòng chờ...")
             return
         
+        # Buyer order history: next (older) page
+        if call.data.startswith("orders_before_"):
+            bot.answer_callback_query(call.id)
+            send_order_history(user_id, lang, before=int(call.data.replace("orders_before_", "")))
+            return
+        
         # Handle admin confirm payment - FINAL confirmation (step 2)
         if call.data.startswith("confirm_payment_final_"):
             if not is_admin(user_id):
@@ -1076,22 +1083,20 @@ def callback_query(call):
                 paidmethod='VietQR'
             )
             
-            # Check if we have stock for auto delivery
-            available_accounts = CanvaAccountDB.get_available_accounts(quantity)
+            # Atomically claim stock for auto delivery (all-or-nothing)
+            claimed_accounts = CanvaAccountDB.claim_accounts(buyer_id, ordernumber, quantity)
             
             try:
                 price_num = int(float(str(price).replace(',', '')))
             except:
                 price_num = price
             
-            if available_accounts and len(available_accounts) >= quantity:
+            if claimed_accounts and len(claimed_accounts) >= quantity:
                 # AUTO DELIVERY
                 assigned_accounts = []
-                for account in available_accounts[:quantity]:
-                    account_id = account[0]
+                for account in claimed_accounts[:quantity]:
                     email = account[1]
                     authkey = account[2] if account[2] else "dlndaicanvaedu"
-                    CanvaAccountDB.assign_account_to_buyer(account_id, buyer_id, ordernumber)
                     assigned_accounts.append({"email": email, "authkey": authkey})
                 
                 # Build message
@@ -1770,6 +1775,7 @@ def callback_query(call):
                     success_msg += f"🆔 Mã đơn: `{order_num}`\n"
                     success_msg += f"━━━━━━━━━━━━━━━━━━━━\n"
                     success_msg += f"_Nhấn nút bên dưới để lấy OTP hoặc gán thêm_"
+                    success_msg = _queued_note(result, success_msg)
                     
                     bot.edit_message_text(success_msg, call.message.chat.id, call.message.message_id, reply_markup=inline_kb, parse_mode="Markdown")
                     
@@ -1811,12 +1817,7 @@ def callback_query(call):
             bot.answer_callback_query(call.id, "Đang gán tài khoản...")
             
             # Get account info before assigning
-            all_accounts = CanvaAccountDB.get_all_accounts()
-            account_info = None
-            for acc in all_accounts:
-                if acc[0] == account_id:
-                    account_info = acc
-                    break
+            account_info = CanvaAccountDB.get_account_by_id(account_id)
             
             if not account_info:
                 bot.edit_message_text("❌ Tài khoản không tồn tại!", call.message.chat.id, call.message.message_id)
@@ -1845,6 +1846,7 @@ def callback_query(call):
                 success_msg += f"🆔 Mã đơn: `{order_num}`\n"
                 success_msg += f"━━━━━━━━━━━━━━━━━━━━\n"
                 success_msg += f"_Nhấn nút bên dưới để lấy OTP hoặc gán thêm_"
+                success_msg = _queued_note(result, success_msg)
                 
                 bot.edit_message_text(success_msg, call.message.chat.id, call.message.message_id, reply_markup=inline_kb, parse_mode="Markdown")
                 
@@ -1916,6 +1918,7 @@ def callback_query(call):
                 success_msg += f"🆔 Mã đơn: `{order_num}`\n"
                 success_msg += f"━━━━━━━━━━━━━━━━━━━━\n"
                 success_msg += f"_Nhấn nút bên dưới để lấy OTP hoặc gán thêm_"
+                success_msg = _queued_note(result, success_msg)
                 
                 bot.edit_message_text(success_msg, call.message.chat.id, call.message.message_id, reply_markup=inline_kb, parse_mode="Markdown")
                 
@@ -2045,9 +2048,9 @@ def send_welcome(message):
             except:
                 all_user_s = all_admin_s = all_product_s = all_orders_s = 0
             
-            # Ensure admin is in database
-            CreateDatas.AddAuser(id, usname)
-            CreateDatas.AddAdmin(id, usname)
+            # Ensure admin is in database (write-behind, never blocks the handler)
+            CreateDatas.AddAuser(id, usname, defer=True)
+            CreateDatas.AddAdmin(id, usname, defer=True)
             
             keyboardadmin = types.ReplyKeyboardMarkup(one_time_keyboard=False, resize_keyboard=True)
             keyboardadmin.row_width = 2
@@ -2089,11 +2092,10 @@ def send_welcome(message):
                 return
                 
             # Customer - minimal DB calls
-            # Check if new user
-            existing_users = GetDataFromDB.GetUserIDsInDB() or []
-            is_new_user = str(id) not in str(existing_users)
+            # Check if new user (local id index, no table download)
+            is_new_user = not known_users.contains(id)
             
-            CreateDatas.AddAuser(id, usname)
+            CreateDatas.AddAuser(id, usname, defer=True)
             
             # Notify admin if new user
             if is_new_user:
@@ -2802,6 +2804,7 @@ def admin_assign_account_get_password(message):
         success_msg += f"🆔 Mã đơn: `{order_num}`\n"
         success_msg += f"━━━━━━━━━━━━━━━━━━━━\n"
         success_msg += f"_Nhấn nút bên dưới để lấy OTP hoặc gán thêm_"
+        success_msg = _queued_note(result, success_msg)
         
         bot.send_message(id, success_msg, reply_markup=inline_kb, parse_mode="Markdown")
         
@@ -2938,7 +2941,9 @@ def enable_promotion(message):
     
     promo_info = PromotionDB.get_promotion_info()
     max_slots = promo_info['max_count'] if promo_info else 10
-    PromotionDB.enable_promotion()
+    if not PromotionDB.enable_promotion():
+        bot.send_message(id, "❌ Không bật được khuyến mãi, vui lòng thử lại!", reply_markup=create_main_keyboard(lang, id))
+        return
     bot.send_message(id, f"✅ *Đã BẬT khuyến mãi!*\n\n🎁 {max_slots} tài khoản tiếp theo sẽ được tặng thêm.\nĐếm bắt đầu từ 0.", reply_markup=create_main_keyboard(lang, id), parse_mode="Markdown")
 
 # Handler for disable promotion
@@ -2950,7 +2955,9 @@ def disable_promotion(message):
     if not is_admin(id):
         return
     
-    PromotionDB.disable_promotion()
+    if not PromotionDB.disable_promotion():
+        bot.send_message(id, "❌ Không tắt được khuyến mãi, vui lòng thử lại!", reply_markup=create_main_keyboard(lang, id))
+        return
     bot.send_message(id, "❌ *Đã TẮT khuyến mãi!*\n\n_Khuyến mãi đã bị hủy. Bật lại sẽ đếm từ đầu._", reply_markup=create_main_keyboard(lang, id), parse_mode="Markdown")
 
 # Handler for set promotion slots
@@ -2987,7 +2994,9 @@ def process_set_slots(message):
             bot.send_message(id, "❌ Số slot phải lớn hơn 0!", reply_markup=create_main_keyboard(lang, id))
             return
         
-        PromotionDB.set_max_count(new_slots)
+        if not PromotionDB.set_max_count(new_slots):
+            bot.send_message(id, "❌ Không lưu được số slot, vui lòng thử lại!", reply_markup=create_main_keyboard(lang, id))
+            return
         bot.send_message(id, f"✅ *Đã đặt số slot khuyến mãi: {new_slots}*", reply_markup=create_main_keyboard(lang, id), parse_mode="Markdown")
     except ValueError:
         bot.send_message(id, "❌ Vui lòng nhập số hợp lệ!", reply_markup=create_main_keyboard(lang, id))
@@ -3056,6 +3065,41 @@ def add_canva_account_prompt(message):
     msg = bot.send_message(id, "📧 Gửi danh sách email tài khoản Canva\n\n✅ Đã dùng Premium - không cần authkey!\n\nĐịnh dạng:\nemail1@domain.xyz\nemail2@domain.xyz\nemail3@domain.xyz\n\n(Mỗi email 1 dòng)", reply_markup=keyboard)
     bot.register_next_step_handler(msg, process_canva_accounts_file)
 
+def _queued_note(result, msg):
+    """Mark an admin confirmation whose write only reached the write journal (Supabase down)"""
+    if result == QUEUED:
+        return ("⏳ *ĐÃ XẾP HÀNG* - Supabase đang gián đoạn, thao tác sẽ tự ghi khi kết nối lại "
+                "(chưa có hiệu lực ngay).\n\n" + msg)
+    return msg
+
+def _format_import_result(result):
+    """Build admin summary for a bulk account import"""
+    msg = f"✅ Đã thêm {result.succeeded - result.queued} tài khoản Canva!"
+    if result.queued:
+        msg += f"\n⏳ {result.queued} tài khoản đang chờ ghi - Supabase gián đoạn, sẽ tự thêm khi kết nối lại"
+    if result.failed:
+        msg += f"\n⚠️ Lỗi {result.failed} tài khoản ({result.failed_chunks}/{len(result.chunks)} lô thất bại)"
+    if result.skipped:
+        msg += f"\n⏭️ Bỏ qua {result.skipped} tài khoản đã bán"
+    return msg
+
+def _import_canva_accounts_background(admin_id, content, lang, from_file):
+    """Run bulk import off the bot worker threads, then report to admin"""
+    try:
+        result = CanvaAccountDB.import_accounts(content)
+        if not result.chunks and not result.skipped:
+            bot.send_message(admin_id, "❌ Không tìm thấy email hợp lệ. Mỗi email 1 dòng.", reply_markup=create_main_keyboard(lang, admin_id))
+            return
+        if from_file:
+            keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
+            keyboard.row(types.KeyboardButton(text="➕ Thêm tài khoản Canva"))
+            keyboard.row(types.KeyboardButton(text="🏠 Trang chủ"))
+        else:
+            keyboard = create_main_keyboard(lang, admin_id)
+        bot.send_message(admin_id, _format_import_result(result), reply_markup=keyboard)
+    except Exception as e:
+        bot.send_message(admin_id, f"❌ Lỗi: {str(e)}", reply_markup=create_main_keyboard(lang, admin_id))
+
 def process_canva_accounts_file(message):
     """Process uploaded Canva accounts file"""
     id = message.from_user.id
@@ -3075,25 +3119,13 @@ def process_canva_accounts_file(message):
             downloaded_file = bot.download_file(file_info.file_path)
             content = downloaded_file.decode('utf-8')
             
-            count = CanvaAccountDB.import_emails_only(content)
-            
-            keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
-            keyboard.row(types.KeyboardButton(text="➕ Thêm tài khoản Canva"))
-            keyboard.row(types.KeyboardButton(text="🏠 Trang chủ"))
-            
-            bot.send_message(id, f"✅ Đã thêm {count} tài khoản Canva!", reply_markup=keyboard)
+            bot.send_message(id, "⏳ Đang nhập tài khoản...")
+            background.submit(_import_canva_accounts_background, id, content, lang, True)
         except Exception as e:
             bot.send_message(id, f"❌ Lỗi: {str(e)}", reply_markup=create_main_keyboard(lang, id))
     elif message.text:
         # Try to parse text directly
-        try:
-            count = CanvaAccountDB.import_emails_only(message.text)
-            if count > 0:
-                bot.send_message(id, f"✅ Đã thêm {count} tài khoản Canva!", reply_markup=create_main_keyboard(lang, id))
-            else:
-                bot.send_message(id, "❌ Không tìm thấy email hợp lệ. Mỗi email 1 dòng.", reply_markup=create_main_keyboard(lang, id))
-        except Exception as e:
-            bot.send_message(id, f"❌ Lỗi: {str(e)}", reply_markup=create_main_keyboard(lang, id))
+        background.submit(_import_canva_accounts_background, id, message.text, lang, False)
     else:
         bot.send_message(id, "❌ Vui lòng gửi file .txt hoặc text", reply_markup=create_main_keyboard(lang, id))
 
@@ -3108,23 +3140,22 @@ def list_canva_accounts(message):
         bot.send_message(id, get_text("admin_only", lang), reply_markup=create_main_keyboard(lang, id))
         return
     
-    accounts = CanvaAccountDB.get_all_accounts()
+    # Counts and the 10-row sample are computed by Postgres
+    available_count = CanvaAccountDB.get_account_count('available')
+    sold_count = CanvaAccountDB.get_account_count('sold')
+    available = CanvaAccountDB.get_available_accounts(10) if available_count else []
     
-    if not accounts:
+    if available_count == 0 and sold_count == 0:
         bot.send_message(id, "📭 Chưa có tài khoản nào", reply_markup=create_main_keyboard(lang, id))
         return
     
-    # Group by status
-    available = [a for a in accounts if a[5] == 'available']
-    sold = [a for a in accounts if a[5] == 'sold']
-    
     msg = f"📧 Danh sách tài khoản Canva\n\n"
-    msg += f"✅ Khả dụng: {len(available)}\n"
-    msg += f"🛒 Đã bán: {len(sold)}\n\n"
+    msg += f"✅ Khả dụng: {available_count}\n"
+    msg += f"🛒 Đã bán: {sold_count}\n\n"
     
-    if available[:10]:
+    if available:
         msg += "📋 10 tài khoản khả dụng gần nhất:\n"
-        for acc in available[:10]:
+        for acc in available:
             msg += f"• {acc[1]}\n"
     
     bot.send_message(id, msg, reply_markup=create_main_keyboard(lang, id))
@@ -3141,8 +3172,8 @@ def delete_canva_account_prompt(message):
         return
     
     # Show available accounts to delete
-    accounts = CanvaAccountDB.get_all_accounts()
-    available = [a for a in accounts if a[5] == 'available']
+    available_count = CanvaAccountDB.get_account_count('available')
+    available = CanvaAccountDB.get_available_accounts(10) if available_count else []  # Show max 10
     
     if not available:
         bot.send_message(id, "📭 Không có tài khoản nào để xóa", reply_markup=create_main_keyboard(lang, id))
@@ -3150,11 +3181,11 @@ def delete_canva_account_prompt(message):
     
     keyboard = types.ReplyKeyboardMarkup(resize_keyboard=True)
     keyboard.row(types.KeyboardButton(text="🗑 Xóa tất cả tài khoản"))
-    for acc in available[:10]:  # Show max 10
+    for acc in available:
         keyboard.add(types.KeyboardButton(text=f"❌ {acc[1]}"))
     keyboard.add(types.KeyboardButton(text="🏠 Trang chủ"))
     
-    bot.send_message(id, f"Chọn tài khoản cần xóa:\n\n(Hiển thị {min(10, len(available))}/{len(available)} tài khoản)", reply_markup=keyboard)
+    bot.send_message(id, f"Chọn tài khoản cần xóa:\n\n(Hiển thị {len(available)}/{available_count} tài khoản)", reply_markup=keyboard)
 
 # Check if message is admin delete button (not user delete)
 def is_admin_delete_button(text):
@@ -3175,12 +3206,13 @@ def delete_specific_canva_account(message):
     email = message.text.replace("❌ ", "")
     
     # Find and delete account
-    accounts = CanvaAccountDB.get_all_accounts()
-    for acc in accounts:
-        if acc[1] == email:
-            CanvaAccountDB.delete_account(acc[0])
+    account = CanvaAccountDB.get_account_by_email(email)
+    if account:
+        if CanvaAccountDB.delete_account(account['id']):
             bot.send_message(id, f"✅ Đã xóa tài khoản: {email}", reply_markup=create_main_keyboard(lang, id))
-            return
+        else:
+            bot.send_message(id, f"❌ Không xóa được tài khoản: {email}, vui lòng thử lại!", reply_markup=create_main_keyboard(lang, id))
+        return
     
     bot.send_message(id, f"❌ Không tìm thấy tài khoản: {email}", reply_markup=create_main_keyboard(lang, id))
 
@@ -3210,15 +3242,17 @@ def confirm_delete_all_canva(message):
     if not is_admin(id):
         return
     
-    accounts = CanvaAccountDB.get_all_accounts()
-    available = [a for a in accounts if a[5] == 'available']
-    
-    count = 0
-    for acc in available:
-        if CanvaAccountDB.delete_account(acc[0]):
-            count += 1
+    result = CanvaAccountDB.delete_available_accounts()
     
-    bot.send_message(id, f"✅ Đã xóa {count} tài khoản Canva!", reply_markup=create_main_keyboard(lang, id))
+    if result.error and not result.chunks:
+        bot.send_message(id, "❌ Không đọc được danh sách tài khoản, chưa xóa gì. Vui lòng thử lại!", reply_markup=create_main_keyboard(lang, id))
+        return
+    msg = f"✅ Đã xóa {len(result.data)} tài khoản Canva!"
+    if result.queued:
+        msg += f"\n⏳ {result.queued} tài khoản đang chờ xóa - Supabase gián đoạn, sẽ tự xóa khi kết nối lại"
+    if result.failed:
+        msg += f"\n⚠️ Lỗi: chưa xóa được {result.failed} tài khoản, vui lòng thử lại"
+    bot.send_message(id, msg, reply_markup=create_main_keyboard(lang, id))
 
 # Handler for Canva account stats
 @bot.message_handler(content_types=["text"], func=lambda message: message.text == "📊 Thống kê tài khoản")
@@ -3231,12 +3265,12 @@ def canva_account_stats(message):
         bot.send_message(id, get_text("admin_only", lang), reply_markup=create_main_keyboard(lang, id))
         return
     
-    accounts = CanvaAccountDB.get_all_accounts()
-    available = len([a for a in accounts if a[5] == 'available'])
-    sold = len([a for a in accounts if a[5] == 'sold'])
+    total = CanvaAccountDB.get_account_count(None)
+    available = CanvaAccountDB.get_account_count('available')
+    sold = CanvaAccountDB.get_account_count('sold')
     
     msg = f"📊 Thống kê tài khoản Canva\n\n"
-    msg += f"📧 Tổng số: {len(accounts)}\n"
+    msg += f"📧 Tổng số: {total}\n"
     msg += f"✅ Khả dụng: {available}\n"
     msg += f"🛒 Đã bán: {sold}\n"
     
@@ -3345,7 +3379,9 @@ def handle_delete_account_confirm(message):
     # Remove buyer_id from account (set back to available or delete)
     success = CanvaAccountDB.remove_buyer_from_account(email, user_id)
     
-    if success:
+    if success == QUEUED:
+        bot.send_message(user_id, f"⏳ Hệ thống đang gián đoạn, tài khoản {email} sẽ được xóa khỏi danh sách của bạn khi kết nối lại.", reply_markup=create_main_keyboard(lang, user_id))
+    elif success:
         bot.send_message(user_id, f"✅ Đã xóa tài khoản {email} khỏi danh sách của bạn.", reply_markup=create_main_keyboard(lang, user_id))
     else:
         bot.send_message(user_id, f"❌ Không thể xóa tài khoản {email}.", reply_markup=create_main_keyboard(lang, user_id))
@@ -5556,41 +5592,57 @@ def MyOrdersList(message):
     if not is_admin(id):
         notify_admin("📋 Xem đơn hàng", display_name)
     
-    my_orders = GetDataFromDB.GetOrderIDs_Buyer(id)
-    if my_orders is None or my_orders == [] or my_orders == "None":
-        bot.send_message(id, get_text("no_order_completed", lang), reply_markup=create_main_keyboard(lang, id), parse_mode='Markdown')
+    send_order_history(id, lang)
+
+def send_order_history(id, lang, before=None):
+    """Send one page of the buyer's orders, newest first, with a button for older ones"""
+    page_size = ORDER_HISTORY_LIMIT
+    # One extra row tells whether an older page exists
+    order_details = GetDataFromDB.GetOrderHistory_Buyer(id, limit=page_size + 1, before=before)
+    has_more = len(order_details) > page_size
+    order_details = order_details[:page_size]
+    if not order_details:
+        if before is None:
+            bot.send_message(id, get_text("no_order_completed", lang), reply_markup=create_main_keyboard(lang, id), parse_mode='Markdown')
+        else:
+            bot.send_message(id, get_text("list_completed", lang), reply_markup=create_main_keyboard(lang, id))
+        return
+    for buyerid, buyerusername, productname, productprice, orderdate, paidmethod, productdownloadlink, productkeys, buyercomment, ordernumber, productnumber in order_details:
+        # Determine payment status
+        if paidmethod == "PENDING":
+            status = "⏳ Trạng thái: Chưa thanh toán" if lang == "vi" else "⏳ Status: Pending"
+        else:
+            status = "✅ Trạng thái: Đã thanh toán" if lang == "vi" else "✅ Status: Paid"
+        # Format price as number for {:,} formatting
+        try:
+            price_num = int(float(str(productprice).replace(',', '').replace('k', '000').replace('K', '000')))
+        except:
+            price_num = productprice
+        msg = get_text("order_info", lang, productname, ordernumber, orderdate, price_num, store_currency, status, productkeys)
+        
+        # Create inline buttons for each email in productkeys
+        inline_kb = types.InlineKeyboardMarkup()
+        if productkeys and productkeys != "NIL":
+            emails = [e.strip() for e in productkeys.replace('\n', ',').split(',') if '@' in e.strip()]
+            for email in emails:
+                inline_kb.add(types.InlineKeyboardButton(
+                    text=f"🔑 Lấy OTP: {email[:20]}..." if len(email) > 20 else f"🔑 Lấy OTP: {email}",
+                    callback_data=f"otp_{email}"
+                ))
+        
+        if inline_kb.keyboard:
+            bot.send_message(id, text=f"{msg}", reply_markup=inline_kb, parse_mode="Markdown")
+        else:
+            bot.send_message(id, text=f"{msg}", parse_mode="Markdown")
+    if has_more:
+        more_kb = types.InlineKeyboardMarkup()
+        more_kb.add(types.InlineKeyboardButton(
+            text="📜 Xem đơn cũ hơn" if lang == "vi" else "📜 Older orders",
+            callback_data=f"orders_before_{order_details[-1].ordernumber}"
+        ))
+        shown = f"📋 Đã hiện {len(order_details)} đơn, còn đơn cũ hơn." if lang == "vi" else f"📋 Showed {len(order_details)} orders, older ones remain."
+        bot.send_message(id, shown, reply_markup=more_kb)
     else:
-        for my_order in my_orders:
-            order_details = GetDataFromDB.GetOrderDetails(my_order[0])
-            if order_details is None:
-                continue
-            for buyerid, buyerusername, productname, productprice, orderdate, paidmethod, productdownloadlink, productkeys, buyercomment, ordernumber, productnumber in order_details:
-                # Determine payment status
-                if paidmethod == "PENDING":
-                    status = "⏳ Trạng thái: Chưa thanh toán" if lang == "vi" else "⏳ Status: Pending"
-                else:
-                    status = "✅ Trạng thái: Đã thanh toán" if lang == "vi" else "✅ Status: Paid"
-                # Format price as number for {:,} formatting
-                try:
-                    price_num = int(float(str(productprice).replace(',', '').replace('k', '000').replace('K', '000')))
-                except:
-                    price_num = productprice
-                msg = get_text("order_info", lang, productname, ordernumber, orderdate, price_num, store_currency, status, productkeys)
-                
-                # Create inline buttons for each email in productkeys
-                inline_kb = types.InlineKeyboardMarkup()
-                if productkeys and productkeys != "NIL":
-                    emails = [e.strip() for e in productkeys.replace('\n', ',').split(',') if '@' in e.strip()]
-                    for email in emails:
-                        inline_kb.add(types.InlineKeyboardButton(
-                            text=f"🔑 Lấy OTP: {email[:20]}..." if len(email) > 20 else f"🔑 Lấy OTP: {email}",
-                            callback_data=f"otp_{email}"
-                        ))
-                
-                if inline_kb.keyboard:
-                    bot.send_message(id, text=f"{msg}", reply_markup=inline_kb, parse_mode="Markdown")
-                else:
-                    bot.send_message(id, text=f"{msg}", parse_mode="Markdown")
         bot.send_message(id, get_text("list_completed", lang), reply_markup=create_main_keyboard(lang, id))
 
 # Check if message matches support button
@@ -5644,6 +5696,9 @@ def MessageAllUsers(message):
         bot.register_next_step_handler(msg, message_all_users)
     else:
         bot.send_message(id, get_text("admin_only", lang), reply_markup=create_main_keyboard(lang, id))
+# Max usernames listed per outcome in the broadcast report
+BROADCAST_NAME_SAMPLE = 50
+
 def message_all_users(message):
     id = message.from_user.id
     lang = get_user_lang(id)
@@ -5668,33 +5723,57 @@ def message_all_users(message):
                 bot.send_message(id, "❌ Đã hủy gửi thông báo", reply_markup=keyboardadmin)
                 return
             
-            all_users = GetDataFromDB.GetUsersInfo()
-            if all_users ==  []:
-                msg = bot.send_message(id, "Chưa có người dùng nào trong cửa hàng, /start", reply_markup=keyboardadmin)
-            else:
-                bot.send_message(id, "📢 Đang gửi thông báo đến tất cả người dùng...")
-                success_list = []
-                blocked_list = []
-                other_fail_list = []
-                for uid, uname, uwallet in all_users:
+            # Stream users page by page; keep counters and only a sample of names
+            total = 0
+            counts = {"success": 0, "blocked": 0, "other": 0}
+            samples = {"success": [], "blocked": [], "other": []}
+            interrupted = False
+            try:
+                for uid, uname, uwallet in GetDataFromDB.IterUsersInfo():
+                    if total == 0:
+                        bot.send_message(id, "📢 Đang gửi thông báo đến tất cả người dùng...")
+                    total += 1
                     try:
                         bot.send_message(uid, f"{input_message}")
-                        success_list.append(f"@{uname}")
+                        outcome = "success"
                         time.sleep(0.3)
                     except Exception as e:
                         error_msg = str(e).lower()
                         if "blocked" in error_msg or "deactivated" in error_msg or "bot was blocked" in error_msg:
-                            blocked_list.append(f"@{uname}")
+                            outcome = "blocked"
                         else:
-                            other_fail_list.append(f"@{uname}")
-                
-                result_msg = f"✅ Hoàn tất!\n\n📊 Đã gửi: {len(success_list)}/{len(all_users)} người dùng"
-                if success_list:
-                    result_msg += f"\n\n✅ Thành công:\n" + ", ".join(success_list)
-                if blocked_list:
-                    result_msg += f"\n\n🚫 Đã chặn bot ({len(blocked_list)}):\n" + ", ".join(blocked_list)
-                if other_fail_list:
-                    result_msg += f"\n\n⚠️ Lỗi khác ({len(other_fail_list)}):\n" + ", ".join(other_fail_list)
+                            outcome = "other"
+                    counts[outcome] += 1
+                    if len(samples[outcome]) < BROADCAST_NAME_SAMPLE:
+                        samples[outcome].append(f"@{uname}")
+            except ScanIncomplete as e:
+                # The user list could not be read to the end: the report below says so instead of "done"
+                logger.error(f"Broadcast cut short after {total} users: {e}")
+                interrupted = True
+            
+            def names(outcome):
+                more = counts[outcome] - len(samples[outcome])
+                return ", ".join(samples[outcome]) + (f" (+{more})" if more > 0 else "")
+            
+            if interrupted:
+                result_msg = (f"⚠️ Gửi bị gián đoạn: không đọc được hết danh sách người dùng.\n\n"
+                              f"📊 Đã gửi: {counts['success']}/{total} người dùng đã đọc được trước khi dừng, "
+                              f"những người còn lại chưa nhận được thông báo. Vui lòng thử lại sau.")
+                if counts["blocked"]:
+                    result_msg += f"\n\n🚫 Đã chặn bot ({counts['blocked']}):\n" + names("blocked")
+                if counts["other"]:
+                    result_msg += f"\n\n⚠️ Lỗi khác ({counts['other']}):\n" + names("other")
+                bot.send_message(id, result_msg, reply_markup=keyboardadmin)
+            elif total == 0:
+                msg = bot.send_message(id, "Chưa có người dùng nào trong cửa hàng, /start", reply_markup=keyboardadmin)
+            else:
+                result_msg = f"✅ Hoàn tất!\n\n📊 Đã gửi: {counts['success']}/{total} người dùng"
+                if counts["success"]:
+                    result_msg += f"\n\n✅ Thành công:\n" + names("success")
+                if counts["blocked"]:
+                    result_msg += f"\n\n🚫 Đã chặn bot ({counts['blocked']}):\n" + names("blocked")
+                if counts["other"]:
+                    result_msg += f"\n\n⚠️ Lỗi khác ({counts['other']}):\n" + names("other")
                 bot.send_message(id, result_msg, reply_markup=keyboardadmin)
         except Exception as e:
             print(e)
@@ -5766,21 +5845,23 @@ def ListOrders(message):
         id = message.from_user.id
         lang = get_user_lang(id)
         
-        all_orders = GetDataFromDB.GetOrderInfo()
         if is_admin(id):
             keyboardadmin = types.ReplyKeyboardMarkup(one_time_keyboard=False, resize_keyboard=True)
             keyboardadmin.row_width = 2
-            if all_orders == [] or all_orders is None:
+            # Stream orders page by page instead of loading the whole table
+            listed = 0
+            for ordernumber, productname, buyerusername, orderdate in GetDataFromDB.IterOrderInfo():
+                if listed == 0:
+                    bot.send_message(id, "📋 *DANH SÁCH ĐƠN HÀNG*", parse_mode="Markdown")
+                    bot.send_message(id, "👇 Mã đơn hàng - Tên sản phẩm - Khách - Ngày mua 👇")
+                listed += 1
+                time.sleep(0.3)
+                # Escape username để tránh lỗi Markdown
+                safe_username = str(buyerusername).replace("_", "\\_") if buyerusername else "N/A"
+                safe_productname = str(productname).replace("_", "\\_") if productname else "N/A"
+                bot.send_message(id, f"`{ordernumber}` - {safe_productname} - @{safe_username} - {orderdate}", parse_mode="Markdown")
+            if listed == 0:
                 bot.send_message(id, "📭 Chưa có đơn hàng nào trong cửa hàng")
-            else:
-                bot.send_message(id, "📋 *DANH SÁCH ĐƠN HÀNG*", parse_mode="Markdown")
-                bot.send_message(id, "👇 Mã đơn hàng - Tên sản phẩm - Khách - Ngày mua 👇")
-                for ordernumber, productname, buyerusername, orderdate in all_orders:
-                    time.sleep(0.3)
-                    # Escape username để tránh lỗi Markdown
-                    safe_username = str(buyerusername).replace("_", "\\_") if buyerusername else "N/A"
-                    safe_productname = str(productname).replace("_", "\\_") if productname else "N/A"
-                    bot.send_message(id, f"`{ordernumber}` - {safe_productname} - @{safe_username} - {orderdate}", parse_mode="Markdown")
             key1 = types.KeyboardButton(text=get_text("list_orders", lang))
             key2 = types.KeyboardButton(text=get_text("delete_order", lang))
             key3 = types.KeyboardButton(text=get_text("home", lang))
@@ -5805,23 +5886,25 @@ def DeleteOrderMNG(message):
         id = message.from_user.id
         lang = get_user_lang(id)
         
-        all_orders = GetDataFromDB.GetOrderInfo()
         if is_admin(id):
             keyboardadmin = types.ReplyKeyboardMarkup(one_time_keyboard=False, resize_keyboard=True)
             keyboardadmin.row_width = 2
-            if all_orders == [] or all_orders is None:
+            listed = 0
+            for ordernumber, productname, buyerusername, orderdate in GetDataFromDB.IterOrderInfo():
+                if listed == 0:
+                    bot.send_message(id, "👇 Mã đơn hàng - Tên sản phẩm - Khách - Ngày mua 👇")
+                listed += 1
+                # Escape username để tránh lỗi Markdown
+                safe_username = str(buyerusername).replace("_", "\\_") if buyerusername else "N/A"
+                safe_productname = str(productname).replace("_", "\\_") if productname else "N/A"
+                bot.send_message(id, f"/{ordernumber} - {safe_productname} - @{safe_username} - {orderdate}", parse_mode="Markdown")
+            if listed == 0:
                 key1 = types.KeyboardButton(text=get_text("list_orders", lang))
                 key2 = types.KeyboardButton(text=get_text("home", lang))
                 keyboardadmin.add(key1)
                 keyboardadmin.add(key2)
                 bot.send_message(id, "📭 Chưa có đơn hàng nào trong cửa hàng", reply_markup=keyboardadmin)
             else:
-                bot.send_message(id, "👇 Mã đơn hàng - Tên sản phẩm - Khách - Ngày mua 👇")
-                for ordernumber, productname, buyerusername, orderdate in all_orders:
-                    # Escape username để tránh lỗi Markdown
-                    safe_username = str(buyerusername).replace("_", "\\_") if buyerusername else "N/A"
-                    safe_productname = str(productname).replace("_", "\\_") if productname else "N/A"
-                    bot.send_message(id, f"/{ordernumber} - {safe_productname} - @{safe_username} - {orderdate}", parse_mode="Markdown")
                 msg = bot.send_message(id, "👆 Nhấn vào mã đơn hàng bạn muốn xóa", parse_mode="Markdown")
                 bot.register_next_step_handler(msg, delete_an_order)
         else:
@@ -5836,11 +5919,7 @@ def delete_an_order(message):
         lang = get_user_lang(id)
         ordernu = message.text
         ordernumber = ordernu[1:99]
-        ordernum = GetDataFromDB.GetOrderIDs()
-        ordernumbers = []
-        for ordern in ordernum:
-            ordernumbers.append(ordern[0])
-        if f"{ordernumber}" in f"{ordernumbers}":
+        if ordernumber.isdigit() and GetDataFromDB.GetOrderDetails(ordernumber):
             try:
                 global ordernums
                 ordernums = ordernumber
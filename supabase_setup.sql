@@ -103,6 +103,16 @@ INSERT INTO promotions (promo_name, is_active, sold_count, max_count)
 VALUES ('buy1get1', 0, 0, 10)
 ON CONFLICT (promo_name) DO NOTHING;
 
+-- ============================================
+-- INDEXES AND RPC FUNCTIONS
+-- ============================================
+
+-- Indexes and RPC functions are versioned in migrations/ and applied
+-- with: python migrate.py  (needs DATABASE_URL, see migrate.py)
+-- Required after running this file: auto-delivery claims stock through the
+-- claim_canva_accounts RPC. Without it the bot logs an error on every paid
+-- order and falls back to slower one-account-at-a-time claims.
+
 -- ============================================
 -- ROW LEVEL SECURITY POLICIES
 -- These allow the anon key to access all data
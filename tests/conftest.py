@@ -0,0 +1,47 @@
+"""
+Shared fixtures: every test runs against the local SQLite backend or a FakePostgREST server,
+never against Supabase. The environment is set before InDMDevDB is imported.
+"""
+
+import os
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp(prefix="indmdevdb-tests-")
+os.environ.update({
+    'DB_BACKEND': 'sqlite',
+    'DB_FILE': ':memory:',
+    'CACHE_BACKEND': 'local',
+    'CACHE_SNAPSHOT_FILE': os.path.join(_tmp, 'cache.snapshot'),
+    'DB_JOURNAL_FILE': os.path.join(_tmp, 'unused.journal'),
+})
+
+import InDMDevDB
+from fake_postgrest import FakePostgREST
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """A fresh in-memory SQLite client installed as InDMDevDB.supabase"""
+    client = InDMDevDB.SQLiteClient(":memory:")
+    monkeypatch.setattr(InDMDevDB, 'supabase', client)
+    return client
+
+
+@pytest.fixture
+def server():
+    with FakePostgREST() as fake:
+        yield fake
+
+
+@pytest.fixture
+def rest(server, tmp_path):
+    """REST client on the fake server with a write journal; no retries and a breaker that never opens"""
+    journal = InDMDevDB.WriteJournal(str(tmp_path / "writes.journal"), replay_interval=3600)
+    return server.client(retries=1, backoff=0, breaker_threshold=1000, journal=journal)
+
+
+def add_accounts(client, count, status='available'):
+    rows = [{'email': f'user{i}@example.com', 'authkey': f'key{i}', 'status': status} for i in range(count)]
+    client.table(InDMDevDB.TABLE_CANVA).insert(rows).execute()
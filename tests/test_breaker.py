@@ -0,0 +1,41 @@
+"""CircuitBreaker states, alone and in front of the fake server"""
+
+import time
+
+from InDMDevDB import CIRCUIT_OPEN_ERROR, CircuitBreaker, TABLE_CANVA
+
+
+def test_opens_after_threshold_and_probes_once():
+    breaker = CircuitBreaker("test", threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    # Only one probe while half open
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("test", threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+    assert breaker.stats()['times_opened'] == 2
+
+
+def test_open_circuit_skips_the_network(server):
+    client = server.client(retries=1, backoff=0, breaker_threshold=2, breaker_reset=60)
+    server.error_rate = 1.0
+    for _ in range(2):
+        client.table(TABLE_CANVA).select('id').execute()
+    server.reset_stats()
+    result = client.table(TABLE_CANVA).select('id').execute()
+    assert result.error == CIRCUIT_OPEN_ERROR
+    assert server.request_count == 0
@@ -0,0 +1,24 @@
+"""Chunked bulk writes: one request per chunk, failed chunks counted separately"""
+
+from InDMDevDB import TABLE_CANVA
+
+
+def _rows(start, count):
+    return [{'email': f'user{i}@example.com', 'authkey': 'k'} for i in range(start, start + count)]
+
+
+def test_bulk_insert_sends_one_request_per_chunk(server, rest):
+    server.reset_stats()
+    result = rest.table(TABLE_CANVA).insert(_rows(0, 5)).bulk(chunk_size=2).execute()
+    assert [c['size'] for c in result.chunks] == [2, 2, 1]
+    assert result.succeeded == 5 and result.failed == 0
+    assert server.request_count == 3
+
+
+def test_failed_chunk_does_not_hide_the_others(server, rest):
+    rest.table(TABLE_CANVA).insert(_rows(2, 1)).execute()
+    # Chunk 2 repeats an existing email and is rejected; chunks 1 and 3 still land
+    result = rest.table(TABLE_CANVA).upsert(_rows(0, 5)).bulk(chunk_size=2).execute()
+    assert [c['ok'] for c in result.chunks] == [True, False, True]
+    assert result.succeeded == 3 and result.failed == 2 and result.failed_chunks == 1
+    assert result.error is not None
@@ -0,0 +1,80 @@
+"""TTLCache.get_or_load: single-flight loads, stale-while-revalidate and negative caching"""
+
+import threading
+import time
+
+import pytest
+
+from performance import TTLCache
+
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', loader))) for _ in range(5)]
+    threads[0].start()
+    started.wait(5)
+    for t in threads[1:]:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join(5)
+    assert calls == [1]
+    assert results == ['value'] * 5
+
+
+def test_loader_error_reaches_every_caller():
+    cache = TTLCache(ttl=60)
+
+    def loader():
+        raise RuntimeError("down")
+    with pytest.raises(RuntimeError):
+        cache.get_or_load('k', loader)
+    assert cache.get_or_load('k', lambda: 'back') == 'back'
+
+
+def test_stale_value_served_while_refreshing():
+    cache = TTLCache(ttl=0.05, stale_ttl=60)
+    cache.set('k', 'old')
+    time.sleep(0.06)
+    refreshed = threading.Event()
+
+    def loader():
+        refreshed.set()
+        return 'new'
+    assert cache.get_or_load('k', loader) == 'old'
+    assert refreshed.wait(5)
+    deadline = time.monotonic() + 5
+    while cache.get('k') != 'new' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get('k') == 'new'
+
+
+def test_none_cached_only_with_negative_ttl():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return None
+    plain = TTLCache(ttl=60)
+    plain.get_or_load('k', loader)
+    plain.get_or_load('k', loader)
+    assert len(calls) == 2
+
+    calls.clear()
+    negative = TTLCache(ttl=60, negative_ttl=60)
+    assert negative.get_or_load('k', loader) is None
+    assert negative.get_or_load('k', loader) is None
+    assert len(calls) == 1
+    assert negative.get('k', 'missing') == 'missing'
@@ -0,0 +1,80 @@
+"""CanvaAccountDB.claim_accounts: the claim RPC and the fallback used when it is missing"""
+
+import pytest
+
+import InDMDevDB
+from InDMDevDB import CanvaAccountDB, TABLE_CANVA
+from sqlite_backend import SQLiteStore
+from conftest import add_accounts
+
+
+def _accounts(client):
+    return client.table(TABLE_CANVA).select('*').order('id').execute().data
+
+
+@pytest.fixture(params=['rpc', 'fallback'])
+def claim_db(request, db, monkeypatch):
+    """Run each claim test through the RPC and through the no-RPC fallback"""
+    if request.param == 'fallback':
+        monkeypatch.delattr(SQLiteStore, '_rpc_claim_canva_accounts')
+    return db
+
+
+def test_claim_takes_requested_accounts(claim_db):
+    add_accounts(claim_db, 3)
+    claimed = CanvaAccountDB.claim_accounts(42, 1001, 2)
+    assert [a.email for a in claimed] == ['user0@example.com', 'user1@example.com']
+    rows = _accounts(claim_db)
+    assert [(r['status'], r['buyer_id'], r['order_number']) for r in rows] == [
+        ('sold', 42, 1001), ('sold', 42, 1001), ('available', None, None)]
+
+
+def test_claim_short_stock_takes_nothing(claim_db):
+    add_accounts(claim_db, 2)
+    assert CanvaAccountDB.claim_accounts(42, 1001, 3) == []
+    assert all(r['status'] == 'available' for r in _accounts(claim_db))
+
+
+def test_claims_never_share_an_account(claim_db):
+    add_accounts(claim_db, 3)
+    first = CanvaAccountDB.claim_accounts(1, 1001, 2)
+    second = CanvaAccountDB.claim_accounts(2, 1002, 2)
+    third = CanvaAccountDB.claim_accounts(3, 1003, 1)
+    assert len(first) == 2 and second == [] and len(third) == 1
+    assert {a.id for a in first}.isdisjoint(a.id for a in third)
+
+
+def test_missing_rpc_is_logged(db, monkeypatch, caplog):
+    monkeypatch.delattr(SQLiteStore, '_rpc_claim_canva_accounts')
+    add_accounts(db, 1)
+    assert len(CanvaAccountDB.claim_accounts(42, 1001, 1)) == 1
+    assert 'python migrate.py' in caplog.text
+
+
+def test_fallback_releases_accounts_when_one_is_taken_first(db, monkeypatch):
+    monkeypatch.delattr(SQLiteStore, '_rpc_claim_canva_accounts')
+    add_accounts(db, 3)
+    table = db.table
+
+    def racing_table(name):
+        # Another order sells account 2 between the candidate read and its update
+        query = table(name)
+        if query.table_name == TABLE_CANVA and racing_table.calls == 2:
+            table(TABLE_CANVA).update({'status': 'sold', 'order_number': 999}).eq('id', 2).execute()
+        racing_table.calls += 1
+        return query
+    racing_table.calls = 0
+    monkeypatch.setattr(db, 'table', racing_table)
+
+    assert CanvaAccountDB.claim_accounts(42, 1001, 2) == []
+    monkeypatch.setattr(db, 'table', table)
+    assert [(r['id'], r['status'], r['order_number']) for r in _accounts(db)] == [
+        (1, 'available', None), (2, 'sold', 999), (3, 'available', None)]
+
+
+def test_rpc_error_is_logged(db, monkeypatch, caplog):
+    add_accounts(db, 1)
+    monkeypatch.setattr(InDMDevDB.SQLiteTable, '_send',
+                        lambda self, payload: InDMDevDB.SupabaseResponse(error={'message': 'boom'}, status_code=500))
+    assert CanvaAccountDB.claim_accounts(42, 1001, 1) == []
+    assert 'boom' in caplog.text
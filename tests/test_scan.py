@@ -0,0 +1,37 @@
+"""Keyset scans: every row across pages, and a failed page raises instead of ending early"""
+
+import pytest
+
+import InDMDevDB
+from InDMDevDB import CanvaAccountDB, ScanIncomplete, TABLE_CANVA
+from conftest import add_accounts
+
+
+def test_scan_pages_through_every_row(server, rest):
+    add_accounts(rest, 25)
+    server.reset_stats()
+    rows = list(rest.table(TABLE_CANVA).select('email').scan(page_size=10))
+    assert [r['email'] for r in rows] == [f'user{i}@example.com' for i in range(25)]
+    assert server.request_count == 3
+
+
+def test_failed_page_raises_scan_incomplete(server, rest):
+    add_accounts(rest, 25)
+    scan = rest.table(TABLE_CANVA).select('email').scan(page_size=10)
+    first_page = [next(scan) for _ in range(10)]
+    server.error_rate = 1.0
+    with pytest.raises(ScanIncomplete) as exc:
+        next(scan)
+    assert len(first_page) == 10
+    assert exc.value.table == TABLE_CANVA
+    assert exc.value.after == 10
+    assert exc.value.error is not None
+
+
+def test_iter_wrapper_raises_and_list_wrapper_returns_nothing(server, rest, monkeypatch):
+    add_accounts(rest, 5)
+    monkeypatch.setattr(InDMDevDB, 'supabase', rest)
+    server.error_rate = 1.0
+    with pytest.raises(ScanIncomplete):
+        list(CanvaAccountDB.iter_all_accounts(page_size=2))
+    assert CanvaAccountDB.get_all_accounts() == []